@@ -0,0 +1,91 @@
+"""Бенчмарк классификатора вместимости: текстовые правила и структурные поля, холодный и тёплый кэш.
+
+Номера берутся из записанных дней daily/rooms (по умолчанию — все дни, как при пересчёте истории).
+Холодный прогон — после очистки LRU-кэшей, тёплый — повторный прогон тех же номеров.
+
+    python benchmarks/bench_capacity.py [--date YYYY-MM-DD] [--repeat N]
+"""
+import argparse
+import csv
+import json
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import capacity_utils  # noqa: E402
+from capacity_utils import compute_max_capacity_batch, compute_room_capacity_batch  # noqa: E402
+
+
+def _json_list(value):
+    return json.loads(value) if value else []
+
+
+def load_rooms(day=None):
+    """[(room_name, beds, bedding_data, multi_bed_data), ...] по строкам daily/rooms с номером."""
+    rooms_dir = ROOT / "daily" / "rooms"
+    paths = [rooms_dir / f"{day}.csv"] if day else sorted(rooms_dir.glob("*.csv"))
+    rooms = []
+    for path in paths:
+        with open(path, "r", encoding="utf-8-sig", newline="") as f:
+            for row in csv.DictReader(f):
+                if not row.get("rg_hash"):
+                    continue
+                rooms.append((
+                    row["room_name"],
+                    _json_list(row.get("beds")),
+                    _json_list(row.get("bedding_data")),
+                    _json_list(row.get("multi_bed_data")),
+                ))
+    return rooms
+
+
+def _clear_caches():
+    capacity_utils._classify.cache_clear()
+    capacity_utils._classify_structured.cache_clear()
+
+
+def measure(classify, rooms, repeat):
+    """(холодный, тёплый) — лучшее время из repeat прогонов."""
+    cold = warm = None
+    for _ in range(repeat):
+        _clear_caches()
+        start = time.perf_counter()
+        classify(rooms)
+        elapsed = time.perf_counter() - start
+        cold = elapsed if cold is None else min(cold, elapsed)
+        start = time.perf_counter()
+        classify(rooms)
+        elapsed = time.perf_counter() - start
+        warm = elapsed if warm is None else min(warm, elapsed)
+    return cold, warm
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--date", help="день из daily/rooms (по умолчанию все дни)")
+    arg_parser.add_argument("--repeat", type=int, default=5)
+    args = arg_parser.parse_args(argv)
+
+    rooms = load_rooms(args.date)
+    if not rooms:
+        print("Нет номеров для замера")
+        return 1
+    classifiers = (
+        ("текст", lambda batch: compute_max_capacity_batch((name, beds) for name, beds, _, _ in batch)),
+        ("структура", compute_room_capacity_batch),
+    )
+    print(f"номеров {len(rooms)}, лучший из {args.repeat} прогонов")
+    for name, classify in classifiers:
+        cold, warm = measure(classify, rooms, args.repeat)
+        print(f"{name:>10}: холодный кэш {cold * 1000:7.1f} мс, тёплый {warm * 1000:7.1f} мс, "
+              f"на номер {warm / len(rooms) * 1e6:.2f} мкс")
+    info = capacity_utils.capacity_cache_info()
+    print(f"кэш: текст {info['text'].currsize}, структура {info['structured'].currsize} записей")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
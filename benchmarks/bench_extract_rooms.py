@@ -0,0 +1,72 @@
+"""Микробенчмарк разбора ответа hp/search: OstrovokRoomsDailyParser._extract_room_data.
+
+Ответы API берутся из каталога записей (--fixtures, см. fixture_store.py) или восстанавливаются
+из записанного дня daily/rooms/{date}.csv (см. synthetic_fixtures.py).
+Печатает процессорное время на отель и на тариф.
+
+    python benchmarks/bench_extract_rooms.py [--fixtures DIR] [--date YYYY-MM-DD] [--repeat N]
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from fixture_store import FixtureStore, KIND_HOTEL_PAGE  # noqa: E402
+from synthetic_fixtures import build_hotel_pages, day_csv  # noqa: E402
+
+
+def load_responses(fixtures_dir=None, day=None):
+    """Ответы hp/search: из каталога записей FixtureStore (--fixtures) или восстановленные из daily/rooms."""
+    if fixtures_dir:
+        return [
+            json.loads(entry["body"]) for entry in FixtureStore(fixtures_dir).iter_entries(KIND_HOTEL_PAGE)
+            if entry.get("status") == 200 and entry.get("body")
+        ]
+    return build_hotel_pages(day_csv("rooms", day))
+
+
+def run(responses, repeat):
+    from ostrovok_rooms import OstrovokRoomsDailyParser
+    from regions import get_region
+
+    # Без __init__: транспорт и куки для разбора не нужны, а URL отеля строится по региону
+    parser = OstrovokRoomsDailyParser.__new__(OstrovokRoomsDailyParser)
+    parser.region = get_region()
+    best = None
+    for _ in range(repeat):
+        start = time.process_time()
+        for response in responses:
+            parser._extract_room_data(response)
+        elapsed = time.process_time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--fixtures", help="каталог с записанными ответами (OSTROVOK_RECORD)")
+    arg_parser.add_argument("--date", help="день из daily/rooms (по умолчанию последний)")
+    arg_parser.add_argument("--repeat", type=int, default=20)
+    args = arg_parser.parse_args(argv)
+
+    responses = load_responses(args.fixtures, args.date)
+    if not responses:
+        print("Нет ответов для замера")
+        return 1
+    source = args.fixtures or day_csv("rooms", args.date).name
+    rates = sum(len(response["rates"]) for response in responses)
+
+    best = run(responses, args.repeat)
+    print(f"{source}: отелей {len(responses)}, тарифов {rates}, лучший из {args.repeat} прогонов")
+    print(f"всего {best * 1000:.1f} мс, на отель {best / len(responses) * 1e6:.0f} мкс, "
+          f"на тариф {best / max(rates, 1) * 1e6:.2f} мкс")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
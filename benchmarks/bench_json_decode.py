@@ -0,0 +1,88 @@
+"""Бенчмарк декодирования ответов hp/search: json, orjson, msgspec и msgspec по схеме HotelPageResponse.
+
+Тела ответов берутся из каталога --fixtures (записи FixtureStore или файлы *.json — сохранённые
+ответы API), а без него восстанавливаются из записанного дня daily/rooms (см. synthetic_fixtures.py).
+В восстановленных ответах есть только используемые поля, поэтому выигрыш от схемы на них — нижняя оценка.
+Печатает время декодирования всех ответов (лучший прогон) и память под результат (tracemalloc).
+
+    python benchmarks/bench_json_decode.py [--fixtures DIR] [--date YYYY-MM-DD] [--repeat N]
+"""
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import json_decode  # noqa: E402
+from fixture_store import FixtureStore, KIND_HOTEL_PAGE  # noqa: E402
+from json_decode import HotelPageResponse, JsonDecoder  # noqa: E402
+from synthetic_fixtures import build_hotel_pages, day_csv  # noqa: E402
+
+
+def load_bodies(fixtures_dir=None, day=None):
+    if fixtures_dir:
+        recorded = [
+            entry["body"].encode("utf-8")
+            for entry in FixtureStore(fixtures_dir).iter_entries(KIND_HOTEL_PAGE)
+            if entry.get("status") == 200 and entry.get("body")
+        ]
+        return recorded or [path.read_bytes() for path in sorted(Path(fixtures_dir).glob("**/*.json"))]
+    return [
+        json.dumps(response, ensure_ascii=False).encode("utf-8")
+        for response in build_hotel_pages(day_csv("rooms", day))
+    ]
+
+
+def decoders():
+    yield "json", JsonDecoder(backend="json").decode
+    if json_decode.orjson is not None:
+        yield "orjson", JsonDecoder(backend="orjson").decode
+    if json_decode.msgspec is not None:
+        yield "msgspec", JsonDecoder(backend="msgspec").decode
+        yield "msgspec+схема", JsonDecoder(HotelPageResponse, backend="msgspec").decode
+
+
+def measure(decode, bodies, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for body in bodies:
+            decode(body)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    tracemalloc.start()
+    decoded = [decode(body) for body in bodies]
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del decoded
+    return best, retained, peak
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--fixtures", help="каталог с записанными ответами (OSTROVOK_RECORD) или *.json")
+    arg_parser.add_argument("--date", help="день из daily/rooms (по умолчанию последний)")
+    arg_parser.add_argument("--repeat", type=int, default=20)
+    args = arg_parser.parse_args(argv)
+
+    bodies = load_bodies(args.fixtures, args.date)
+    if not bodies:
+        print("Нет ответов для замера")
+        return 1
+    size = sum(len(body) for body in bodies)
+    print(f"ответов {len(bodies)}, {size / 1024:.0f} КБ, лучший из {args.repeat} прогонов")
+    for name, decode in decoders():
+        best, retained, peak = measure(decode, bodies, args.repeat)
+        print(f"{name:>14}: {best * 1000:7.1f} мс, {size / best / 1e6:6.1f} МБ/с, "
+              f"результат {retained / 1024:7.0f} КБ, пик {peak / 1024:7.0f} КБ")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
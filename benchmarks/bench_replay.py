@@ -0,0 +1,84 @@
+"""Сквозной офлайн-прогон парсеров отелей и номеров на записанных ответах (ReplayTransport) без сети и браузера.
+
+Записи — каталог OSTROVOK_RECORD (--fixtures) или восстановленные из daily/ (synthetic_fixtures.py).
+Профиль задаёт задержки и ошибки сети (replay_transport.LATENCY_PROFILES или recorded), поэтому
+число потоков, лимиты и повторы можно подбирать на воспроизводимой нагрузке.
+Печатает время этапов, отелей в секунду и запросов в секунду; CSV не пишутся.
+
+    python benchmarks/bench_replay.py [--fixtures DIR] [--date YYYY-MM-DD] [--profile typical] [--seed N]
+                                      [--workers N] [--serp-workers N] [--rate R] [--max-rate R]
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import checkpoint_journal  # noqa: E402
+from ostrovok_hotels import OstrovokHotelsDailyParser  # noqa: E402
+from ostrovok_rooms import OstrovokRoomsDailyParser  # noqa: E402
+from replay_transport import LATENCY_PROFILES, RECORDED_PROFILE, ReplayTransport  # noqa: E402
+from synthetic_fixtures import write_store  # noqa: E402
+
+
+def run(store_dir, profile, seed, workers, serp_workers):
+    """Прогон обоих этапов; возвращает [(этап, секунды, отелей, транспорт)]."""
+    results = []
+    serp_transport = ReplayTransport(store_dir, profile=profile, seed=seed)
+    start = time.perf_counter()
+    hotels = OstrovokHotelsDailyParser(serp_workers=serp_workers, transport=serp_transport).get_all_hotels_list(
+        save_csv=False,
+    )
+    results.append(("hotels", time.perf_counter() - start, len(hotels), serp_transport))
+
+    rooms_transport = ReplayTransport(store_dir, profile=profile, seed=seed)
+    start = time.perf_counter()
+    OstrovokRoomsDailyParser(workers=workers, transport=rooms_transport).get_all_rooms(hotels=hotels, save_csv=False)
+    results.append(("rooms", time.perf_counter() - start, len(hotels), rooms_transport))
+    return results
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--fixtures", help="каталог с записанными ответами (OSTROVOK_RECORD)")
+    arg_parser.add_argument("--date", help="день из daily/ для восстановленных ответов (по умолчанию последний)")
+    arg_parser.add_argument("--profile", default="none", choices=sorted(LATENCY_PROFILES) + [RECORDED_PROFILE])
+    arg_parser.add_argument("--seed", type=int, default=1)
+    arg_parser.add_argument("--workers", type=int, help="потоков этапа rooms (по умолчанию ROOMS_WORKERS)")
+    arg_parser.add_argument("--serp-workers", type=int, help="потоков SERP (по умолчанию HOTELS_SERP_WORKERS)")
+    arg_parser.add_argument("--rate", type=float, help="начальная скорость этапа rooms, запросов/с (ROOMS_RATE)")
+    arg_parser.add_argument("--max-rate", type=float, help="предел скорости этапа rooms, запросов/с (ROOMS_MAX_RATE)")
+    arg_parser.add_argument("--verbose", action="store_true", help="лог парсеров в stderr")
+    args = arg_parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+    # Этап rooms ограничен RateController: без сети узким местом будет он, а не парсер
+    if args.rate is not None:
+        os.environ["ROOMS_RATE"] = str(args.rate)
+    if args.max_rate is not None:
+        os.environ["ROOMS_MAX_RATE"] = str(args.max_rate)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Журналы контрольных точек прогона — во временном каталоге, чтобы не возобновить настоящий запуск
+        checkpoint_journal.CHECKPOINTS_DIR = Path(tmp) / "checkpoints"
+        store_dir = args.fixtures
+        if not store_dir:
+            store_dir = Path(tmp) / "fixtures"
+            write_store(store_dir, args.date)
+        results = run(store_dir, args.profile, args.seed, args.workers, args.serp_workers)
+
+    print(f"профиль {args.profile}, seed {args.seed}")
+    for stage, elapsed, hotels, transport in results:
+        requests = transport.stats.requests
+        print(f"{stage:>6}: {elapsed:7.2f} с, отелей {hotels} ({hotels / elapsed:.1f}/с), "
+              f"запросов {requests} ({requests / elapsed:.1f}/с), без записи {transport.missing}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,54 @@
+"""Бенчмарк статистики дня: RoomsStatsAccumulator.add_csv и _build_statistics без записи файлов.
+
+    python benchmarks/bench_statistics.py [--date YYYY-MM-DD] [--repeat N] [--recompute-capacity]
+"""
+import argparse
+import logging
+import sys
+import time
+from datetime import date
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from ostrovok_statistic import RoomsStatsAccumulator, _build_statistics, _read_csv_rows  # noqa: E402
+from synthetic_fixtures import day_csv  # noqa: E402
+
+
+def run(hotels_csv, rooms_csv, recompute_capacity):
+    """(время add_csv, время _build_statistics, число строк статистики)."""
+    start = time.perf_counter()
+    accumulator = RoomsStatsAccumulator()
+    accumulator.add_csv(rooms_csv, recompute_capacity=recompute_capacity)
+    accumulated = time.perf_counter()
+    hotels_data = {
+        row["ota_hotel_id"]: {"name": row.get("name", ""), "rooms_number": row.get("rooms_number", "")}
+        for row in _read_csv_rows(hotels_csv) if row.get("ota_hotel_id")
+    }
+    statistics = _build_statistics(date.fromisoformat(rooms_csv.stem), hotels_data, accumulator.stats)
+    return accumulated - start, time.perf_counter() - accumulated, len(statistics)
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--date", help="день из daily/ (по умолчанию последний)")
+    arg_parser.add_argument("--repeat", type=int, default=10)
+    arg_parser.add_argument("--recompute-capacity", action="store_true", help="пересчитывать вместимость номеров")
+    args = arg_parser.parse_args(argv)
+    logging.basicConfig(level=logging.ERROR)
+
+    hotels_csv, rooms_csv = day_csv("hotels", args.date), day_csv("rooms", args.date)
+    best_add = best_build = None
+    for _ in range(args.repeat):
+        add_time, build_time, hotels = run(hotels_csv, rooms_csv, args.recompute_capacity)
+        best_add = add_time if best_add is None else min(best_add, add_time)
+        best_build = build_time if best_build is None else min(best_build, build_time)
+    print(f"{rooms_csv.stem}: отелей {hotels}, лучший из {args.repeat} прогонов")
+    print(f"add_csv {best_add * 1000:.1f} мс, _build_statistics {best_build * 1000:.1f} мс")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
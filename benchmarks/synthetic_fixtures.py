@@ -0,0 +1,124 @@
+"""Ответы API Ostrovok, восстановленные из записанного дня daily/hotels и daily/rooms.
+
+Нужны, когда записей настоящих ответов (OSTROVOK_RECORD) нет: в ответах только поля, которые читают
+парсеры, поэтому размер и время декодирования меньше реальных.
+
+    python benchmarks/synthetic_fixtures.py DIR [--date YYYY-MM-DD]   # каталог записей для OSTROVOK_REPLAY
+"""
+import argparse
+import csv
+import json
+import sys
+from collections import OrderedDict
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from fixture_store import FixtureStore, KIND_HOTEL_PAGE, KIND_SERP  # noqa: E402
+
+DAILY_DIR = ROOT / "daily"
+SERP_URL = "https://ostrovok.ru/hotel/search/v2/site/serp?session=offline"
+HOTEL_PAGE_URL = "https://ostrovok.ru/hotel/search/v1/site/hp/search"
+SERP_PAGE_SIZE = 20
+
+
+def day_csv(kind, day=None):
+    """daily/{kind}/{day}.csv (по умолчанию — последний день, за который есть и отели, и номера)."""
+    if day:
+        return DAILY_DIR / kind / f"{day}.csv"
+    days = sorted(
+        path.stem for path in (DAILY_DIR / "rooms").glob("*.csv")
+        if (DAILY_DIR / "hotels" / path.name).exists()
+    )
+    return DAILY_DIR / kind / f"{days[-1]}.csv"
+
+
+def _json_list(value):
+    return json.loads(value) if value else []
+
+
+def build_hotel_pages(rooms_csv):
+    """Ответы hp/search по отелям дня: {"ota_hotel_id", "master_id", "rates": [...]}.
+    Каждая группа rg_hash разворачивается в count_rg_hash тарифов с ценами от price_rub_min до price_rub_max."""
+    hotels = OrderedDict()
+    with open(rooms_csv, "r", encoding="utf-8-sig", newline="") as f:
+        for row in csv.DictReader(f):
+            response = hotels.setdefault(row["ota_hotel_id"], {
+                "ota_hotel_id": row["ota_hotel_id"],
+                "master_id": row["master_id"],
+                "rates": [],
+            })
+            if not row["rg_hash"]:
+                continue
+            count = int(row["count_rg_hash"] or 1)
+            prices = [row["price_rub_min"], row["price_rub_max"]] + [row["price_rub_min"]] * max(0, count - 2)
+            room = {
+                "rg_hash": row["rg_hash"],
+                "room_name": row["room_name"],
+                "allotment": int(row["allotment"] or 0),
+                "bedding_data": _json_list(row["bedding_data"]),
+                "multi_bed_data": _json_list(row["multi_bed_data"]),
+                "room_data_trans": {"ru": {
+                    "bedding_type": row["bedding_type"],
+                    "beds": _json_list(row["beds"]),
+                }},
+            }
+            for price in prices[:count]:
+                response["rates"].append({
+                    "payment_options": {"payment_types": [{"amount": price, "show_amount": price}]},
+                    "rooms": [dict(room)],
+                })
+    return list(hotels.values())
+
+
+def build_serp_pages(hotels_csv, page_size=SERP_PAGE_SIZE):
+    """Страницы выдачи SERP по списку отелей дня: {"hotels": [{"ota_hotel_id", "master_id", "static_vm"}]}
+    и пустая страница после последней, как отвечает SERP за концом списка."""
+    with open(hotels_csv, "r", encoding="utf-8-sig", newline="") as f:
+        rows = list(csv.DictReader(f))
+    hotels = [{
+        "ota_hotel_id": row["ota_hotel_id"],
+        "master_id": row["master_id"],
+        "static_vm": {
+            "city": row["city"],
+            "name": row["name"],
+            "name_en": row["name_en"],
+            "address": row["address"],
+            "latitude": row["latitude"],
+            "longitude": row["longitude"],
+            "rooms_number": row["rooms_number"],
+        },
+    } for row in rows]
+    return [{"hotels": hotels[start:start + page_size]} for start in range(0, len(hotels), page_size)] + [{"hotels": []}]
+
+
+def write_store(directory, day=None):
+    """Каталог записей (FixtureStore) для офлайн-прогона обоих парсеров. Возвращает FixtureStore."""
+    store = FixtureStore(directory)
+    for page_number, page in enumerate(build_serp_pages(day_csv("hotels", day)), start=1):
+        store.record(KIND_SERP, SERP_URL, {"page": page_number}, 200, json.dumps(page, ensure_ascii=False))
+    store.save_meta(serp_template={"url": SERP_URL, "payload": {"page": 1}})
+
+    with open(day_csv("hotels", day), "r", encoding="utf-8-sig", newline="") as f:
+        store.save_meta(hotels=list(csv.DictReader(f)))
+    for response in build_hotel_pages(day_csv("rooms", day)):
+        store.record(
+            KIND_HOTEL_PAGE, HOTEL_PAGE_URL, {"hotel": response["ota_hotel_id"], "paxes": [{"adults": 1}]},
+            200, json.dumps(response, ensure_ascii=False),
+        )
+    return store
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("directory")
+    arg_parser.add_argument("--date", help="день из daily/ (по умолчанию последний)")
+    args = arg_parser.parse_args(argv)
+    write_store(args.directory, args.date)
+    print(f"Записи сохранены в {args.directory}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
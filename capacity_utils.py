@@ -1,5 +1,7 @@
+import re
 import sys
-from typing import List
+from functools import lru_cache
+from typing import Iterable, List, Optional, Sequence, Tuple
 
 # Настройка stdout для корректного вывода Юникода (на случай запуска файла напрямую)
 if sys.stdout.encoding != "utf-8":
@@ -8,6 +10,77 @@ if sys.stdout.encoding != "utf-8":
     except Exception:
         pass
 
+# Версия логики оценки вместимости: увеличивать при любом изменении правил ниже,
+# чтобы пересчёт статистики с --recompute-capacity пересобрал затронутые даты
+CAPACITY_LOGIC_VERSION = 2
+
+# Размер LRU-кэша результатов по (название, кровати): одинаковые номера повторяются во всех тарифах rg_hash
+CAPACITY_CACHE_SIZE = 8192
+
+# Правила по названию номера: группа регулярного выражения -> вместимость (берётся максимум)
+_NAME_RULES = {
+    "single": ("одноместн", 1),
+    "double": ("двухместн", 2),
+    "triple": ("тр[её]хместн", 3),
+    "quadruple": ("четыр[её]хместн", 4),
+    "family": ("семейн", 3),
+}
+# Правила по строке кровати: группа -> прибавка (каждое правило срабатывает для кровати не больше одного раза)
+_BED_RULES = {
+    "family": ("семейн", 3),
+    "double": ("двуспальн", 2),
+    "twin": ("(?:2|две) отдельные кровати", 2),
+    "sofa": ("диван", 1),
+}
+
+
+# Структурные коды кроватей ответа hp/search -> число гостей
+# multi_bed_data: [{"bed": код, "count": n}] — основные спальные места
+MULTI_BED_GUESTS = {"single": 1, "double": 2, "king": 2, "queen": 2}
+# bedding_data: ["код", ...] — тип основного размещения и дополнительные места
+BEDDING_GUESTS = {"single": 1, "double": 2, "twin": 2}
+BEDDING_EXTRA_GUESTS = {"sofa-bed": 1, "chair-bed": 1}
+# Коды без спальных мест (не влияют на вместимость)
+BEDDING_EMPTY = {"nobedding"}
+
+# Источник вместимости (колонка capacity_source в daily/rooms)
+SOURCE_MULTI_BED_DATA = "multi_bed_data"
+SOURCE_BEDDING_DATA = "bedding_data"
+SOURCE_TEXT = "text"
+
+# Дополнительное место в списке beds (диван, кресло-кровать), если его нет в bedding_data
+_EXTRA_BED_RE = re.compile("диван|кресло-кровать", re.IGNORECASE)
+
+
+def _compile(rules):
+    """Одно регулярное выражение на все ключевые слова: проход по строке один, без lower() и цепочки `in`."""
+    return re.compile(
+        "|".join(f"(?P<{group}>{pattern})" for group, (pattern, _) in rules.items()),
+        re.IGNORECASE,
+    )
+
+
+_NAME_RE = _compile(_NAME_RULES)
+_BED_RE = _compile(_BED_RULES)
+_NAME_VALUES = {group: value for group, (_, value) in _NAME_RULES.items()}
+_BED_VALUES = {group: value for group, (_, value) in _BED_RULES.items()}
+
+
+def _name_capacity(name: str) -> int:
+    return max((_NAME_VALUES[m.lastgroup] for m in _NAME_RE.finditer(name)), default=0)
+
+
+def _bed_capacity(bed: str) -> int:
+    return sum(_BED_VALUES[group] for group in {m.lastgroup for m in _BED_RE.finditer(bed)})
+
+
+@lru_cache(maxsize=CAPACITY_CACHE_SIZE)
+def _classify(room_name: str, beds: Tuple[str, ...]) -> int:
+    beds_capacity = sum(_bed_capacity(bed) for bed in beds)
+    # Итог: вместимость по кроватям, если она определена, иначе по названию
+    capacity = beds_capacity if beds_capacity > 0 else _name_capacity(room_name)
+    return capacity if capacity > 0 else 1
+
 
 def compute_max_capacity(room_name: str, beds_list: List[str]) -> int:
     """
@@ -26,48 +99,89 @@ def compute_max_capacity(room_name: str, beds_list: List[str]) -> int:
        - содержит "диван"               -> +1
        - содержит "семейн"              -> +3
 
-    В итоге берём максимум из оценки по названию и по beds.
+    Если по beds вместимость определена, берётся она, иначе — по названию (минимум 1).
+    Правила собраны в два предкомпилированных регулярных выражения, результаты кэшируются
+    по (room_name, tuple(beds)).
     """
 
-    name = (room_name or "").lower()
-    beds_list = beds_list or []
-
-    # 1) Вместимость по названию
-    name_capacity = 0
-    if "одноместн" in name:
-        name_capacity = max(name_capacity, 1)
-    if "двухместн" in name:
-        name_capacity = max(name_capacity, 2)
-    if "трехместн" in name or "трёхместн" in name:
-        name_capacity = max(name_capacity, 3)
-    if "четырехместн" in name or "четырёхместн" in name:
-        name_capacity = max(name_capacity, 4)
-    # Семейный номер
-    if "семейн" in name:
-        name_capacity = max(name_capacity, 3)
-
-    # 2) Вместимость по beds
-    beds_capacity = 0
-    for bed in beds_list:
-        s = (bed or "").lower()
-
-        # Семейная кровать/кровать семейного типа
-        if "семейн" in s:
-            beds_capacity += 3
-
-        # Двуспальная кровать
-        if "двуспальн" in s:
-            beds_capacity += 2
-
-        # 2 отдельные кровати / две отдельные кровати
-        if "2 отдельные кровати" in s or "две отдельные кровати" in s:
-            beds_capacity += 2
-
-        # Диван / диван-кровать
-        if "диван" in s:
-            beds_capacity += 1
-
-    # Итог: используем максимум из оценки по названию и по beds
-    capacity = beds_capacity if beds_capacity > 0 else name_capacity
-    return capacity if capacity > 0 else 1
+    return _classify(room_name or "", tuple(bed or "" for bed in beds_list or ()))
+
+
+def _multi_bed_key(multi_bed_data) -> Optional[Tuple[Tuple[str, int], ...]]:
+    """multi_bed_data → кортеж (код, количество) для ключа кэша; None, если формат не распознан."""
+    key = []
+    for item in multi_bed_data or ():
+        if not isinstance(item, dict):
+            return None
+        code, count = item.get("bed"), item.get("count")
+        if not isinstance(code, str) or not isinstance(count, int):
+            return None
+        key.append((code, count))
+    return tuple(key)
+
+
+@lru_cache(maxsize=CAPACITY_CACHE_SIZE)
+def _classify_structured(room_name: str, beds: Tuple[str, ...], bedding: Tuple[str, ...],
+                         multi_beds: Tuple[Tuple[str, int], ...]) -> Tuple[int, str]:
+    # Основные места: multi_bed_data, если все коды известны
+    main = 0
+    source = None
+    if multi_beds and all(code in MULTI_BED_GUESTS and count > 0 for code, count in multi_beds):
+        main = sum(MULTI_BED_GUESTS[code] * count for code, count in multi_beds)
+        source = SOURCE_MULTI_BED_DATA
+    else:
+        main = sum(BEDDING_GUESTS.get(code, 0) for code in bedding)
+        if main:
+            source = SOURCE_BEDDING_DATA
+
+    # Дополнительные места: коды bedding_data или диван/кресло-кровать в списке beds (что больше)
+    extra = max(
+        sum(BEDDING_EXTRA_GUESTS.get(code, 0) for code in bedding),
+        sum(1 for bed in beds if _EXTRA_BED_RE.search(bed)),
+    )
+    if extra and source is None and any(code in BEDDING_EXTRA_GUESTS for code in bedding):
+        source = SOURCE_BEDDING_DATA
+
+    if source is None:
+        return _classify(room_name, beds), SOURCE_TEXT
+    return main + extra, source
+
+
+def compute_room_capacity(room_name: str, beds_list: List[str], bedding_data: Optional[List[str]] = None,
+                          multi_bed_data: Optional[List[dict]] = None) -> Tuple[int, str]:
+    """Вместимость номера и её источник: (capacity, "multi_bed_data" | "bedding_data" | "text").
+
+    Сначала — структурные поля ответа: основные места по multi_bed_data (код кровати × count)
+    или по кодам bedding_data, плюс дополнительные места (sofa-bed, chair-bed; диван или
+    кресло-кровать в beds). Если структурных данных нет или коды неизвестны — текстовые правила
+    compute_max_capacity по названию и beds."""
+    beds = tuple(bed or "" for bed in beds_list or ())
+    bedding = tuple(code for code in bedding_data or () if isinstance(code, str) and code not in BEDDING_EMPTY)
+    multi_beds = _multi_bed_key(multi_bed_data)
+    if multi_beds is None:
+        multi_beds = ()
+    return _classify_structured(room_name or "", beds, bedding, multi_beds)
+
+
+def compute_max_capacity_batch(rooms: Iterable[Tuple[str, Sequence[str]]]) -> List[int]:
+    """Вместимость для колонки номеров [(room_name, beds_list), ...] — например, при пересчёте истории.
+    Повторяющиеся пары считаются один раз."""
+    results = []
+    seen = {}
+    for room_name, beds_list in rooms:
+        key = (room_name or "", tuple(bed or "" for bed in beds_list or ()))
+        capacity = seen.get(key)
+        if capacity is None:
+            capacity = seen[key] = _classify(*key)
+        results.append(capacity)
+    return results
+
+
+def compute_room_capacity_batch(rooms: Iterable[tuple]) -> List[Tuple[int, str]]:
+    """compute_room_capacity для колонки номеров [(room_name, beds, bedding_data, multi_bed_data), ...]."""
+    return [compute_room_capacity(*room) for room in rooms]
+
 
+def capacity_cache_info():
+    """Статистика LRU-кэшей классификатора: текстовые правила и структурные поля."""
+    return {"text": _classify.cache_info(), "structured": _classify_structured.cache_info()}
@@ -0,0 +1,261 @@
+import argparse
+import csv
+import logging
+import os
+import sqlite3
+import sys
+from pathlib import Path
+
+# Настройка stdout для корректного вывода Юникода
+if sys.stdout.encoding != 'utf-8':
+    sys.stdout.reconfigure(encoding='utf-8')
+
+logger = logging.getLogger(__name__)
+
+CATALOG_DIR = Path(__file__).resolve().parent / "catalog"
+# База — локальный кэш, в git не хранится: при отсутствии собирается из CSV-выгрузок hotels.csv и hotel_changes.csv
+CATALOG_DB_PATH = CATALOG_DIR / "hotels.sqlite"
+CATALOG_CSV_PATH = CATALOG_DIR / "hotels.csv"
+CHANGES_CSV_PATH = CATALOG_DIR / "hotel_changes.csv"
+
+CATALOG_FIELDNAMES = [
+    'ota_hotel_id', 'master_id', 'name', 'name_en',
+    'city', 'address', 'latitude', 'longitude', 'url', 'rooms_number',
+    'first_seen_date', 'last_seen_date',
+]
+CHANGES_FIELDNAMES = ['ota_hotel_id', 'field', 'old_value', 'new_value', 'changed_date']
+# Поля, которые обновляются из свежего списка отелей; их изменения пишутся в hotel_changes
+TRACKED_FIELDS = [
+    'name', 'name_en', 'city', 'address', 'latitude', 'longitude', 'url', 'rooms_number',
+]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS hotels (
+    ota_hotel_id    TEXT PRIMARY KEY,
+    master_id       TEXT NOT NULL DEFAULT '',
+    name            TEXT NOT NULL DEFAULT '',
+    name_en         TEXT NOT NULL DEFAULT '',
+    city            TEXT NOT NULL DEFAULT '',
+    address         TEXT NOT NULL DEFAULT '',
+    latitude        TEXT NOT NULL DEFAULT '',
+    longitude       TEXT NOT NULL DEFAULT '',
+    url             TEXT NOT NULL DEFAULT '',
+    rooms_number    TEXT NOT NULL DEFAULT '',
+    first_seen_date TEXT NOT NULL,
+    last_seen_date  TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS hotels_master_id ON hotels (master_id);
+CREATE INDEX IF NOT EXISTS hotels_last_seen_date ON hotels (last_seen_date);
+
+CREATE TABLE IF NOT EXISTS hotel_changes (
+    id           INTEGER PRIMARY KEY,
+    ota_hotel_id TEXT NOT NULL,
+    field        TEXT NOT NULL,
+    old_value    TEXT,
+    new_value    TEXT,
+    changed_date TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS hotel_changes_hotel ON hotel_changes (ota_hotel_id, changed_date);
+"""
+
+
+def _csv_value(value):
+    """Значение поля в том виде, в каком его записал бы csv.DictWriter."""
+    if value is None:
+        return ''
+    return str(value)
+
+
+class HotelCatalogStore:
+    """Каталог отелей в SQLite (catalog/hotels.sqlite) с построчными upsert в одной транзакции.
+    Изменения отслеживаемых полей пишутся в таблицу hotel_changes (отель, поле, было, стало, дата).
+    В git хранятся только выгрузки catalog/hotels.csv и catalog/hotel_changes.csv (заменяются атомарно);
+    база без данных собирается из них заново."""
+
+    def __init__(self, db_path=None, csv_path=None, changes_csv_path=None):
+        self.db_path = Path(db_path) if db_path else CATALOG_DB_PATH
+        self.csv_path = Path(csv_path) if csv_path else CATALOG_CSV_PATH
+        self.changes_csv_path = Path(changes_csv_path) if changes_csv_path else (
+            self.csv_path.with_name(CHANGES_CSV_PATH.name)
+        )
+
+    def connect(self):
+        """Соединение с каталогом; при первом открытии создаёт схему и импортирует выгрузки CSV."""
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        with conn:
+            conn.executescript(_SCHEMA)
+        if conn.execute("SELECT COUNT(*) FROM hotels").fetchone()[0] == 0:
+            self._import_csv(conn)
+        return conn
+
+    def _read_csv(self, path):
+        if not path.exists():
+            return []
+        try:
+            with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+                return [row for row in csv.DictReader(f) if row.get('ota_hotel_id')]
+        except Exception as e:
+            logger.error("Ошибка при чтении каталога %s: %s", path, e)
+            return []
+
+    def _import_csv(self, conn):
+        """Переносит catalog/hotels.csv и catalog/hotel_changes.csv в пустую базу с сохранением порядка строк."""
+        rows = self._read_csv(self.csv_path)
+        changes = self._read_csv(self.changes_csv_path)
+        if not rows:
+            return
+        with conn:
+            conn.executemany(
+                f"INSERT OR REPLACE INTO hotels ({', '.join(CATALOG_FIELDNAMES)}) "
+                f"VALUES ({', '.join('?' for _ in CATALOG_FIELDNAMES)})",
+                ([_csv_value(row.get(name)) for name in CATALOG_FIELDNAMES] for row in rows),
+            )
+            conn.execute("DELETE FROM hotel_changes")
+            conn.executemany(
+                f"INSERT INTO hotel_changes ({', '.join(CHANGES_FIELDNAMES)}) "
+                f"VALUES ({', '.join('?' for _ in CHANGES_FIELDNAMES)})",
+                ([_csv_value(row.get(name)) for name in CHANGES_FIELDNAMES] for row in changes),
+            )
+        logger.info("Каталог импортирован из %s: %s отелей, %s изменений полей", self.csv_path, len(rows), len(changes))
+
+    def upsert(self, parsed_hotels, seen_date):
+        """Добавляет новые отели и обновляет поля и last_seen_date существующих одной транзакцией.
+        Возвращает (всего отелей в каталоге, новых, изменённых полей)."""
+        new_count = 0
+        changes_count = 0
+        conn = self.connect()
+        try:
+            with conn:
+                for hotel in parsed_hotels:
+                    hotel_id = _csv_value(hotel.get('ota_hotel_id'))
+                    if not hotel_id:
+                        continue
+                    current = conn.execute(
+                        "SELECT * FROM hotels WHERE ota_hotel_id = ?", (hotel_id,),
+                    ).fetchone()
+
+                    # Новый отель
+                    if current is None:
+                        values = {name: _csv_value(hotel.get(name)) for name in CATALOG_FIELDNAMES}
+                        values.update(ota_hotel_id=hotel_id, first_seen_date=seen_date, last_seen_date=seen_date)
+                        conn.execute(
+                            f"INSERT INTO hotels ({', '.join(CATALOG_FIELDNAMES)}) "
+                            f"VALUES ({', '.join('?' for _ in CATALOG_FIELDNAMES)})",
+                            [values[name] for name in CATALOG_FIELDNAMES],
+                        )
+                        new_count += 1
+                        continue
+
+                    # Поле обновляется, только если оно есть в свежих данных
+                    updates = {
+                        name: _csv_value(hotel[name])
+                        for name in TRACKED_FIELDS if name in hotel
+                    }
+                    changed = [
+                        (hotel_id, name, current[name], value, seen_date)
+                        for name, value in updates.items() if value != current[name]
+                    ]
+                    if changed:
+                        conn.executemany(
+                            "INSERT INTO hotel_changes (ota_hotel_id, field, old_value, new_value, changed_date) "
+                            "VALUES (?, ?, ?, ?, ?)",
+                            changed,
+                        )
+                        changes_count += len(changed)
+                    updates['last_seen_date'] = seen_date
+                    conn.execute(
+                        f"UPDATE hotels SET {', '.join(f'{name} = ?' for name in updates)} WHERE ota_hotel_id = ?",
+                        [*updates.values(), hotel_id],
+                    )
+            total = conn.execute("SELECT COUNT(*) FROM hotels").fetchone()[0]
+        finally:
+            conn.close()
+        return total, new_count, changes_count
+
+    @staticmethod
+    def _export_query(conn, query, fieldnames, path):
+        """Результат запроса → CSV через временный файл и os.replace. Возвращает число строк."""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f".{path.name}.tmp")
+        try:
+            with open(tmp_path, 'w', encoding='utf-8-sig', newline='') as f:
+                writer = csv.writer(f, quoting=csv.QUOTE_MINIMAL)
+                writer.writerow(fieldnames)
+                count = 0
+                for row in conn.execute(query):
+                    writer.writerow(row)
+                    count += 1
+            os.replace(tmp_path, path)
+        except Exception:
+            tmp_path.unlink(missing_ok=True)
+            raise
+        return count
+
+    def export_csv(self, path=None):
+        """Выгружает каталог в CSV (порядок строк — порядок добавления) и историю изменений полей
+        в catalog/hotel_changes.csv (по id)."""
+        path = Path(path) if path else self.csv_path
+        conn = self.connect()
+        try:
+            count = self._export_query(
+                conn, f"SELECT {', '.join(CATALOG_FIELDNAMES)} FROM hotels ORDER BY rowid", CATALOG_FIELDNAMES, path,
+            )
+            changes_count = self._export_query(
+                conn, f"SELECT {', '.join(CHANGES_FIELDNAMES)} FROM hotel_changes ORDER BY id",
+                CHANGES_FIELDNAMES, self.changes_csv_path,
+            )
+        finally:
+            conn.close()
+        logger.info("Каталог выгружен: %s отелей → %s, изменений полей %s", count, path, changes_count)
+        return count
+
+    def changes(self, hotel_id=None, field=None):
+        """История изменений полей: список dict (ota_hotel_id, field, old_value, new_value, changed_date)."""
+        conditions = []
+        params = []
+        if hotel_id:
+            conditions.append("ota_hotel_id = ?")
+            params.append(hotel_id)
+        if field:
+            conditions.append("field = ?")
+            params.append(field)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        conn = self.connect()
+        try:
+            return [
+                dict(row) for row in conn.execute(
+                    "SELECT ota_hotel_id, field, old_value, new_value, changed_date "
+                    f"FROM hotel_changes {where} ORDER BY changed_date, id",
+                    params,
+                )
+            ]
+        finally:
+            conn.close()
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Каталог отелей в SQLite")
+    sub = arg_parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("export", help="выгрузить каталог в catalog/hotels.csv")
+    changes_cmd = sub.add_parser("changes", help="показать историю изменений полей")
+    changes_cmd.add_argument("--hotel", help="ota_hotel_id")
+    changes_cmd.add_argument("--field", choices=TRACKED_FIELDS)
+    args = arg_parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(name)s: %(message)s")
+    store = HotelCatalogStore()
+    if args.command == "export":
+        store.export_csv()
+    elif args.command == "changes":
+        for change in store.changes(args.hotel, args.field):
+            print(
+                f"{change['changed_date']}  {change['ota_hotel_id']}  {change['field']}: "
+                f"{change['old_value']!r} → {change['new_value']!r}"
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
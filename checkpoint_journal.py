@@ -0,0 +1,77 @@
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# Журналы незавершённых запусков; после успешного прохода удаляются, в git не попадают
+CHECKPOINTS_DIR = Path(__file__).resolve().parent / "daily" / "checkpoints"
+
+
+class CheckpointJournal:
+    """Append-only JSONL журнал завершённых единиц работы (отелей, страниц выдачи) за дату запуска.
+    Каждая строка — {"key": ..., ...}; повторный запуск за ту же дату пропускает уже записанные ключи."""
+
+    def __init__(self, name, run_date, directory=None):
+        directory = Path(directory) if directory else CHECKPOINTS_DIR
+        self.path = directory / f"{name}-{run_date.isoformat()}.jsonl"
+        self._lock = threading.Lock()
+        self._repaired = False
+
+    def _repair(self):
+        """Отрезает оборванную последнюю строку (сбой во время записи), чтобы следующая запись не склеилась с ней."""
+        if self._repaired:
+            return
+        self._repaired = True
+        try:
+            with open(self.path, "rb+") as f:
+                data = f.read()
+                if data and not data.endswith(b"\n"):
+                    f.truncate(data.rfind(b"\n") + 1)
+                    logger.warning("Журнал %s: отброшена оборванная последняя запись", self.path)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning("Не удалось проверить журнал %s: %s", self.path, e)
+
+    def load(self):
+        """Записи журнала: dict key -> запись. Оборванная последняя строка (сбой во время записи) отрезается."""
+        entries = {}
+        with self._lock:
+            self._repair()
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    if isinstance(entry, dict) and "key" in entry:
+                        entries[str(entry["key"])] = entry
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning("Не удалось прочитать журнал %s: %s", self.path, e)
+        return entries
+
+    def append(self, key, **payload):
+        """Дописывает запись и сбрасывает её на диск до возврата."""
+        line = json.dumps({"key": str(key), **payload}, ensure_ascii=False)
+        with self._lock:
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self._repair()
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+                    f.flush()
+                    os.fsync(f.fileno())
+            except Exception as e:
+                logger.warning("Не удалось записать в журнал %s: %s", self.path, e)
+
+    def remove(self):
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,56 @@
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# Манифесты входов производных файлов (какие daily/* и какая версия логики дали результат); хранятся в git
+MANIFESTS_DIR = Path(__file__).resolve().parent / "daily" / "manifests"
+
+
+def file_fingerprint(path):
+    """sha256 содержимого файла или None, если файла нет."""
+    digest = hashlib.sha256()
+    try:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+    except FileNotFoundError:
+        return None
+    return digest.hexdigest()
+
+
+class FingerprintManifest:
+    """JSON-манифест {"dates": {YYYY-MM-DD: {входы, версии логики, хэш результата}}}.
+    По нему пересчёт пропускает даты, у которых не изменились ни входы, ни логика, ни сам результат."""
+
+    def __init__(self, name, directory=None):
+        directory = Path(directory) if directory else MANIFESTS_DIR
+        self.path = directory / f"{name}.json"
+        self.entries = self._load()
+
+    def _load(self):
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            logger.warning("Не удалось прочитать манифест %s: %s", self.path, e)
+            return {}
+        return data.get("dates") or {}
+
+    def get(self, day):
+        return self.entries.get(day.isoformat())
+
+    def record(self, day, entry):
+        self.entries[day.isoformat()] = entry
+
+    def save(self):
+        """Атомарно сохраняет манифест (даты по порядку, чтобы диффы в git были минимальными)."""
+        data = {"dates": dict(sorted(self.entries.items()))}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(data, ensure_ascii=False, indent=1) + "\n", encoding="utf-8")
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,178 @@
+import argparse
+import gzip
+import json
+import logging
+import os
+import sys
+import threading
+from collections import Counter
+from pathlib import Path
+
+# Настройка stdout для корректного вывода Юникода
+if sys.stdout.encoding != 'utf-8':
+    sys.stdout.reconfigure(encoding='utf-8')
+
+logger = logging.getLogger(__name__)
+
+# Записанные ответы API для офлайн-прогонов и бенчмарков; содержат id сессии в URL, в git не попадают
+FIXTURES_DIR = Path(__file__).resolve().parent / "fixtures"
+
+KIND_SERP = "serp"
+KIND_HOTEL_PAGE = "hp_search"
+
+
+def kind_for_url(url):
+    """Вид ответа по URL запроса: выдача SERP или страница отеля hp/search (None — не записывается)."""
+    if "/hp/search" in url:
+        return KIND_HOTEL_PAGE
+    if "/serp" in url:
+        return KIND_SERP
+    return None
+
+
+def _lookup_keys(kind, payload):
+    """Ключи поиска записи от точного к общему: при воспроизведении в другой день даты запроса не совпадут."""
+    payload = payload if isinstance(payload, dict) else {}
+    if kind == KIND_HOTEL_PAGE:
+        hotel = str(payload.get("hotel", ""))
+        adults = ",".join(str(pax.get("adults", "")) for pax in payload.get("paxes") or [] if isinstance(pax, dict))
+        dates = f"{payload.get('arrival_date', '')}/{payload.get('departure_date', '')}"
+        return [f"{hotel}|{adults}|{dates}", f"{hotel}|{adults}", hotel]
+    if kind == KIND_SERP:
+        page = payload.get("page")
+        if page is None:
+            page = next((value["page"] for value in payload.values() if isinstance(value, dict) and "page" in value), 1)
+        return [f"page={page}"]
+    return []
+
+
+class FixtureStore:
+    """Каталог записанных ответов: {kind}.jsonl.gz (строка — запрос и ответ) и meta.json.
+    Запись потокобезопасна и дописывает gzip-члены в конец файла, поэтому прерванная запись не портит начало."""
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self._lock = threading.Lock()
+        self._index = None
+
+    def _path(self, kind):
+        return self.directory / f"{kind}.jsonl.gz"
+
+    def record(self, kind, url, payload, status, body, elapsed=None, headers=None):
+        """Сохраняет ответ (body — bytes или str)."""
+        if isinstance(body, bytes):
+            body = body.decode("utf-8", errors="replace")
+        entry = {
+            "url": url,
+            "payload": payload,
+            "status": status,
+            "elapsed": elapsed,
+            "headers": {name: value for name, value in (headers or {}).items() if name.lower() == "retry-after"},
+            "body": body,
+        }
+        line = (json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8")
+        with self._lock:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            with gzip.open(self._path(kind), "ab") as f:
+                f.write(line)
+            self._index = None
+
+    def record_response(self, url, payload, response):
+        """Запись ответа requests (для PooledTransport)."""
+        kind = kind_for_url(url)
+        if kind is None:
+            return
+        try:
+            self.record(
+                kind, url, payload, response.status_code, response.content,
+                elapsed=response.elapsed.total_seconds(), headers=response.headers,
+            )
+        except Exception as e:
+            logger.warning("Не удалось записать ответ %s: %s", url, e)
+
+    def iter_entries(self, kind):
+        path = self._path(kind)
+        if not path.exists():
+            return
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+    def _build_index(self):
+        index = {}
+        for kind in (KIND_SERP, KIND_HOTEL_PAGE):
+            for entry in self.iter_entries(kind):
+                # Для повторных записей одного запроса выигрывает первый успешный ответ
+                for key in _lookup_keys(kind, entry.get("payload")):
+                    current = index.get((kind, key))
+                    if current is None or (current.get("status") != 200 and entry.get("status") == 200):
+                        index[(kind, key)] = entry
+        return index
+
+    def lookup(self, kind, payload):
+        """Записанный ответ на запрос (dict из jsonl) или None."""
+        with self._lock:
+            if self._index is None:
+                self._index = self._build_index()
+            index = self._index
+        for key in _lookup_keys(kind, payload):
+            entry = index.get((kind, key))
+            if entry is not None:
+                return entry
+        return None
+
+    def save_meta(self, **values):
+        """Дописывает поля в meta.json (например, шаблон запроса SERP)."""
+        with self._lock:
+            meta = self.load_meta()
+            meta.update(values)
+            self.directory.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.directory / "meta.json.tmp"
+            tmp_path.write_text(json.dumps(meta, ensure_ascii=False, indent=1), encoding="utf-8")
+            os.replace(tmp_path, self.directory / "meta.json")
+
+    def load_meta(self):
+        try:
+            return json.loads((self.directory / "meta.json").read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return {}
+
+    def hotels(self):
+        """Строки отелей записанной выдачи (для прогона номеров без этапа hotels)."""
+        return self.load_meta().get("hotels") or []
+
+
+def recorder_from_env():
+    """FixtureStore для записи ответов, если задан OSTROVOK_RECORD (каталог), иначе None."""
+    directory = os.environ.get("OSTROVOK_RECORD")
+    if not directory:
+        return None
+    logger.info("Запись ответов API в %s", directory)
+    return FixtureStore(directory)
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Записанные ответы API Ostrovok")
+    sub = arg_parser.add_subparsers(dest="command", required=True)
+    info_cmd = sub.add_parser("info", help="состав каталога с записями")
+    info_cmd.add_argument("directory", nargs="?", default=str(FIXTURES_DIR))
+    args = arg_parser.parse_args(argv)
+
+    store = FixtureStore(args.directory)
+    for kind in (KIND_SERP, KIND_HOTEL_PAGE):
+        statuses = Counter()
+        size = 0
+        for entry in store.iter_entries(kind):
+            statuses[entry.get("status")] += 1
+            size += len(entry.get("body") or "")
+        print(f"{kind}: {sum(statuses.values())} ответов, {size / 1024:.0f} КБ, статусы {dict(statuses)}")
+    meta = store.load_meta()
+    print(f"meta: {', '.join(sorted(meta)) or 'нет'}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
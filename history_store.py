@@ -0,0 +1,348 @@
+import argparse
+import csv
+import json
+import logging
+import os
+import sys
+from datetime import date
+from decimal import Decimal, InvalidOperation
+from pathlib import Path
+
+from fingerprint_manifest import file_fingerprint
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = ds = pq = None
+
+# Настройка stdout для корректного вывода Юникода
+if sys.stdout.encoding != 'utf-8':
+    sys.stdout.reconfigure(encoding='utf-8')
+
+logger = logging.getLogger(__name__)
+
+CURRENT_DIR = Path(__file__).resolve().parent
+DAILY_DIR = CURRENT_DIR / "daily"
+# Колоночное хранилище истории: history/{kind}/date=YYYY-MM-DD/part-0.parquet.
+# В git не хранится: собирается из daily/ (backfill) и переносится между запусками CI кэшем
+HISTORY_DIR = CURRENT_DIR / "history"
+KINDS = ("hotels", "rooms", "statistics")
+# Ключ метаданных партиции: sha256 CSV, из которого она импортирована (backfill пропускает актуальные партиции)
+SOURCE_SHA256_KEY = b"source_sha256"
+PRICE_QUANT = Decimal("0.01")
+
+
+def _build_schemas():
+    """Схемы файлов по видам данных (колонка date — из имени партиции)."""
+    price = pa.decimal128(12, 2)
+    return {
+        "hotels": pa.schema([
+            ("city", pa.string()),
+            ("ota_hotel_id", pa.string()),
+            ("master_id", pa.string()),
+            ("name", pa.string()),
+            ("name_en", pa.string()),
+            ("address", pa.string()),
+            ("latitude", pa.float64()),
+            ("longitude", pa.float64()),
+            ("url", pa.string()),
+            ("rooms_number", pa.int32()),
+        ]),
+        "rooms": pa.schema([
+            ("ota_hotel_id", pa.string()),
+            ("master_id", pa.string()),
+            ("room_name", pa.string()),
+            ("rg_hash", pa.string()),
+            ("count_rg_hash", pa.int32()),
+            ("allotment", pa.int32()),
+            ("bedding_type", pa.string()),
+            ("beds", pa.list_(pa.string())),
+            ("bedding_data", pa.list_(pa.string())),
+            ("multi_bed_data", pa.list_(pa.struct([("bed", pa.string()), ("count", pa.int32())]))),
+            ("capacity", pa.int32()),
+            ("capacity_source", pa.string()),
+            ("price_rub_min", price),
+            ("price_rub_max", price),
+            ("url", pa.string()),
+            ("carried_from", pa.string()),
+        ]),
+        "statistics": pa.schema([
+            ("ota_hotel_id", pa.string()),
+            ("name", pa.string()),
+            ("rooms_num", pa.int32()),
+            ("free_rooms_amount", pa.int32()),
+            ("max_capacity", pa.int32()),
+            ("available_rooms_percent", pa.float64()),
+            ("min_price", price),
+        ]),
+    }
+
+
+SCHEMAS = _build_schemas() if pa else {}
+
+
+def is_enabled():
+    """Запись в историю включена: установлен pyarrow и не задано HISTORY_STORE=0."""
+    return pa is not None and os.environ.get("HISTORY_STORE", "1") != "0"
+
+
+def _to_str(value):
+    if value is None:
+        return None
+    return str(value)
+
+
+def _to_int(value):
+    if value in (None, ""):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_float(value):
+    if value in (None, ""):
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_decimal(value):
+    if value in (None, ""):
+        return None
+    try:
+        return Decimal(str(value)).quantize(PRICE_QUANT)
+    except (InvalidOperation, ValueError):
+        return None
+
+
+def _to_json_list(value):
+    """JSON-строка из CSV (или уже разобранный список) → список."""
+    if value in (None, ""):
+        return None
+    if isinstance(value, list):
+        return value
+    try:
+        parsed = json.loads(value)
+    except (TypeError, ValueError):
+        return None
+    return parsed if isinstance(parsed, list) else None
+
+
+def _to_bed_structs(value):
+    items = _to_json_list(value)
+    if items is None:
+        return None
+    return [
+        {"bed": _to_str(item.get("bed")), "count": _to_int(item.get("count"))}
+        for item in items if isinstance(item, dict)
+    ]
+
+
+# Преобразование строк CSV (строковые значения) в типизированные значения колонок
+_CONVERTERS = {
+    "latitude": _to_float,
+    "longitude": _to_float,
+    "rooms_number": _to_int,
+    "count_rg_hash": _to_int,
+    "allotment": _to_int,
+    "capacity": _to_int,
+    "rooms_num": _to_int,
+    "free_rooms_amount": _to_int,
+    "max_capacity": _to_int,
+    "available_rooms_percent": _to_float,
+    "price_rub_min": _to_decimal,
+    "price_rub_max": _to_decimal,
+    "min_price": _to_decimal,
+    "beds": _to_json_list,
+    "bedding_data": _to_json_list,
+    "multi_bed_data": _to_bed_structs,
+}
+
+
+def _typed_row(kind, row):
+    return {
+        name: _CONVERTERS.get(name, _to_str)(row.get(name))
+        for name in SCHEMAS[kind].names
+    }
+
+
+def partition_path(kind, day):
+    return HISTORY_DIR / kind / f"date={day.isoformat()}" / "part-0.parquet"
+
+
+class HistoryDayWriter:
+    """Пишет строки одного дня в партицию history/{kind}/date=.../ пачками (row group на пачку).
+    Файл пишется во временный и подменяется при close(), так что прерванная запись не портит историю."""
+
+    def __init__(self, kind, day, batch_size=1000, metadata=None):
+        self.kind = kind
+        self.day = day
+        self.batch_size = batch_size
+        self.count = 0
+        self._path = partition_path(kind, day)
+        # Имя с точкой в начале: pyarrow.dataset пропускает такие файлы при чтении
+        self._tmp_path = self._path.with_name(f".{self._path.name}.tmp")
+        self._batch = []
+        self._writer = None
+        self._schema = SCHEMAS[kind].with_metadata(metadata) if metadata else SCHEMAS[kind]
+
+    def write_rows(self, rows):
+        self._batch.extend(_typed_row(self.kind, row) for row in rows)
+        if len(self._batch) >= self.batch_size:
+            self._flush()
+
+    def _flush(self):
+        if not self._batch:
+            return
+        if self._writer is None:
+            self._path.parent.mkdir(parents=True, exist_ok=True)
+            self._writer = pq.ParquetWriter(self._tmp_path, self._schema, compression="zstd")
+        self._writer.write_table(pa.Table.from_pylist(self._batch, schema=self._schema))
+        self.count += len(self._batch)
+        self._batch = []
+
+    def close(self):
+        self._flush()
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+            os.replace(self._tmp_path, self._path)
+
+    def abort(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        self._tmp_path.unlink(missing_ok=True)
+
+
+def open_day_writer(kind, day, metadata=None):
+    """HistoryDayWriter или None, если хранилище выключено (нет pyarrow / HISTORY_STORE=0)."""
+    if not is_enabled():
+        return None
+    return HistoryDayWriter(kind, day, metadata=metadata)
+
+
+def write_day(kind, day, rows, metadata=None):
+    """Перезаписывает партицию дня. Ошибки только логируются: история не должна ронять парсинг."""
+    writer = open_day_writer(kind, day, metadata)
+    if writer is None:
+        return 0
+    try:
+        writer.write_rows(rows)
+        writer.close()
+        return writer.count
+    except Exception as e:
+        writer.abort()
+        logger.error("Ошибка записи истории %s за %s: %s", kind, day, e)
+        return 0
+
+
+def dataset(kind):
+    """pyarrow Dataset по всей истории вида kind с колонкой date (date32) из партиций."""
+    if pa is None:
+        raise RuntimeError("Для чтения истории нужен pyarrow")
+    partitioning = ds.partitioning(pa.schema([("date", pa.date32())]), flavor="hive")
+    schema = SCHEMAS[kind].append(pa.field("date", pa.date32()))
+    return ds.dataset(HISTORY_DIR / kind, schema=schema, format="parquet", partitioning=partitioning)
+
+
+def query(kind, start=None, end=None, columns=None, where=None):
+    """Таблица истории за даты [start, end] (плюс условие where — pyarrow expression).
+    Лишние партиции отсекаются по имени каталога без чтения файлов."""
+    expression = where
+    for condition in (
+        ds.field("date") >= start if start else None,
+        ds.field("date") <= end if end else None,
+    ):
+        if condition is not None:
+            expression = condition if expression is None else expression & condition
+    return dataset(kind).to_table(columns=columns, filter=expression)
+
+
+def _partition_source_sha256(kind, day):
+    """sha256 CSV, из которого импортирована партиция, или None (нет партиции, записана парсером, повреждена)."""
+    try:
+        metadata = pq.read_metadata(partition_path(kind, day)).metadata or {}
+    except (FileNotFoundError, OSError, pa.ArrowException):
+        return None
+    value = metadata.get(SOURCE_SHA256_KEY)
+    return value.decode() if value else None
+
+
+def backfill(kinds=KINDS, start=None, end=None, force=False):
+    """Импорт daily/{kind}/YYYY-MM-DD.csv в историю по партициям. Партиция, уже импортированная из того же
+    CSV (sha256 в метаданных), пропускается, поэтому прерванный или повторный импорт просто продолжается.
+    Снимки номеров без полного файла (дни между базами rooms_cdc) восстанавливаются по изменениям (sha256 — из манифеста).
+    Возвращает число записанных дней."""
+    written = 0
+    skipped = 0
+    for kind in kinds:
+        rooms_cdc = None
+        if kind == "rooms":
+            # Импорт здесь: rooms_cdc зависит от ostrovok_rooms, а тот — от этого модуля
+            from rooms_cdc import RoomsCDC
+            rooms_cdc = RoomsCDC(DAILY_DIR)
+            days = rooms_cdc.dates()
+        else:
+            days = []
+            for csv_path in sorted((DAILY_DIR / kind).glob("*.csv")):
+                try:
+                    days.append(date.fromisoformat(csv_path.stem))
+                except ValueError:
+                    continue
+        for day in days:
+            if (start and day < start) or (end and day > end):
+                continue
+            csv_path = DAILY_DIR / kind / f"{day.isoformat()}.csv"
+            sha256 = rooms_cdc.sha256(day) if rooms_cdc else file_fingerprint(csv_path)
+            if not force and _partition_source_sha256(kind, day) == sha256:
+                skipped += 1
+                continue
+            if csv_path.exists():
+                with open(csv_path, "r", encoding="utf-8-sig", newline="") as f:
+                    rows = list(csv.DictReader(f))
+            else:
+                try:
+                    rows = rooms_cdc.load(day)[1]
+                except (FileNotFoundError, ValueError) as e:
+                    logger.warning("Снимок %s за %s не восстанавливается: %s", kind, day, e)
+                    continue
+            count = write_day(kind, day, rows, metadata={SOURCE_SHA256_KEY: sha256.encode()})
+            if not count:
+                # 0 — ошибка записи (уже в логе) или пустой CSV: день не считается импортированным
+                continue
+            logger.info("История %s за %s: %s строк", kind, day, count)
+            written += 1
+    if skipped:
+        logger.info("Актуальных партиций пропущено: %s", skipped)
+    return written
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Колоночное хранилище истории daily/* (Parquet)")
+    sub = arg_parser.add_subparsers(dest="command", required=True)
+    backfill_cmd = sub.add_parser("backfill", help="импортировать CSV из daily/ в history/")
+    backfill_cmd.add_argument("--kind", choices=KINDS, action="append")
+    backfill_cmd.add_argument("--from", dest="start", type=date.fromisoformat)
+    backfill_cmd.add_argument("--to", dest="end", type=date.fromisoformat)
+    backfill_cmd.add_argument("--force", action="store_true", help="перезаписать и актуальные партиции")
+    args = arg_parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(name)s: %(message)s")
+    if pa is None:
+        logger.error("Для истории нужен pyarrow: pip install pyarrow")
+        return 1
+    if args.command == "backfill":
+        days = backfill(args.kind or KINDS, args.start, args.end, force=args.force)
+        logger.info("Импортировано дней: %s", days)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
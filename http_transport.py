@@ -0,0 +1,155 @@
+import logging
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
+    'Accept': 'application/json',
+}
+
+
+def _percentile(sorted_values, q):
+    """Перцентиль q (0..100) по заранее отсортированному списку."""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(q / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class TransportStats:
+    """Потокобезопасный сбор замеров: установка соединения (TCP+TLS), TTFB и полное время запроса."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.requests = 0
+        self.new_connections = 0
+        self.bytes_received = 0
+        self.connect_times = []
+        self.ttfb_times = []
+        self.total_times = []
+
+    def record_connect(self, seconds):
+        """Вызывается из соединения urllib3 в том же потоке, что и запрос."""
+        self._local.connect = getattr(self._local, "connect", 0.0) + seconds
+        with self._lock:
+            self.new_connections += 1
+            self.connect_times.append(seconds)
+
+    def begin_request(self):
+        self._local.connect = 0.0
+
+    def end_request(self, elapsed, total, size):
+        """elapsed — response.elapsed (от отправки до заголовков, включая установку соединения)."""
+        connect = getattr(self._local, "connect", 0.0)
+        with self._lock:
+            self.requests += 1
+            self.bytes_received += size
+            self.ttfb_times.append(max(elapsed - connect, 0.0))
+            self.total_times.append(total)
+
+    def summary(self):
+        with self._lock:
+            connect = sorted(self.connect_times)
+            ttfb = sorted(self.ttfb_times)
+            total = sorted(self.total_times)
+            summary = {
+                "requests": self.requests,
+                "new_connections": self.new_connections,
+                "bytes_received": self.bytes_received,
+            }
+        for name, values in (("connect", connect), ("ttfb", ttfb), ("total", total)):
+            summary[f"{name}_p50_ms"] = round(_percentile(values, 50) * 1000, 1)
+            summary[f"{name}_p95_ms"] = round(_percentile(values, 95) * 1000, 1)
+        total_sum = sum(total)
+        summary["connect_share_percent"] = round(sum(connect) / total_sum * 100, 1) if total_sum else 0.0
+        return summary
+
+    def log_summary(self):
+        s = self.summary()
+        if not s["requests"]:
+            return
+        logger.info(
+            "HTTP: запросов %s, новых соединений %s, получено %.1f КБ. "
+            "Соединение p50/p95: %s/%s мс, TTFB p50/p95: %s/%s мс, запрос p50/p95: %s/%s мс. "
+            "Доля установки соединений во времени запросов: %s%%",
+            s["requests"], s["new_connections"], s["bytes_received"] / 1024,
+            s["connect_p50_ms"], s["connect_p95_ms"], s["ttfb_p50_ms"], s["ttfb_p95_ms"],
+            s["total_p50_ms"], s["total_p95_ms"], s["connect_share_percent"],
+        )
+
+
+def _timed_connection(connection_cls, stats):
+    class TimedConnection(connection_cls):
+        def connect(self):
+            start = time.perf_counter()
+            super().connect()
+            stats.record_connect(time.perf_counter() - start)
+
+    return TimedConnection
+
+
+class _TimingAdapter(HTTPAdapter):
+    """HTTPAdapter, чьи пулы создают соединения с замером connect()."""
+
+    def __init__(self, stats, **kwargs):
+        self._stats = stats
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": type("TimedHTTPConnectionPool", (HTTPConnectionPool,), {
+                "ConnectionCls": _timed_connection(HTTPConnection, self._stats),
+            }),
+            "https": type("TimedHTTPSConnectionPool", (HTTPSConnectionPool,), {
+                "ConnectionCls": _timed_connection(HTTPSConnection, self._stats),
+            }),
+        }
+
+
+class PooledTransport:
+    """Общая requests.Session с пулом keep-alive соединений, заголовками и куки, заданными один раз.
+    recorder — FixtureStore, в который сохраняются запросы и ответы (режим записи для офлайн-прогонов)."""
+
+    offline = False
+
+    def __init__(self, pool_size=4, headers=None, timeout=30, recorder=None):
+        self.timeout = timeout
+        self.recorder = recorder
+        self.stats = TransportStats()
+        self.session = requests.Session()
+        adapter = _TimingAdapter(
+            self.stats,
+            pool_connections=2,
+            pool_maxsize=max(1, pool_size),
+            pool_block=True,
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update(DEFAULT_HEADERS)
+        if headers:
+            self.session.headers.update(headers)
+
+    def set_cookies(self, cookies):
+        """Заменяет куки сессии (dict name -> value)."""
+        self.session.cookies.clear()
+        requests.utils.add_dict_to_cookiejar(self.session.cookies, cookies or {})
+
+    def post(self, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        self.stats.begin_request()
+        start = time.perf_counter()
+        response = self.session.post(url, **kwargs)
+        total = time.perf_counter() - start
+        self.stats.end_request(response.elapsed.total_seconds(), total, len(response.content or b""))
+        if self.recorder is not None:
+            self.recorder.record_response(url, kwargs.get("json"), response)
+        return response
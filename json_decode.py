@@ -0,0 +1,110 @@
+import json
+import logging
+import os
+from typing import Any, List, Optional, TypedDict
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+# Декодер ответов API (JSON_DECODER): auto, msgspec, orjson или json.
+# auto: для схемы — msgspec (декодирует только поля схемы), без схемы — orjson (быстрее полного msgspec)
+DEFAULT_BACKEND = "auto"
+_AUTO_ORDER = {True: ("msgspec", "orjson", "json"), False: ("orjson", "msgspec", "json")}
+
+
+def _pick_backend(name=None, typed=False):
+    name = (name or os.environ.get("JSON_DECODER") or DEFAULT_BACKEND).lower()
+    available = {"msgspec": msgspec is not None, "orjson": orjson is not None, "json": True}
+    if name != "auto":
+        if available.get(name):
+            return name
+        logger.warning("Декодер JSON %s недоступен, выбирается автоматически", name)
+    return next(backend for backend in _AUTO_ORDER[typed] if available[backend])
+
+
+# Схема ответа hp/search: только поля, которые читает OstrovokRoomsDailyParser._extract_room_data.
+# TypedDict декодируется msgspec в обычный dict, остальные поля ответа (переводы, условия тарифов,
+# налоги и т.п.) пропускаются без создания объектов. Листья — Any, контейнеры — Optional,
+# чтобы null и неожиданные значения доходили до разбора так же, как при полном декодировании.
+class _PaymentType(TypedDict, total=False):
+    amount: Any
+    show_amount: Any
+
+
+class _PaymentOptions(TypedDict, total=False):
+    payment_types: Optional[List[_PaymentType]]
+
+
+class _RoomTranslation(TypedDict, total=False):
+    bedding_type: Any
+    beds: Any
+
+
+class _RoomDataTrans(TypedDict, total=False):
+    ru: Optional[_RoomTranslation]
+
+
+class _Room(TypedDict, total=False):
+    rg_hash: Any
+    room_name: Any
+    allotment: Any
+    bedding_data: Any
+    multi_bed_data: Any
+    room_data_trans: Optional[_RoomDataTrans]
+
+
+class _Rate(TypedDict, total=False):
+    payment_options: Optional[_PaymentOptions]
+    rooms: Optional[List[_Room]]
+
+
+class HotelPageResponse(TypedDict, total=False):
+    ota_hotel_id: Any
+    master_id: Any
+    rates: Optional[List[_Rate]]
+
+
+class JsonDecoder:
+    """Декодирует тело ответа (bytes/str) выбранным бэкендом.
+    schema — TypedDict с нужными полями: с msgspec декодируются только они; если ответ не совпал
+    со схемой по типам, он декодируется целиком (поведение как у response.json()).
+    Ошибка разбора JSON — ValueError при любом бэкенде."""
+
+    def __init__(self, schema=None, backend=None):
+        self.backend = _pick_backend(backend, typed=schema is not None)
+        self.schema = schema
+        self._typed = None
+        self._untyped = None
+        if self.backend == "msgspec":
+            self._untyped = msgspec.json.Decoder()
+            if schema is not None:
+                self._typed = msgspec.json.Decoder(schema)
+
+    def decode(self, data):
+        if self.backend == "msgspec":
+            try:
+                if self._typed is not None:
+                    try:
+                        return self._typed.decode(data)
+                    except msgspec.ValidationError:
+                        pass
+                return self._untyped.decode(data)
+            except msgspec.DecodeError as e:
+                raise ValueError(str(e)) from e
+        if self.backend == "orjson":
+            return orjson.loads(data)
+        return json.loads(data)
+
+
+# Общие декодеры: ответ hp/search по отелю (по схеме) и выдача SERP (целиком)
+decode_hotel_page = JsonDecoder(HotelPageResponse).decode
+decode_serp = JsonDecoder().decode
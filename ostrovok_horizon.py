@@ -0,0 +1,231 @@
+import argparse
+import csv
+import logging
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from catalog_store import CATALOG_CSV_PATH
+from checkpoint_journal import CheckpointJournal
+from log_config import setup_logging, get_log_file_path, send_telegram_summary
+from ostrovok_rooms import OstrovokRoomsDailyParser, ROOMS_FIELDNAMES
+from ostrovok_statistic import DAILY_DIR, STATISTICS_FIELDNAMES, RoomsStatsAccumulator, _build_statistics, _csv_str
+from rate_control import RateController, DEFAULT_RATE
+from run_metrics import metrics
+
+# Настройка stdout для корректного вывода Юникода и сброс буфера в CI
+if sys.stdout.encoding != 'utf-8':
+    sys.stdout.reconfigure(encoding='utf-8')
+sys.stdout.reconfigure(line_buffering=True)
+
+logger = logging.getLogger(__name__)
+
+# Горизонт заездов: D+1 … D+HORIZON_DAYS, проживание HORIZON_NIGHTS ночей
+DEFAULT_HORIZON_DAYS = 30
+DEFAULT_HORIZON_NIGHTS = 1
+# Целевая пропускная способность, запросов в минуту: предел общего RateController на всю матрицу
+DEFAULT_HORIZON_TARGET_RPM = 240
+# daily/horizon/{дата сбора}/rooms/{дата заезда}.csv и .../statistics/{дата заезда}.csv
+HORIZON_DIR = DAILY_DIR / "horizon"
+HORIZON_STATISTICS_FIELDNAMES = STATISTICS_FIELDNAMES + ["arrival_date"]
+
+
+def _env_int(name, default):
+    try:
+        return int(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _run_date():
+    """Дата запуска по RUN_TZ (по умолчанию Asia/Irkutsk)."""
+    tz_name = os.environ.get("RUN_TZ", "Asia/Irkutsk")
+    try:
+        return datetime.now(ZoneInfo(tz_name)).date()
+    except Exception:
+        return date.today()
+
+
+def arrival_dates(run_date, days, start_offset=1):
+    """Даты заезда горизонта: run_date + start_offset … run_date + start_offset + days - 1."""
+    return [run_date + timedelta(days=offset) for offset in range(start_offset, start_offset + days)]
+
+
+def build_request_matrix(hotels, arrivals):
+    """Матрица запросов (дата заезда, индекс отеля, строка отеля) по датам: сначала все отели первой даты,
+    затем второй и т.д. — даты завершаются по очереди и пишутся, не дожидаясь конца всего горизонта."""
+    return [(arrival, index, hotel_row) for arrival in arrivals for index, hotel_row in enumerate(hotels)]
+
+
+class HorizonCrawler:
+    """Номера по всем отелям на каждую дату заезда горизонта за один запуск.
+    Все запросы матрицы (отель × дата заезда) идут через один пул потоков и один парсер номеров:
+    общие keep-alive соединения, лимит на хост и адаптивный RateController с пределом target_rpm / 60 запр/с.
+    Результаты каждой даты пишутся в daily/horizon/{дата сбора}/rooms и statistics, как только готовы все её отели;
+    журнал контрольных точек позволяет продолжить прерванный запуск."""
+
+    def __init__(self, days=None, nights=None, target_rpm=None, workers=None, parser=None):
+        self.days = max(1, days if days is not None else _env_int("HORIZON_DAYS", DEFAULT_HORIZON_DAYS))
+        self.nights = max(1, nights if nights is not None else _env_int("HORIZON_NIGHTS", DEFAULT_HORIZON_NIGHTS))
+        self.target_rpm = max(1, target_rpm if target_rpm is not None else _env_int(
+            "HORIZON_TARGET_RPM", DEFAULT_HORIZON_TARGET_RPM,
+        ))
+        self.parser = parser or OstrovokRoomsDailyParser(workers=workers)
+        self.workers = self.parser.workers
+        max_rate = self.target_rpm / 60
+        self.parser.rate_controller = RateController(rate=min(DEFAULT_RATE, max_rate), max_rate=max_rate)
+        self.rows_written = 0
+
+    def _load_hotels(self, run_date, hotels_csv=None):
+        """Список отелей: указанный CSV, иначе daily/hotels за дату запуска, иначе каталог всех известных отелей."""
+        candidates = [hotels_csv] if hotels_csv else [
+            self.parser.daily_dir / "hotels" / f"{run_date.isoformat()}.csv", CATALOG_CSV_PATH,
+        ]
+        for path in candidates:
+            hotels = self.parser._read_hotels_from_csv(path)
+            if hotels:
+                logger.info("Список отелей: %s (%s)", path, len(hotels))
+                return hotels
+        return []
+
+    def _output_dir(self, run_date, kind):
+        # Регион не по умолчанию — в daily/regions/{key}/horizon
+        root = HORIZON_DIR if self.parser.write_history else self.parser.daily_dir / "horizon"
+        path = root / run_date.isoformat() / kind
+        path.mkdir(parents=True, exist_ok=True)
+        return path
+
+    def _write_date(self, run_date, arrival, hotels, rows_by_index):
+        """Номера и статистика одной даты заезда (строки отелей — в порядке списка отелей)."""
+        rooms = [row for index in sorted(rows_by_index) for row in rows_by_index[index]]
+        rooms_csv = self._output_dir(run_date, "rooms") / f"{arrival.isoformat()}.csv"
+        try:
+            with open(rooms_csv, 'w', encoding='utf-8-sig', newline='') as csv_file:
+                writer = csv.DictWriter(csv_file, fieldnames=ROOMS_FIELDNAMES, delimiter=',', quoting=csv.QUOTE_MINIMAL)
+                writer.writeheader()
+                writer.writerows(rooms)
+        except Exception as e:
+            logger.error("Ошибка при сохранении CSV %s: %s", rooms_csv, e)
+            return
+
+        accumulator = RoomsStatsAccumulator()
+        accumulator.add_rows(rooms)
+        hotels_data = {
+            row["ota_hotel_id"]: {"name": row.get("name", ""), "rooms_number": _csv_str(row.get("rooms_number", ""))}
+            for row in hotels if row.get("ota_hotel_id")
+        }
+        statistics = _build_statistics(run_date, hotels_data, accumulator.stats)
+        statistics_csv = self._output_dir(run_date, "statistics") / f"{arrival.isoformat()}.csv"
+        try:
+            with open(statistics_csv, 'w', encoding='utf-8-sig', newline='') as csv_file:
+                writer = csv.DictWriter(
+                    csv_file, fieldnames=HORIZON_STATISTICS_FIELDNAMES, delimiter=',', quoting=csv.QUOTE_MINIMAL,
+                )
+                writer.writeheader()
+                for row in statistics:
+                    writer.writerow({**row, "arrival_date": arrival.isoformat()})
+        except Exception as e:
+            logger.error("Ошибка при сохранении статистики %s: %s", statistics_csv, e)
+        self.rows_written += len(rooms)
+        metrics.count("horizon", "rows", len(rooms))
+        metrics.count("horizon", "dates")
+        logger.info("Заезд %s: %s номеров, %s отелей в статистике", arrival, len(rooms), len(statistics))
+
+    @metrics.timed("horizon")
+    def run(self, run_date=None, hotels=None, hotels_csv=None, start_offset=1):
+        """Обходит матрицу отель × дата заезда. Возвращает число дат, записанных полностью."""
+        run_date = run_date or _run_date()
+        if hotels is None:
+            hotels = self._load_hotels(run_date, hotels_csv)
+        if not hotels:
+            logger.warning("Не удалось загрузить список отелей.")
+            return 0
+
+        arrivals = arrival_dates(run_date, self.days, start_offset)
+        matrix = build_request_matrix(hotels, arrivals)
+        logger.info(
+            "Горизонт: заезды %s — %s (%s ночей), отелей %s, запросов %s. Цель %s запр/мин (~%.0f мин), потоков %s",
+            arrivals[0], arrivals[-1], self.nights, len(hotels), len(matrix),
+            self.target_rpm, len(matrix) / self.target_rpm, self.workers,
+        )
+
+        journal = CheckpointJournal(self.parser.journal_name.replace("rooms", "horizon", 1), run_date)
+        done = {key: entry.get("rows") or [] for key, entry in journal.load().items()}
+        if done:
+            logger.info("Возобновление по журналу %s: готово запросов %s из %s", journal.path, len(done), len(matrix))
+        # Сохранённая сессия проверяется запросом по первому отелю, как в get_all_rooms
+        hotel_ids = (self.parser._extract_hotel_id(row.get("url") or "") for row in hotels)
+        self.parser._load_cookies(probe_hotel_id=next((hotel_id for hotel_id in hotel_ids if hotel_id), None))
+
+        def process(arrival, hotel_row):
+            key = f"{arrival.isoformat()}|{self.parser._hotel_key(hotel_row)}"
+            if key in done:
+                return key, done[key], False
+            departure = arrival + timedelta(days=self.nights)
+            return key, self.parser._process_hotel(hotel_row, arrival, departure), True
+
+        pending = {arrival: len(hotels) for arrival in arrivals}
+        results = {arrival: {} for arrival in arrivals}
+        written = 0
+
+        def collect(arrival, index, future):
+            nonlocal written
+            key, rows, fresh = future.result()
+            if fresh and rows:
+                journal.append(key, rows=rows)
+            results[arrival][index] = rows
+            pending[arrival] -= 1
+            if not pending[arrival]:
+                self._write_date(run_date, arrival, hotels, results.pop(arrival))
+                written += 1
+
+        start = time.perf_counter()
+        requests_before = self.parser.transport.stats.requests
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="horizon") as executor:
+            in_flight = deque()
+            for arrival, index, hotel_row in matrix:
+                in_flight.append((arrival, index, executor.submit(process, arrival, hotel_row)))
+                if len(in_flight) >= 2 * self.workers:
+                    collect(*in_flight.popleft())
+            while in_flight:
+                collect(*in_flight.popleft())
+        journal.remove()
+
+        elapsed = time.perf_counter() - start
+        requests = self.parser.transport.stats.requests - requests_before
+        rpm = requests / elapsed * 60 if elapsed else 0.0
+        self.parser.transport.stats.log_summary()
+        self.parser.rate_controller.log_summary()
+        metrics.add_transport("horizon", self.parser.transport.stats)
+        metrics.count("horizon", "retries", self.parser.rate_controller.retries)
+        metrics.count("horizon", "requests_per_minute", round(rpm, 1))
+        logger.info(
+            "Горизонт завершён: дат %s из %s, номеров %s, запросов %s за %.1f мин — %.0f запр/мин (цель %s)",
+            written, len(arrivals), self.rows_written, requests, elapsed / 60, rpm, self.target_rpm,
+        )
+        return written
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Номера и статистика по датам заезда на горизонт вперёд")
+    arg_parser.add_argument("--days", type=int, help="число дат заезда (по умолчанию HORIZON_DAYS или 30)")
+    arg_parser.add_argument("--nights", type=int, help="ночей проживания (по умолчанию HORIZON_NIGHTS или 1)")
+    arg_parser.add_argument("--target-rpm", type=int, help="предел запросов в минуту (по умолчанию HORIZON_TARGET_RPM или 240)")
+    arg_parser.add_argument("--workers", type=int, help="число потоков (по умолчанию ROOMS_WORKERS)")
+    arg_parser.add_argument("--hotels", help="CSV со списком отелей (по умолчанию daily/hotels за сегодня или каталог)")
+    args = arg_parser.parse_args()
+
+    run_date = _run_date()
+    setup_logging(log_file=get_log_file_path(run_date))
+
+    crawler = HorizonCrawler(days=args.days, nights=args.nights, target_rpm=args.target_rpm, workers=args.workers)
+    written = crawler.run(run_date, hotels_csv=args.hotels)
+    metrics.save(run_date, run="horizon")
+    send_telegram_summary(
+        f"Ostrovok: горизонт {crawler.days} дней. Дат записано: {written}. "
+        f"Номеров: {crawler.rows_written}. Дата: {run_date}.\n{metrics.summary()}"
+    )
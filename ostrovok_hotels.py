@@ -1,14 +1,28 @@
 from playwright.sync_api import sync_playwright
-import time
+from playwright.async_api import async_playwright
 import sys
 import os
+import asyncio
 import csv
+import json
 import logging
+import time
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date, timedelta, datetime
 from zoneinfo import ZoneInfo
 from urllib.parse import urlparse, parse_qs, urlencode, urlunparse
 
+from http_transport import PooledTransport
+from json_decode import decode_serp
+from fixture_store import KIND_SERP, recorder_from_env
+from replay_transport import replay_transport_from_env
+from regions import get_region, is_default_region, region_daily_dir
+from run_metrics import metrics
+from session_store import SessionStore
+from checkpoint_journal import CheckpointJournal
+import history_store
+from catalog_store import HotelCatalogStore, CATALOG_FIELDNAMES
 from log_config import setup_logging, get_log_file_path, send_telegram_summary
 
 # Настройка stdout для корректного вывода Юникода и сброс буфера в CI
@@ -19,20 +33,84 @@ sys.stdout.reconfigure(line_buffering=True)
 logger = logging.getLogger(__name__)
 
 
+# Заголовки перехваченного запроса SERP, которые не переносятся в прямой HTTP-запрос
+_SERP_SKIP_HEADERS = {"content-length", "cookie", "host", "connection", "accept-encoding"}
+DEFAULT_SERP_WORKERS = 4
+# Число вкладок браузера для параллельного обхода страниц выдачи (1 — последовательно в одной вкладке)
+DEFAULT_BROWSER_PAGES = 4
+HOTELS_FIELDNAMES = [
+    'city',
+    'ota_hotel_id',
+    'master_id',
+    'name',
+    'name_en',
+    'address',
+    'latitude',
+    'longitude',
+    'url',
+    'rooms_number'
+]
+# Офлайн-прогон: сколько раз повторять страницу выдачи, на которой записанный ответ пришёл с ошибкой профиля
+OFFLINE_SERP_ATTEMPTS = 3
+
+
+_BROWSER_LAUNCH_OPTIONS = {
+    "headless": True,
+    "args": ["--disable-blink-features=AutomationControlled"],
+}
+_BROWSER_CONTEXT_OPTIONS = {
+    "user_agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+    "locale": 'ru-RU',
+    "viewport": {"width": 1920, "height": 1080},
+}
+
+
 def _is_ci():
     return os.environ.get("GITHUB_ACTIONS") == "true" or os.environ.get("CI") == "true"
 
 
+def _env_int(name, default):
+    try:
+        return int(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
 class OstrovokHotelsDailyParser:
-    def __init__(self):
-        self.base_url = "https://ostrovok.ru/hotel/russia/western_siberia_irkutsk_oblast_multi/"
+    def __init__(self, serp_replay=None, serp_workers=None, browser_pages=None, transport=None, region=None):
+        # Регион обхода — из regions.json (region или OSTROVOK_REGION, по умолчанию Иркутская область)
+        self.region = get_region(region)
+        self.base_url = self.region.search_url
         self.api_endpoint = "/hotel/search/v2/site/serp"
-        self.region_id = "965821539"  # ID региона для Иркутской области
+        self.region_id = str(self.region.region_id)
         self.all_hotels = []
         self.current_dir = Path(__file__).parent
+        # Выходные файлы региона: daily/ для региона по умолчанию, иначе daily/regions/{key}; история — только по умолчанию
+        self.daily_dir = region_daily_dir(self.region, self.current_dir / 'daily')
+        self.write_history = is_default_region(self.region)
+        self.journal_name = "hotels" if self.write_history else f"hotels-{self.region.key}"
         self.ci = _is_ci()
+        # Режим прямых запросов к SERP API: браузер нужен только для первой страницы
+        if serp_replay is None:
+            serp_replay = os.environ.get("HOTELS_SERP_REPLAY", "1") != "0"
+        self.serp_replay = serp_replay
+        if serp_workers is None:
+            serp_workers = _env_int("HOTELS_SERP_WORKERS", DEFAULT_SERP_WORKERS)
+        self.serp_workers = max(1, serp_workers)
+        # Без прямых запросов страницы выдачи обходятся пулом вкладок (async Playwright)
+        if browser_pages is None:
+            browser_pages = _env_int("HOTELS_BROWSER_PAGES", DEFAULT_BROWSER_PAGES)
+        self.browser_pages = max(1, browser_pages)
+        self._serp_template = None
+        # Размер страницы выдачи — из ответа SERP на первую страницу
+        self._serp_page_size = None
+        self._journal = None
+        # Офлайн-прогон: страницы выдачи из записанных ответов (transport или OSTROVOK_REPLAY), без браузера.
+        # OSTROVOK_RECORD — запись ответов SERP и шаблона запроса для таких прогонов
+        self._serp_transport = transport if transport is not None else replay_transport_from_env()
+        self.recorder = None if self._serp_transport is not None else recorder_from_env()
         if self.ci:
-            logger.info("Режим CI: увеличенные таймауты и ожидание networkidle.")
+            logger.info("Режим CI: увеличенные таймауты.")
     
     def _run_date(self):
         """Дата запуска по RUN_TZ (по умолчанию Asia/Irkutsk)."""
@@ -42,8 +120,10 @@ class OstrovokHotelsDailyParser:
         except Exception:
             return date.today()
     
-    def get_all_hotels_list(self):
-        """Основная функция для парсинга списка отелей на следующие 2 дня"""
+    @metrics.timed("hotels")
+    def get_all_hotels_list(self, save_csv=True):
+        """Основная функция для парсинга списка отелей на следующие 2 дня.
+        save_csv=False — не писать daily/hotels (конвейер пишет CSV сам, вне критического пути)."""
         logger.info("Запуск парсера отелей...")
         today = self._run_date()
         arrival_date = today + timedelta(days=1)
@@ -52,27 +132,40 @@ class OstrovokHotelsDailyParser:
         
         logger.info("Даты бронирования: %s - %s", arrival_date.strftime('%d.%m.%Y'), departure_date.strftime('%d.%m.%Y'))
         
-        with sync_playwright() as p:
-            browser = p.chromium.launch(
-                headless=True,
-                args=["--disable-blink-features=AutomationControlled"]
-            )
-            context = browser.new_context(
-                user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-                locale='ru-RU',
-                viewport={"width": 1920, "height": 1080}
-            )
-            page = context.new_page()
-            
-            self._setup_response_interceptor(page)
-            self._parse_all_pages_with_pagination(page, search_url)
-            # Даём время запоздалым ответам API прийти до закрытия (в CI дольше)
-            time.sleep(15 if self.ci else 8)
-            browser.close()
+        # Журнал контрольных точек: повторный запуск за ту же дату продолжает со следующей страницы
+        self._journal = CheckpointJournal(self.journal_name, today)
+        start_page, finished = self._resume_from_journal()
+        
+        if finished:
+            logger.info("Все страницы выдачи уже есть в журнале — браузер не запускается.")
+        elif self._serp_transport is not None and self._serp_transport.offline:
+            self._parse_all_pages_offline(start_page)
+        elif not self.serp_replay and self.browser_pages > 1:
+            asyncio.run(self._parse_all_pages_with_page_pool(search_url, start_page=start_page))
+        else:
+            with sync_playwright() as p:
+                browser = p.chromium.launch(**_BROWSER_LAUNCH_OPTIONS)
+                context = browser.new_context(**_BROWSER_CONTEXT_OPTIONS)
+                page = context.new_page()
+                
+                self._setup_response_interceptor(page)
+                if self.serp_replay:
+                    self._parse_all_pages_with_replay(page, context, search_url, start_page=start_page)
+                else:
+                    self._parse_all_pages_with_pagination(page, search_url, start_page=start_page)
+                # Сессия браузера переиспользуется этапом rooms без запуска Chromium
+                SessionStore().save(context.storage_state(), user_agent=_BROWSER_CONTEXT_OPTIONS["user_agent"])
+                browser.close()
+        # Обход выдачи завершён — журнал больше не нужен
+        self._journal.remove()
+        if self.recorder is not None and self.all_hotels:
+            self.recorder.save_meta(hotels=self.all_hotels)
         
         if self.all_hotels:
             self._deduplicate_hotels()
-            self._save_to_csv()
+            metrics.count("hotels", "rows", len(self.all_hotels))
+            if save_csv:
+                self._save_to_csv()
             logger.info("Парсинг завершён. Всего обработано %s отелей.", len(self.all_hotels))
         else:
             logger.warning("Не удалось извлечь данные об отелях.")
@@ -92,41 +185,203 @@ class OstrovokHotelsDailyParser:
         )
         return url
     
-    def _setup_response_interceptor(self, page):
-        """Перехват ответов от API Ostrovok"""
-        def handle_response(response):
-            if (response.request.method == "POST" and 
+    def _resume_from_journal(self):
+        """Загружает из журнала непрерывный ряд страниц 1..k. Возвращает (страница, с которой продолжать; дошли ли до конца)."""
+        pages = self._journal.load()
+        page_number = 1
+        # Размер страницы выдачи записан вместе со страницей 1
+        self._serp_page_size = (pages.get("1") or {}).get("page_size")
+        while str(page_number) in pages:
+            entry = pages[str(page_number)]
+            self.all_hotels.extend(entry.get("hotels") or [])
+            if entry.get("is_last"):
+                logger.info("Возобновление по журналу %s: страницы 1–%s (%s отелей), конец списка", self._journal.path, page_number, len(self.all_hotels))
+                return page_number, True
+            page_number += 1
+        if page_number > 1:
+            logger.info("Возобновление по журналу %s: страницы 1–%s (%s отелей)", self._journal.path, page_number - 1, len(self.all_hotels))
+        return page_number, False
+
+    def _journal_page(self, page_number, hotels, is_last):
+        """Записывает страницу выдачи в журнал контрольных точек (пустые страницы не записываются).
+        Со страницей 1 сохраняется размер страницы, чтобы возобновлённый обход узнавал короткую последнюю страницу."""
+        if self._journal is not None and hotels:
+            extra = {"page_size": self._serp_page_size} if page_number == 1 else {}
+            self._journal.append(page_number, hotels=hotels, is_last=is_last, **extra)
+
+    def _add_page_hotels(self, page_number, hotels, is_last):
+        self.all_hotels.extend(hotels)
+        self._journal_page(page_number, hotels, is_last)
+
+    def _is_serp_response(self, response):
+        """Ответ API SERP с результатами поиска (POST .../serp?session=...)."""
+        return (response.request.method == "POST" and
                 self.api_endpoint in response.url and
                 response.status == 200 and
-                "session=" in response.url):
-                
-                try:
-                    if "json" in response.headers.get("content-type", "").lower():
-                        json_data = response.json()
-                        
-                        if isinstance(json_data, dict) and "hotels" in json_data:
-                            hotels = json_data.get("hotels")
-                            if hotels and isinstance(hotels, list) and len(hotels) > 0:
-                                extracted_hotels = self._extract_hotels_from_json(json_data)
-                                if extracted_hotels:
-                                    self.all_hotels.extend(extracted_hotels)
-                                    logger.info("Перехвачено и извлечено %s отелей. Всего: %s", len(extracted_hotels), len(self.all_hotels))
-                except Exception as e:
-                    msg = str(e)
-                    if ("No resource with given identifier" not in msg and "getResponseBody" not in msg
-                            and "Target page, context or browser has been closed" not in msg):
-                        logger.error("Ошибка разбора ответа API: %s", e)
-        
+                "session=" in response.url)
+
+    def _setup_response_interceptor(self, page):
+        """Перехват запросов к API Ostrovok: сохраняет шаблон запроса SERP для прямых запросов к API.
+        Сами ответы разбираются там, где их ждут (page.expect_response)."""
+        def handle_response(response):
+            if self._serp_template is None and self._is_serp_response(response):
+                self._capture_serp_template(response.request)
+
         page.on("response", handle_response)
-    
-    def _parse_all_pages_with_pagination(self, page, base_search_url):
-        """Парсинг всех страниц с пагинацией"""
-        current_page = 1
-        max_pages = 100
+
+    def _read_serp_page(self, json_data, page_number):
+        """Отели страницы SERP и признак последней страницы.
+        Последняя — если в ответе нет отелей или страница короче первой (страницы выдачи одного размера).
+        Общего числа отелей или страниц в ответе SERP нет, поэтому конец списка определяется только так.
+        Размер страницы берётся только со страницы 1: её нужно прочитать до того, как запрошены следующие."""
+        raw_hotels = json_data.get("hotels") if isinstance(json_data, dict) else None
+        raw_count = len(raw_hotels) if isinstance(raw_hotels, list) else 0
+        if not raw_count:
+            return [], True
+
+        if page_number == 1:
+            self._serp_page_size = raw_count
+
+        is_last = bool(self._serp_page_size and raw_count < self._serp_page_size)
+        return self._extract_hotels_from_json(json_data), is_last
+
+    def _capture_serp_template(self, request):
+        """Сохраняет URL (с session=), заголовки и тело POST-запроса SERP для повторения без браузера."""
+        try:
+            payload = json.loads(request.post_data or "")
+        except (TypeError, ValueError):
+            logger.warning("Тело запроса SERP не JSON — прямые запросы к API недоступны.")
+            return
+        if not isinstance(payload, dict):
+            return
+        headers = {
+            name: value for name, value in request.headers.items()
+            if not name.startswith(":") and name.lower() not in _SERP_SKIP_HEADERS
+        }
+        self._serp_template = {"url": request.url, "headers": headers, "payload": payload}
+        if self.recorder is not None:
+            self.recorder.save_meta(serp_template={"url": request.url, "payload": payload})
+
+    def _record_serp(self, response, body):
+        """Сохраняет ответ SERP, полученный браузером, в каталог записей (режим OSTROVOK_RECORD)."""
+        if self.recorder is None:
+            return
+        try:
+            payload = json.loads(response.request.post_data or "null")
+        except (TypeError, ValueError):
+            payload = None
+        self.recorder.record(KIND_SERP, response.url, payload, response.status, body)
+
+    def _serp_payload_for_page(self, page_number):
+        """Тело запроса SERP для страницы page_number (ключ page на верхнем уровне или во вложенном объекте)."""
+        payload = json.loads(json.dumps(self._serp_template["payload"]))
+        if "page" in payload:
+            payload["page"] = page_number
+            return payload
+        for value in payload.values():
+            if isinstance(value, dict) and "page" in value:
+                value["page"] = page_number
+                return payload
+        return None
+
+    def _replay_serp_page(self, transport, page_number):
+        """Прямой POST к SERP API. Возвращает (отели страницы, признак последней страницы)."""
+        payload = self._serp_payload_for_page(page_number)
+        if payload is None:
+            raise ValueError("в теле запроса SERP нет номера страницы")
+        response = transport.post(self._serp_template["url"], json=payload)
+        if response.status_code != 200:
+            raise ValueError(f"HTTP {response.status_code}")
+        json_data = decode_serp(response.content)
+        if not isinstance(json_data, dict) or "hotels" not in json_data:
+            raise ValueError("в ответе нет поля hotels")
+        return self._read_serp_page(json_data, page_number)
+
+    def _replay_serp_pages(self, cookies, start_page, max_pages=100):
+        """Забирает страницы start_page.. параллельно, пачками по serp_workers запросов.
+        Возвращает None, если дошли до конца списка, иначе номер страницы, на которой повтор не удался."""
+        transport = self._serp_transport or PooledTransport(
+            pool_size=self.serp_workers, headers=self._serp_template["headers"], recorder=self.recorder,
+        )
+        transport.set_cookies({cookie["name"]: cookie["value"] for cookie in cookies})
+        next_page = start_page
+        try:
+            with ThreadPoolExecutor(max_workers=self.serp_workers, thread_name_prefix="serp") as executor:
+                while next_page <= max_pages:
+                    # Страница 1 (офлайн-прогон начинается без браузера) — отдельной пачкой: по ней определяется
+                    # размер страницы, с которым сравниваются остальные
+                    batch_size = 1 if next_page == 1 else self.serp_workers
+                    batch = list(range(next_page, min(next_page + batch_size, max_pages + 1)))
+                    futures = [executor.submit(self._replay_serp_page, transport, n) for n in batch]
+                    for page_number, future in zip(batch, futures):
+                        try:
+                            hotels, is_last = future.result()
+                        except Exception as e:
+                            logger.warning("[Страница %s] Прямой запрос к SERP API: %s", page_number, e)
+                            for pending in futures:
+                                pending.cancel()
+                            return page_number
+                        if hotels:
+                            self._add_page_hotels(page_number, hotels, is_last)
+                            logger.info("[API] Страница %s: %s отелей. Всего: %s", page_number, len(hotels), len(self.all_hotels))
+                        if not hotels or is_last:
+                            logger.info("Страница %s — последняя. Конец списка.", page_number)
+                            for pending in futures:
+                                pending.cancel()
+                            return None
+                        next_page = page_number + 1
+        finally:
+            transport.stats.log_summary()
+            # Общий офлайн-транспорт учитывается один раз, после всех попыток (_parse_all_pages_offline)
+            if transport is not self._serp_transport:
+                metrics.add_transport("hotels", transport.stats)
+        return None
+
+    def _parse_all_pages_offline(self, start_page=1):
+        """Все страницы выдачи — из записанных ответов через ReplayTransport (шаблон запроса SERP — из meta.json)."""
+        template = self._serp_transport.store.load_meta().get("serp_template")
+        if not template:
+            logger.error("В записях %s нет шаблона запроса SERP — офлайн-прогон невозможен.", self._serp_transport.store.directory)
+            return
+        self._serp_template = {"url": template["url"], "headers": {}, "payload": template["payload"]}
+        failed_page = start_page
+        for _ in range(OFFLINE_SERP_ATTEMPTS):
+            failed_page = self._replay_serp_pages([], start_page=failed_page)
+            if failed_page is None:
+                break
+        metrics.add_transport("hotels", self._serp_transport.stats)
+        if failed_page is not None:
+            logger.warning("Нет записанного ответа SERP для страницы %s.", failed_page)
+        logger.info("=== Всего собрано отелей со всех страниц: %s ===", len(self.all_hotels))
+
+    def _parse_all_pages_with_replay(self, page, context, base_search_url, start_page=1):
+        """Страница start_page — через браузер (захват сессии и шаблона запроса SERP), остальные — прямыми POST к API.
+        Если повтор не удался, оставшиеся страницы догружаются через браузер."""
+        if self._parse_all_pages_with_pagination(page, base_search_url, start_page=start_page, max_pages=start_page):
+            return
+        if self._serp_template is None:
+            logger.warning("Запрос SERP не перехвачен — продолжаю постранично через браузер.")
+            self._parse_all_pages_with_pagination(page, base_search_url, start_page=start_page + 1)
+            return
+
+        failed_page = self._replay_serp_pages(context.cookies(), start_page=start_page + 1)
+        if failed_page is not None:
+            logger.warning("Прямые запросы к SERP API не удались — продолжаю через браузер со страницы %s.", failed_page)
+            self._parse_all_pages_with_pagination(page, base_search_url, start_page=failed_page)
+        else:
+            logger.info("=== Всего собрано отелей со всех страниц: %s ===", len(self.all_hotels))
+
+    def _parse_all_pages_with_pagination(self, page, base_search_url, start_page=1, max_pages=100):
+        """Парсинг страниц с пагинацией через браузер.
+        Переход к следующей странице — сразу по приходу ответа SERP (page.expect_response), без фиксированных пауз.
+        Возвращает True, если достигнут конец списка."""
+        goto_timeout = 60000 if self.ci else 50000
+        # Ответ SERP ждём не дольше загрузки страницы плюс запас на медленную сеть в CI
+        response_timeout = goto_timeout + (45000 if self.ci else 20000)
+        current_page = start_page
+        reached_end = False
         
         while current_page <= max_pages:
-            hotels_before = len(self.all_hotels)
-            
             if current_page == 1:
                 page_url = base_search_url
             else:
@@ -134,46 +389,101 @@ class OstrovokHotelsDailyParser:
             
             logger.info("--- Страница %s ---", current_page)
             
-            goto_timeout = 60000 if self.ci else 50000
-            
-            def _load_page_and_wait_for_api():
-                """Переход на страницу + в CI ожидание networkidle (все запросы страницы завершены)."""
-                try:
-                    page.goto(page_url, wait_until="load", timeout=goto_timeout)
-                except Exception as e:
-                    logger.warning("[Страница %s] goto: %s", current_page, e)
-                if self.ci:
-                    try:
-                        page.wait_for_load_state("networkidle", timeout=45000)
-                    except Exception:
-                        pass
-                time.sleep(2 if self.ci else 1)
-            
+            json_data = None
+            page_start = time.perf_counter()
             try:
-                _load_page_and_wait_for_api()
+                with page.expect_response(self._is_serp_response, timeout=response_timeout) as response_info:
+                    page.goto(page_url, wait_until="commit", timeout=goto_timeout)
+                body = response_info.value.body()
+                self._record_serp(response_info.value, body)
+                json_data = decode_serp(body)
             except Exception as e:
-                logger.warning("[Страница %s] Загрузка: %s", current_page, e)
-            
-            # Дожидаемся появления отелей (в CI дольше — медленная сеть)
-            max_wait_time = 45 if self.ci else 20
-            start_time = time.time()
-            while len(self.all_hotels) == hotels_before and (time.time() - start_time) < max_wait_time:
-                time.sleep(0.5)
-                if len(self.all_hotels) > hotels_before:
-                    break
-            hotels_added = len(self.all_hotels) - hotels_before
+                logger.warning("[Страница %s] Ответ SERP не получен: %s", current_page, e)
+            metrics.observe("hotels", "browser_page", time.perf_counter() - page_start)
+            metrics.count("hotels", "browser_pages")
             
-            if hotels_added > 0:
-                logger.info("Добавлено %s отелей со страницы %s. Переход на следующую страницу...", hotels_added, current_page)
+            hotels, is_last = self._read_serp_page(json_data, current_page)
+            if hotels:
+                self._add_page_hotels(current_page, hotels, is_last)
+                logger.info("Добавлено %s отелей со страницы %s. Всего: %s", len(hotels), current_page, len(self.all_hotels))
             else:
                 logger.warning("На странице %s отелей не получено. Конец списка.", current_page)
+            if not hotels or is_last:
+                if hotels:
+                    logger.info("Страница %s — последняя. Конец списка.", current_page)
+                reached_end = True
                 break
             
             current_page += 1
-            time.sleep(2.5 if self.ci else 1.5)
         
         logger.info("=== Всего собрано отелей со всех страниц: %s ===", len(self.all_hotels))
+        return reached_end
     
+    async def _load_serp_page_async(self, tab, base_search_url, page_number):
+        """Открывает страницу выдачи page_number во вкладке tab и ждёт ответ SERP. Возвращает (отели, последняя ли)."""
+        goto_timeout = 60000 if self.ci else 50000
+        response_timeout = goto_timeout + (45000 if self.ci else 20000)
+        page_url = base_search_url if page_number == 1 else self._add_page_to_url(base_search_url, page_number)
+
+        json_data = None
+        page_start = time.perf_counter()
+        try:
+            async with tab.expect_response(self._is_serp_response, timeout=response_timeout) as response_info:
+                await tab.goto(page_url, wait_until="commit", timeout=goto_timeout)
+            response = await response_info.value
+            body = await response.body()
+            self._record_serp(response, body)
+            json_data = decode_serp(body)
+        except Exception as e:
+            logger.warning("[Страница %s] Ответ SERP не получен: %s", page_number, e)
+        metrics.observe("hotels", "browser_page", time.perf_counter() - page_start)
+        metrics.count("hotels", "browser_pages")
+        return self._read_serp_page(json_data, page_number)
+
+    async def _parse_all_pages_with_page_pool(self, base_search_url, start_page=1, max_pages=100):
+        """Обход выдачи пулом из browser_pages вкладок одного контекста (общие куки и сессия).
+        Страница start_page грузится первой (размер страницы), остальные раздаются вкладкам параллельно.
+        Отели каждой страницы хранятся под её номером и добавляются в all_hotels по порядку страниц."""
+        hotels_by_page = {}
+
+        async with async_playwright() as p:
+            browser = await p.chromium.launch(**_BROWSER_LAUNCH_OPTIONS)
+            context = await browser.new_context(**_BROWSER_CONTEXT_OPTIONS)
+            tabs = [await context.new_page() for _ in range(self.browser_pages)]
+            logger.info("Параллельный обход выдачи: %s вкладок", len(tabs))
+
+            hotels, is_last = await self._load_serp_page_async(tabs[0], base_search_url, start_page)
+            hotels_by_page[start_page] = hotels
+            self._journal_page(start_page, hotels, is_last)
+            logger.info("Страница %s: %s отелей", start_page, len(hotels))
+            # last_page — номер последней страницы с отелями; уменьшается, как только вкладка увидит конец списка
+            last_page = start_page if not hotels or is_last else max_pages
+            next_page = start_page + 1
+
+            async def worker(tab):
+                nonlocal next_page, last_page
+                while next_page <= last_page:
+                    page_number = next_page
+                    next_page += 1
+                    hotels, is_last = await self._load_serp_page_async(tab, base_search_url, page_number)
+                    hotels_by_page[page_number] = hotels
+                    self._journal_page(page_number, hotels, is_last)
+                    logger.info("Страница %s: %s отелей", page_number, len(hotels))
+                    if not hotels:
+                        last_page = min(last_page, page_number - 1)
+                    elif is_last:
+                        last_page = min(last_page, page_number)
+
+            await asyncio.gather(*(worker(tab) for tab in tabs))
+            SessionStore().save(await context.storage_state(), user_agent=_BROWSER_CONTEXT_OPTIONS["user_agent"])
+            await browser.close()
+
+        for page_number in sorted(hotels_by_page):
+            if page_number > last_page:
+                break
+            self.all_hotels.extend(hotels_by_page[page_number])
+        logger.info("=== Всего собрано отелей со всех страниц: %s (страниц: %s) ===", len(self.all_hotels), last_page)
+
     def _add_page_to_url(self, url, page_number):
         """Добавление номера страницы к URL"""
         parsed = urlparse(url)
@@ -213,7 +523,7 @@ class OstrovokHotelsDailyParser:
                     continue
                 
                 master_id = str(hotel.get("master_id") or static_vm.get("master_id", ""))
-                url = f"https://ostrovok.ru/hotel/russia/irkutsk/mid{master_id}/{ota_hotel_id}"
+                url = f"{self.region.hotel_url}mid{master_id}/{ota_hotel_id}"
                 
                 hotel_data = {
                     "city": static_vm.get("city", ""),
@@ -248,54 +558,42 @@ class OstrovokHotelsDailyParser:
             logger.info("Убрано дубликатов: %s. Уникальных отелей: %s", removed, len(unique))
         self.all_hotels = unique
     
-    def _save_to_csv(self):
-        """Сохранение списка отелей в CSV файл (daily/hotels/YYYY-MM-DD.csv)"""
+    def _save_to_csv(self, run_date=None):
+        """Сохранение списка отелей в CSV файл (daily/hotels/YYYY-MM-DD.csv, по умолчанию за дату запуска)"""
         if not self.all_hotels:
             return
         
-        run_date = self._run_date()
-        output_dir = self.current_dir / 'daily' / 'hotels'
+        run_date = run_date or self._run_date()
+        output_dir = self.daily_dir / 'hotels'
         output_dir.mkdir(parents=True, exist_ok=True)
         csv_filename = output_dir / f'{run_date.isoformat()}.csv'
         
-        fieldnames = [
-            'city',
-            'ota_hotel_id',
-            'master_id',
-            'name',
-            'name_en',
-            'address',
-            'latitude',
-            'longitude',
-            'url',
-            'rooms_number'
-        ]
-        
         try:
             with open(csv_filename, 'w', encoding='utf-8-sig', newline='') as csv_file:
-                writer = csv.DictWriter(csv_file, fieldnames=fieldnames, delimiter=',', quoting=csv.QUOTE_MINIMAL)
+                writer = csv.DictWriter(csv_file, fieldnames=HOTELS_FIELDNAMES, delimiter=',', quoting=csv.QUOTE_MINIMAL)
                 writer.writeheader()
                 for hotel in self.all_hotels:
                     writer.writerow(hotel)
             logger.info("Сохранено %s отелей в %s", len(self.all_hotels), csv_filename)
         except Exception as e:
             logger.error("Ошибка при сохранении CSV: %s", e)
+        # Та же выборка — в колоночную историю (history/hotels)
+        if self.write_history:
+            history_store.write_day("hotels", run_date, self.all_hotels)
 
 
 class OstrovokHotelsCatalog:
     """Ведёт накопленный каталог спарсенных отелей за всё время.
     При каждом запуске — добавляет новые отели и обновляет last_seen_date у существующих.
-    Файл: catalog/hotels.csv"""
+    Хранилище: catalog/hotels.sqlite (история изменений полей — в hotel_changes) — локальный кэш;
+    в git — выгрузки catalog/hotels.csv и catalog/hotel_changes.csv, из которых база собирается заново."""
 
-    FIELDNAMES = [
-        'ota_hotel_id', 'master_id', 'name', 'name_en',
-        'city', 'address', 'latitude', 'longitude', 'url', 'rooms_number',
-        'first_seen_date', 'last_seen_date',
-    ]
+    FIELDNAMES = CATALOG_FIELDNAMES
 
     def __init__(self):
         self.current_dir = Path(__file__).parent
-        self.catalog_path = self.current_dir / 'catalog' / 'hotels.csv'
+        self.store = HotelCatalogStore()
+        self.catalog_path = self.store.csv_path
 
     def _run_date(self):
         tz_name = os.environ.get("RUN_TZ", "Asia/Irkutsk")
@@ -304,81 +602,22 @@ class OstrovokHotelsCatalog:
         except Exception:
             return date.today()
 
-    def _load_existing(self):
-        """Читает текущий каталог."""
-        existing = {}
-        if not self.catalog_path.exists():
-            return existing
+    def update(self, parsed_hotels: list):
+        """Обновляет каталог на основе последнего списка отелей.
+        - Новые отели добавляются с first_seen_date = сегодня.
+        - Существующие — обновляют поля и last_seen_date; изменения полей попадают в историю."""
+        today = self._run_date().isoformat()
         try:
-            with open(self.catalog_path, 'r', encoding='utf-8-sig', newline='') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    hotel_id = row.get('ota_hotel_id', '')
-                    if hotel_id:
-                        existing[hotel_id] = row
+            total, new_count, changes_count = self.store.upsert(parsed_hotels, today)
         except Exception as e:
-            logger.error("Ошибка при чтении каталога %s: %s", self.catalog_path, e)
-        return existing
-
-    def _save(self, hotels: dict):
-        """Сохраняет каталог."""
-        self.catalog_path.parent.mkdir(parents=True, exist_ok=True)
+            logger.error("Ошибка при обновлении каталога %s: %s", self.store.db_path, e)
+            return 0, 0
         try:
-            with open(self.catalog_path, 'w', encoding='utf-8-sig', newline='') as f:
-                writer = csv.DictWriter(f, fieldnames=self.FIELDNAMES, quoting=csv.QUOTE_MINIMAL)
-                writer.writeheader()
-                writer.writerows(hotels.values())
-            logger.info("Каталог сохранён: %s отелей → %s", len(hotels), self.catalog_path)
+            self.store.export_csv()
         except Exception as e:
             logger.error("Ошибка при сохранении каталога: %s", e)
-
-    def update(self, parsed_hotels: list):
-        """Обновляет каталог на основе последнего списка отелей.
-        - Новые отели добавляются с first_seen_date = сегодня.
-        - Существующие — обновляют поля и last_seen_date."""
-        today = self._run_date().isoformat()
-        existing = self._load_existing()
-
-        new_count = 0
-        for hotel in parsed_hotels:
-            hotel_id = hotel.get('ota_hotel_id', '')
-            if not hotel_id:
-                continue
-
-            # Обновляем поля и дату последнего появления
-            if hotel_id in existing:
-                existing[hotel_id].update({
-                    'name':         hotel.get('name', existing[hotel_id]['name']),
-                    'name_en':      hotel.get('name_en', existing[hotel_id]['name_en']),
-                    'city':         hotel.get('city', existing[hotel_id]['city']),
-                    'address':      hotel.get('address', existing[hotel_id]['address']),
-                    'latitude':     hotel.get('latitude', existing[hotel_id].get('latitude', '')),
-                    'longitude':    hotel.get('longitude', existing[hotel_id].get('longitude', '')),
-                    'url':          hotel.get('url', existing[hotel_id]['url']),
-                    'rooms_number': hotel.get('rooms_number', existing[hotel_id]['rooms_number']),
-                    'last_seen_date': today,
-                })
-            # Новый отель
-            else:
-                existing[hotel_id] = {
-                    'ota_hotel_id':   hotel_id,
-                    'master_id':      hotel.get('master_id', ''),
-                    'name':           hotel.get('name', ''),
-                    'name_en':        hotel.get('name_en', ''),
-                    'city':           hotel.get('city', ''),
-                    'address':        hotel.get('address', ''),
-                    'latitude':       hotel.get('latitude', ''),
-                    'longitude':      hotel.get('longitude', ''),
-                    'url':            hotel.get('url', ''),
-                    'rooms_number':   hotel.get('rooms_number', ''),
-                    'first_seen_date': today,
-                    'last_seen_date':  today,
-                }
-                new_count += 1
-
-        self._save(existing)
-        logger.info("Каталог обновлён: всего %s, новых %s", len(existing), new_count)
-        return len(existing), new_count
+        logger.info("Каталог обновлён: всего %s, новых %s, изменённых полей %s", total, new_count, changes_count)
+        return total, new_count
 
 
 def _run_date_for_log():
@@ -398,8 +637,9 @@ if __name__ == "__main__":
     
     catalog = OstrovokHotelsCatalog()
     total, new_count = catalog.update(result)
+    metrics.save(run_date, run="hotels")
 
     send_telegram_summary(
         f"Ostrovok: парсинг отелей завершён. Отелей: {len(result)}."
-        f"Каталог: {total} всего, {new_count} новых. Дата: {run_date}."
+        f"Каталог: {total} всего, {new_count} новых. Дата: {run_date}.\n{metrics.summary()}"
     )
\ No newline at end of file
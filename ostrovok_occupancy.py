@@ -0,0 +1,241 @@
+import argparse
+import csv
+import logging
+import os
+import sys
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from checkpoint_journal import CheckpointJournal
+from log_config import setup_logging, get_log_file_path, send_telegram_summary
+from ostrovok_rooms import OstrovokRoomsDailyParser
+from refresh_scheduler import is_carried
+from rooms_cdc import RoomsCDC
+from run_metrics import metrics
+
+# Настройка stdout для корректного вывода Юникода и сброс буфера в CI
+if sys.stdout.encoding != 'utf-8':
+    sys.stdout.reconfigure(encoding='utf-8')
+sys.stdout.reconfigure(line_buffering=True)
+
+logger = logging.getLogger(__name__)
+
+# Перебор числа взрослых 1..OCCUPANCY_MAX_ADULTS; ответы на 1 взрослого берутся из daily/rooms за дату
+DEFAULT_OCCUPANCY_MAX_ADULTS = 4
+OCCUPANCY_BASE_FIELDNAMES = [
+    "ota_hotel_id",
+    "master_id",
+    "room_name",
+    "rg_hash",
+    "capacity",
+    "capacity_source",
+    "max_adults",
+]
+
+
+def _env_int(name, default):
+    try:
+        return int(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _run_date():
+    """Дата запуска по RUN_TZ (по умолчанию Asia/Irkutsk)."""
+    tz_name = os.environ.get("RUN_TZ", "Asia/Irkutsk")
+    try:
+        return datetime.now(ZoneInfo(tz_name)).date()
+    except Exception:
+        return date.today()
+
+
+def occupancy_fieldnames(max_adults):
+    """Колонки daily/occupancy: номер (rg_hash), max_adults — наибольшее число взрослых, для которого номер
+    продаётся, и цены на каждое число взрослых (price_rub_min_N, price_rub_max_N)."""
+    fieldnames = list(OCCUPANCY_BASE_FIELDNAMES)
+    for adults in range(1, max_adults + 1):
+        fieldnames += [f"price_rub_min_{adults}", f"price_rub_max_{adults}"]
+    return fieldnames
+
+
+def _has_rooms(rows):
+    """В ответе есть номера (строка-заглушка отеля без тарифов имеет пустой rg_hash)."""
+    return any(row.get("rg_hash") for row in rows)
+
+
+def merge_occupancy_rows(rows_by_adults):
+    """Строки отеля по числу взрослых {N: строки _extract_room_data} → строки daily/occupancy по rg_hash
+    в порядке первого появления (сначала номера ответа на 1 взрослого)."""
+    merged = OrderedDict()
+    for adults in sorted(rows_by_adults):
+        for row in rows_by_adults[adults]:
+            rg_hash = row.get("rg_hash")
+            if not rg_hash:
+                continue
+            target = merged.get(rg_hash)
+            if target is None:
+                target = merged[rg_hash] = {key: row.get(key, "") for key in OCCUPANCY_BASE_FIELDNAMES}
+            target["max_adults"] = adults
+            target[f"price_rub_min_{adults}"] = row.get("price_rub_min", "")
+            target[f"price_rub_max_{adults}"] = row.get("price_rub_max", "")
+    return list(merged.values())
+
+
+class OccupancySweep:
+    """Цены и доступность номеров для 1..max_adults взрослых за один запуск.
+    Ответ на 1 взрослого не запрашивается повторно — это строки daily/rooms за дату. Отели без номеров
+    на 1 взрослого и отели, перенесённые без запроса (carried_from), пропускаются целиком, а перебор по отелю
+    останавливается на первом числе взрослых, для которого номеров нет (на большее их тоже не будет).
+    Ошибка запроса не считается отсутствием номеров: отель не попадает ни в результат, ни в журнал, и повторный
+    запуск за ту же дату запросит его заново. Запросы идут через общий парсер номеров
+    (пул потоков, RateController, лимит на хост). Результат — daily/occupancy/{date}.csv."""
+
+    def __init__(self, max_adults=None, workers=None, parser=None):
+        self.max_adults = max(1, max_adults if max_adults is not None else _env_int(
+            "OCCUPANCY_MAX_ADULTS", DEFAULT_OCCUPANCY_MAX_ADULTS,
+        ))
+        self.parser = parser or OstrovokRoomsDailyParser(workers=workers)
+        self.workers = self.parser.workers
+        self.requests = 0
+        self.skipped_hotels = 0
+        self.carried_hotels = 0
+        self.errors = 0
+
+    def _read_base_rows(self, run_date):
+        """Строки снимка daily/rooms за дату (файл или восстановление по rooms_cdc), сгруппированные по отелю
+        в порядке снимка."""
+        hotels = OrderedDict()
+        try:
+            for row in RoomsCDC(self.parser.daily_dir).load(run_date)[1]:
+                hotels.setdefault(row.get("ota_hotel_id", ""), []).append(row)
+        except (FileNotFoundError, ValueError) as e:
+            logger.warning("Нет снимка номеров за %s — перебор по числу взрослых невозможен: %s", run_date, e)
+        hotels.pop("", None)
+        return hotels
+
+    def _sweep_hotel(self, hotel_id, base_rows, arrival_date, departure_date):
+        """Запросы на 2..max_adults взрослых по одному отелю.
+        Возвращает ({N: строки}, число запросов, ошибка) — при ошибке (_search_hotel вернул None) перебор прерван."""
+        rows_by_adults = {1: base_rows}
+        requests = 0
+        for adults in range(2, self.max_adults + 1):
+            requests += 1
+            result = self.parser._search_hotel(hotel_id, arrival_date, departure_date, adults=adults)
+            if result is None:
+                logger.warning("%s: ошибка запроса на %s взрослых, отель будет запрошен при повторном запуске", hotel_id, adults)
+                return rows_by_adults, requests, True
+            rows = self.parser._extract_room_data(result) if result else []
+            if not _has_rooms(rows):
+                break
+            rows_by_adults[adults] = rows
+        return rows_by_adults, requests, False
+
+    def _output_csv_path(self, run_date):
+        output_dir = self.parser.daily_dir / "occupancy"
+        output_dir.mkdir(parents=True, exist_ok=True)
+        return output_dir / f"{run_date.isoformat()}.csv"
+
+    @metrics.timed("occupancy")
+    def run(self, run_date=None):
+        """Перебор по отелям дня. Возвращает число строк daily/occupancy."""
+        run_date = run_date or _run_date()
+        arrival_date = run_date + timedelta(days=1)
+        departure_date = run_date + timedelta(days=2)
+        base = self._read_base_rows(run_date)
+        # Строки перенесённых отелей — прошлое наблюдение, а не ответ на 1 взрослого за эту дату
+        fresh = [(hotel_id, rows) for hotel_id, rows in base.items() if not any(is_carried(row) for row in rows)]
+        self.carried_hotels = len(base) - len(fresh)
+        hotels = [(hotel_id, rows) for hotel_id, rows in fresh if _has_rooms(rows)]
+        self.skipped_hotels = len(fresh) - len(hotels)
+        if not hotels:
+            logger.warning("Нет отелей с номерами для перебора по числу взрослых.")
+            return 0
+        logger.info(
+            "Перебор 1..%s взрослых: отелей с номерами %s (без номеров пропущено %s, перенесённых %s), "
+            "запросов не больше %s",
+            self.max_adults, len(hotels), self.skipped_hotels, self.carried_hotels, len(hotels) * (self.max_adults - 1),
+        )
+
+        journal = CheckpointJournal(self.parser.journal_name.replace("rooms", "occupancy", 1), run_date)
+        done = {key: entry.get("rows") or [] for key, entry in journal.load().items()}
+        self.parser._load_cookies(probe_hotel_id=hotels[0][0])
+
+        def process(hotel_id, base_rows):
+            if hotel_id in done:
+                return done[hotel_id], 0, False, False
+            rows_by_adults, requests, failed = self._sweep_hotel(hotel_id, base_rows, arrival_date, departure_date)
+            return merge_occupancy_rows(rows_by_adults), requests, True, failed
+
+        output = []
+
+        def collect(hotel_id, future):
+            rows, requests, fresh, failed = future.result()
+            self.requests += requests
+            if failed:
+                # Неполный перебор занизил бы max_adults — отель пропускается до повторного запуска
+                self.errors += 1
+                return
+            if fresh:
+                journal.append(hotel_id, rows=rows)
+            output.extend(rows)
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="occupancy") as executor:
+            in_flight = deque()
+            for hotel_id, base_rows in hotels:
+                in_flight.append((hotel_id, executor.submit(process, hotel_id, base_rows)))
+                if len(in_flight) >= 2 * self.workers:
+                    collect(*in_flight.popleft())
+            while in_flight:
+                collect(*in_flight.popleft())
+
+        output_csv = self._output_csv_path(run_date)
+        try:
+            with open(output_csv, 'w', encoding='utf-8-sig', newline='') as csv_file:
+                writer = csv.DictWriter(
+                    csv_file, fieldnames=occupancy_fieldnames(self.max_adults), delimiter=',', quoting=csv.QUOTE_MINIMAL,
+                )
+                writer.writeheader()
+                writer.writerows(output)
+            logger.info("Сохранено %s номеров в %s", len(output), output_csv)
+        except Exception as e:
+            logger.error("Ошибка при сохранении CSV %s: %s", output_csv, e)
+            return 0
+        if self.errors:
+            logger.warning(
+                "Отелей с ошибками запросов: %s — журнал %s сохранён, повторный запуск запросит только их",
+                self.errors, journal.path,
+            )
+        else:
+            journal.remove()
+
+        metrics.count("occupancy", "requests", self.requests)
+        metrics.count("occupancy", "skipped_hotels", self.skipped_hotels)
+        metrics.count("occupancy", "carried_hotels", self.carried_hotels)
+        metrics.count("occupancy", "errors", self.errors)
+        metrics.count("occupancy", "rows", len(output))
+        logger.info(
+            "Перебор завершён: запросов %s вместо %s при полном переборе",
+            self.requests, len(base) * self.max_adults,
+        )
+        return len(output)
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Цены и доступность номеров для 1..K взрослых")
+    arg_parser.add_argument("--max-adults", type=int, help="K (по умолчанию OCCUPANCY_MAX_ADULTS или 4)")
+    arg_parser.add_argument("--workers", type=int, help="число потоков (по умолчанию ROOMS_WORKERS)")
+    args = arg_parser.parse_args()
+
+    run_date = _run_date()
+    setup_logging(log_file=get_log_file_path(run_date))
+
+    sweep = OccupancySweep(max_adults=args.max_adults, workers=args.workers)
+    rows = sweep.run(run_date)
+    metrics.save(run_date, run="occupancy")
+    send_telegram_summary(
+        f"Ostrovok: перебор 1..{sweep.max_adults} взрослых. Номеров: {rows}, запросов: {sweep.requests}, "
+        f"отелей без номеров пропущено: {sweep.skipped_hotels}, перенесённых: {sweep.carried_hotels}, "
+        f"с ошибками: {sweep.errors}. Дата: {run_date}.\n{metrics.summary()}"
+    )
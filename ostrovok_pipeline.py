@@ -0,0 +1,131 @@
+import sys
+import os
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from zoneinfo import ZoneInfo
+
+from log_config import setup_logging, get_log_file_path, send_telegram_summary
+from ostrovok_hotels import OstrovokHotelsDailyParser, OstrovokHotelsCatalog
+from ostrovok_occupancy import OccupancySweep
+from ostrovok_rooms import OstrovokRoomsDailyParser
+from ostrovok_statistic import generate_statistics, record_statistics_manifest, RoomsStatsAccumulator
+from refresh_scheduler import RefreshScheduler
+from run_metrics import metrics
+
+# Настройка stdout для корректного вывода Юникода и сброс буфера в CI
+if sys.stdout.encoding != 'utf-8':
+    sys.stdout.reconfigure(encoding='utf-8')
+sys.stdout.reconfigure(line_buffering=True)
+
+logger = logging.getLogger(__name__)
+
+
+def _run_date():
+    """Дата запуска по RUN_TZ (по умолчанию Asia/Irkutsk)."""
+    tz_name = os.environ.get("RUN_TZ", "Asia/Irkutsk")
+    try:
+        return datetime.now(ZoneInfo(tz_name)).date()
+    except Exception:
+        return date.today()
+
+
+class _StageTimer:
+    """Замеры длительности этапов конвейера (в секундах), в порядке выполнения."""
+
+    def __init__(self):
+        self.timings = {}
+
+    def run(self, name, func, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self.timings[name] = time.perf_counter() - start
+            logger.info("Этап %s: %.1f с", name, self.timings[name])
+
+    def summary(self):
+        return ", ".join(f"{name} {seconds:.1f} с" for name, seconds in self.timings.items())
+
+
+def run_pipeline(run_date=None):
+    """Конвейер hotels → rooms → statistics в одном процессе.
+    Список отелей передаётся в парсер номеров напрямую из памяти; номера пишутся в daily/rooms потоково,
+    а статистика по ним накапливается на лету и передаётся в generate_statistics.
+    daily/hotels и каталог пишутся один раз в фоновом потоке, пока идут следующие этапы."""
+    if run_date is None:
+        run_date = _run_date()
+    timer = _StageTimer()
+    pipeline_start = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="csv-writer") as writer:
+        # Регион — OSTROVOK_REGION (по умолчанию из regions.json); несколько регионов — ostrovok_shards.py
+        hotels_parser = OstrovokHotelsDailyParser()
+        region_daily_dir = None if hotels_parser.write_history else hotels_parser.daily_dir
+        hotels = timer.run("hotels", hotels_parser.get_all_hotels_list, save_csv=False)
+        pending_writes = []
+        if hotels:
+            pending_writes.append(writer.submit(hotels_parser._save_to_csv))
+        catalog_result = writer.submit(OstrovokHotelsCatalog().update, hotels)
+
+        rooms_count = 0
+        statistics_count = None
+        if hotels:
+            # Номера пишутся в daily/rooms по мере готовности отелей, статистика копится на лету
+            rooms_parser = OstrovokRoomsDailyParser(region=hotels_parser.region)
+            rooms_stats = RoomsStatsAccumulator()
+            refresh_hotels, carried_rows = hotels, None
+            # ROOMS_SCHEDULE=1: изменчивые отели первыми, стабильные — по очереди, остальные переносятся
+            if os.environ.get("ROOMS_SCHEDULE") == "1":
+                scheduler = RefreshScheduler(daily_dir=rooms_parser.daily_dir)
+                plan = scheduler.plan(hotels, run_date)
+                carried_rows, observed = scheduler.carried_rows(plan, run_date)
+                scheduler.save(plan, run_date, observed)
+                refresh_hotels = plan.refresh
+                metrics.count("rooms", "carried_hotels", len(observed))
+            timer.run(
+                "rooms", rooms_parser.get_all_rooms, hotels=refresh_hotels, stream=True, stats=rooms_stats,
+                carried_rows=carried_rows,
+            )
+            rooms_count = rooms_parser.rooms_count
+            if rooms_count:
+                statistics_count = timer.run(
+                    "statistics", generate_statistics, run_date, hotels=hotels, rooms=rooms_stats,
+                    daily_dir=region_daily_dir,
+                )
+            # Перебор 1..K взрослых по готовому daily/rooms — по OCCUPANCY_SWEEP=1, тем же парсером и сессией
+            if rooms_count and os.environ.get("OCCUPANCY_SWEEP") == "1":
+                timer.run("occupancy", OccupancySweep(parser=rooms_parser).run, run_date)
+
+        write_start = time.perf_counter()
+        for future in pending_writes:
+            future.result()
+        catalog_total, catalog_new = catalog_result.result()
+        # Остаток записи, который не успел уйти в фон за время следующих этапов
+        timer.timings["csv_wait"] = time.perf_counter() - write_start
+        # Входы статистики (daily/hotels, daily/rooms) теперь на диске — фиксируем их в манифесте
+        if statistics_count is not None and region_daily_dir is None:
+            record_statistics_manifest([run_date])
+
+    timer.timings["total"] = time.perf_counter() - pipeline_start
+    logger.info("Конвейер завершён. Этапы: %s", timer.summary())
+    # Этапы hotels, rooms и statistics замеряют сами парсеры; здесь — ожидание записи CSV и весь конвейер
+    metrics.add_time("csv_wait", timer.timings["csv_wait"])
+    metrics.add_time("total", timer.timings["total"])
+    metrics.save(run_date, run="pipeline")
+
+    send_telegram_summary(
+        f"Ostrovok: конвейер завершён. Дата: {run_date}.\n"
+        f"Отелей: {len(hotels)}. Каталог: {catalog_total} всего, {catalog_new} новых.\n"
+        f"Номеров: {rooms_count}. Отелей в статистике: {statistics_count or 0}.\n"
+        f"Этапы: {timer.summary()}.\n"
+        f"{metrics.summary()}"
+    )
+    return timer.timings
+
+
+if __name__ == "__main__":
+    run_date = _run_date()
+    setup_logging(log_file=get_log_file_path(run_date))
+    run_pipeline(run_date)
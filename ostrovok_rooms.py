@@ -1,4 +1,3 @@
-from playwright.sync_api import sync_playwright
 import time
 import sys
 import os
@@ -6,12 +5,25 @@ import json
 import csv
 import uuid
 import logging
-import requests
+import threading
 from pathlib import Path
+from contextlib import contextmanager
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urlparse
 from datetime import date, timedelta, datetime
 from zoneinfo import ZoneInfo
-from capacity_utils import compute_max_capacity
+from capacity_utils import compute_room_capacity
+from http_transport import PooledTransport
+from fixture_store import recorder_from_env
+from replay_transport import replay_transport_from_env
+from regions import get_region, is_default_region, region_daily_dir
+from json_decode import decode_hotel_page
+from run_metrics import metrics
+from session_store import SessionStore
+from checkpoint_journal import CheckpointJournal
+from rate_control import RateController, RETRY_STATUSES, parse_retry_after
+import history_store
 from log_config import setup_logging, get_log_file_path, send_telegram_summary
 
 # Настройка stdout для корректного вывода Юникода
@@ -20,12 +32,175 @@ if sys.stdout.encoding != 'utf-8':
 
 logger = logging.getLogger(__name__)
 
+# Параллельная загрузка номеров: число потоков и лимит одновременных запросов к одному хосту.
+# Все запросы идут на один хост API, поэтому лимит меньше числа потоков: пока два запроса в полёте,
+# остальные потоки разбирают ответы и пишут строки
+DEFAULT_ROOMS_WORKERS = 4
+DEFAULT_PER_HOST_LIMIT = 2
+
+ROOMS_FIELDNAMES = [
+    "ota_hotel_id",
+    "master_id",
+    "room_name",
+    "rg_hash",
+    "count_rg_hash",
+    "allotment",
+    "bedding_type",
+    "beds",
+    "bedding_data",
+    "multi_bed_data",
+    "capacity",
+    "capacity_source",
+    "price_rub_min",
+    "price_rub_max",
+    "url",
+    # Дата наблюдения для строк, перенесённых без запроса (RefreshScheduler); пусто — строка получена в этот прогон
+    "carried_from",
+]
+
+
+def _env_int(name, default):
+    try:
+        return int(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+class _HostLimiter:
+    """Ограничивает число одновременных запросов к одному хосту (семафор на каждый host)."""
+
+    def __init__(self, limit):
+        self.limit = max(1, int(limit))
+        self._lock = threading.Lock()
+        self._semaphores = {}
+
+    @contextmanager
+    def slot(self, url):
+        host = urlparse(url).netloc
+        with self._lock:
+            semaphore = self._semaphores.get(host)
+            if semaphore is None:
+                semaphore = self._semaphores[host] = threading.BoundedSemaphore(self.limit)
+        with semaphore:
+            yield
+
+
+class _RoomGroup:
+    """Номера одного rg_hash из всех тарифов ответа: поля первого номера, число тарифов и диапазон цен.
+    Поля для CSV (JSON кроватей, вместимость) вычисляются один раз при создании группы."""
+
+    __slots__ = (
+        "rg_hash", "room_name", "allotment", "bedding_type", "beds", "bedding_data", "multi_bed_data",
+        "capacity", "capacity_source", "count", "price_min", "price_max", "price_min_value", "price_max_value",
+    )
+
+    @classmethod
+    def from_room(cls, rg_hash, room, price_rub, price_value):
+        group = cls()
+        room_data_trans = room.get("room_data_trans", {}).get("ru", {})
+        beds_list = room_data_trans.get("beds") or []
+        bedding_data = room.get("bedding_data", [])
+        multi_bed_data = room.get("multi_bed_data", [])
+        allotment = room.get("allotment", 0)
+        # Преобразуем allotment в число
+        try:
+            allotment_value = int(allotment) if allotment else 0
+        except (ValueError, TypeError):
+            allotment_value = 0
+
+        group.rg_hash = rg_hash
+        group.room_name = room.get("room_name", "")
+        group.allotment = str(allotment_value)
+        group.bedding_type = room_data_trans.get("bedding_type", "")
+        group.beds = json.dumps(beds_list, ensure_ascii=False) if beds_list else ""
+        group.bedding_data = json.dumps(bedding_data, ensure_ascii=False) if bedding_data else ""
+        group.multi_bed_data = json.dumps(multi_bed_data, ensure_ascii=False) if multi_bed_data else ""
+        # Вместимость одного номера
+        capacity, group.capacity_source = compute_room_capacity(
+            group.room_name, beds_list, bedding_data, multi_bed_data,
+        )
+        group.capacity = str(capacity)
+        group.count = 1
+        group.price_min = group.price_max = price_rub
+        group.price_min_value = group.price_max_value = price_value
+        return group
+
+    @classmethod
+    def failed(cls):
+        """Группа-заглушка для номера, который не удалось разобрать (строка с пустыми полями)."""
+        group = cls()
+        for name in cls.__slots__:
+            setattr(group, name, None)
+        group.count = 1
+        return group
+
+    def add_rate(self, price_rub, price_value):
+        """Ещё один тариф того же rg_hash: счётчик и min/max цены."""
+        self.count += 1
+        if price_value < self.price_min_value:
+            self.price_min = price_rub
+            self.price_min_value = price_value
+        if price_value > self.price_max_value:
+            self.price_max = price_rub
+            self.price_max_value = price_value
+
+    def as_row(self, hotel_id, master_id, hotel_url):
+        return {
+            "ota_hotel_id": hotel_id,
+            "master_id": master_id,
+            "room_name": self.room_name,
+            "rg_hash": self.rg_hash,
+            "count_rg_hash": str(self.count),
+            "allotment": self.allotment,
+            "bedding_type": self.bedding_type,
+            "beds": self.beds,
+            "bedding_data": self.bedding_data,
+            "multi_bed_data": self.multi_bed_data,
+            "capacity": self.capacity,
+            "capacity_source": self.capacity_source,
+            "price_rub_min": self.price_min,
+            "price_rub_max": self.price_max,
+            "url": hotel_url,
+        }
+
+
 class OstrovokRoomsDailyParser:
-    def __init__(self):
-        self.session = requests.Session()
+    def __init__(self, workers=None, per_host_limit=None, transport=None, region=None):
         self.api_url = "https://ostrovok.ru/hotel/search/v1/site/hp/search"
         self.cookies = None
         self.current_dir = Path(__file__).parent
+        # Регион — из regions.json (region или OSTROVOK_REGION); выходные файлы и журнал — по региону
+        self.region = get_region(region)
+        self.daily_dir = region_daily_dir(self.region, self.current_dir / 'daily')
+        self.write_history = is_default_region(self.region)
+        self.journal_name = "rooms" if self.write_history else f"rooms-{self.region.key}"
+        # ROOMS_WORKERS=1 — последовательный обход, как раньше
+        self.workers = max(1, workers if workers is not None else _env_int("ROOMS_WORKERS", DEFAULT_ROOMS_WORKERS))
+        self.host_limiter = _HostLimiter(
+            per_host_limit if per_host_limit is not None else _env_int("ROOMS_PER_HOST_LIMIT", DEFAULT_PER_HOST_LIMIT)
+        )
+        # Пул keep-alive соединений по лимиту на хост (больше одновременно не используется):
+        # TCP+TLS устанавливается один раз на соединение.
+        # transport (или OSTROVOK_REPLAY) — офлайн-прогон на записанных ответах, OSTROVOK_RECORD — запись ответов
+        if transport is None:
+            transport = replay_transport_from_env()
+        if transport is None:
+            transport = PooledTransport(
+                pool_size=min(self.workers, self.host_limiter.limit),
+                headers={
+                    'Content-Type': 'application/json',
+                    'Origin': 'https://ostrovok.ru',
+                    'Referer': 'https://ostrovok.ru/',
+                },
+                recorder=recorder_from_env(),
+            )
+        self.transport = transport
+        self.session = self.transport.session
+        self.session_store = SessionStore()
+        self.rate_controller = RateController()
+        self._cookies_lock = threading.Lock()
+        self._cookies_generation = 0
+        self.rooms_count = 0
     
     def _run_date(self):
         """Дата запуска по RUN_TZ (по умолчанию Asia/Irkutsk)."""
@@ -36,7 +211,10 @@ class OstrovokRoomsDailyParser:
             return date.today()
     
     def _get_cookies_from_browser(self):
-        """Получение куки через реальный браузер"""
+        """Получение куки через реальный браузер (сессия сохраняется в общее хранилище)"""
+        # Playwright нужен только здесь: при живой сохранённой сессии браузер не запускается
+        from playwright.sync_api import sync_playwright
+
         logger.info("Запуск браузера для получения куки...")
         
         with sync_playwright() as p:
@@ -50,14 +228,45 @@ class OstrovokRoomsDailyParser:
             page.goto('https://ostrovok.ru')
             
             # Получаем куки
-            cookies = context.cookies()
-            self.cookies = {cookie['name']: cookie['value'] for cookie in cookies}
+            storage_state = context.storage_state()
+            self.cookies = {cookie['name']: cookie['value'] for cookie in storage_state['cookies']}
             
             browser.close()
+
+        self.session_store.save(storage_state)
+        self.transport.set_cookies(self.cookies)
             
         logger.info("Получено %s куки", len(self.cookies))
         return self.cookies
 
+    def _probe_session(self, hotel_id):
+        """Проверочный запрос к API с текущими куки: 200 и JSON-объект — сессия рабочая."""
+        arrival_date = self._run_date() + timedelta(days=1)
+        payload = self._search_payload(hotel_id, arrival_date, arrival_date + timedelta(days=1))
+        try:
+            response = self.transport.post(self.api_url, json=payload)
+            return response.status_code == 200 and isinstance(decode_hotel_page(response.content), dict)
+        except Exception as e:
+            logger.warning("Проверка сессии: %s", e)
+            return False
+
+    def _load_cookies(self, probe_hotel_id=None):
+        """Куки из общего хранилища сессии (их оставляет этап hotels).
+        Браузер запускается, только если сессии нет, она устарела или не прошла проверочный запрос."""
+        if self.transport.offline:
+            self.cookies = {}
+            return self.cookies
+        cookies = self.session_store.load_cookies()
+        if cookies:
+            self.cookies = cookies
+            self.transport.set_cookies(cookies)
+            if probe_hotel_id is None or self._probe_session(probe_hotel_id):
+                logger.info("Использую сохранённую сессию: %s куки", len(cookies))
+                return self.cookies
+            logger.warning("Сохранённая сессия не прошла проверку — получаю куки через браузер.")
+            self.session_store.invalidate()
+        return self._get_cookies_from_browser()
+
     def _extract_hotel_id(self, hotel_url):
         """Достаем url-идентификатор отеля из URL (последний сегмент пути)."""
         try:
@@ -66,58 +275,113 @@ class OstrovokRoomsDailyParser:
         except Exception:
             return None
     
-    def _search_hotel(self, hotel_id, arrival_date, departure_date, adults=1):
-        """Запрос данных по отелю через API Ostrovok"""
-        
-        if not self.cookies:
-            self._get_cookies_from_browser()
-        
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
-            'Content-Type': 'application/json',
-            'Accept': 'application/json',
-            'Origin': 'https://ostrovok.ru',
-            'Referer': 'https://ostrovok.ru/'
-        }
-        
-        payload = {
+    def _search_payload(self, hotel_id, arrival_date, departure_date, adults=1):
+        """Тело запроса hp/search по отелю"""
+        return {
             "arrival_date": arrival_date.strftime("%Y-%m-%d"),
             "departure_date": departure_date.strftime("%Y-%m-%d"),
             "hotel": hotel_id,
             "currency": "RUB",
             "lang": "ru",
-            "region_id": 965821539,
+            "region_id": self.region.region_id,
             "paxes": [{"adults": adults}],
             "search_uuid": str(uuid.uuid4())
         }
+
+    def _refresh_cookies(self, seen_generation):
+        """Обновляет куки через браузер после 401/403. Если другой поток уже обновил их
+        после того, как запрос был отправлен (seen_generation устарел), повторного запуска браузера нет."""
+        with self._cookies_lock:
+            if self._cookies_generation == seen_generation:
+                logger.warning("Сессия отклонена API — обновляю куки через браузер.")
+                self.session_store.invalidate()
+                self._get_cookies_from_browser()
+                self._cookies_generation += 1
+
+    @metrics.observed("rooms", "search_hotel")
+    def _search_hotel(self, hotel_id, arrival_date, departure_date, adults=1):
+        """Запрос данных по отелю через API Ostrovok.
+        429/5xx и сетевые ошибки повторяются с экспоненциальной задержкой (с учётом Retry-After),
+        на 401/403 куки один раз обновляются через браузер и запрос повторяется сверх бюджета попыток.
+        После последней попытки задержки нет; после исчерпания попыток — None."""
         
-        try:
-            response = requests.post(
-                self.api_url,
-                json=payload,
-                headers=headers,
-                cookies=self.cookies,
-                timeout=30
-            )
+        if self.cookies is None:
+            with self._cookies_lock:
+                if self.cookies is None:
+                    self._load_cookies()
+        
+        payload = self._search_payload(hotel_id, arrival_date, departure_date, adults)
+        cookies_refreshed = False
+        
+        attempt = 0
+        while True:
+            self.rate_controller.acquire()
+            generation = self._cookies_generation
+            try:
+                with self.host_limiter.slot(self.api_url):
+                    start = time.perf_counter()
+                    response = self.transport.post(self.api_url, json=payload)
+                    latency = time.perf_counter() - start
+            except Exception as e:
+                self.rate_controller.on_error()
+                if attempt >= self.rate_controller.max_retries:
+                    logger.warning("%s: %s (попытка %s)", hotel_id, e, attempt + 1)
+                    break
+                delay = self.rate_controller.backoff_delay(attempt)
+                logger.warning("%s: %s, повтор через %.1f с (попытка %s)", hotel_id, e, delay, attempt + 1)
+                time.sleep(delay)
+                attempt += 1
+                continue
             
-            if response.status_code == 200:
-                return response.json()
-            else:
-                logger.warning("Ошибка: %s", response.status_code)
-                return None
-                
-        except Exception:
+            status = response.status_code
+            if status == 200:
+                self.rate_controller.on_success(latency)
+                try:
+                    return decode_hotel_page(response.content)
+                except ValueError:
+                    logger.warning("%s: ответ API не JSON", hotel_id)
+                    return None
+            
+            if status in (401, 403) and not cookies_refreshed:
+                cookies_refreshed = True
+                try:
+                    self._refresh_cookies(generation)
+                except Exception as e:
+                    logger.error("Не удалось обновить куки: %s", e)
+                    return None
+                # Запрос с новыми куки — сверх бюджета повторов, в том числе после последней попытки
+                continue
+            
+            if status in RETRY_STATUSES:
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                if status == 429:
+                    self.rate_controller.on_throttle(retry_after)
+                else:
+                    self.rate_controller.on_error()
+                if attempt >= self.rate_controller.max_retries:
+                    logger.warning("%s: HTTP %s (попытка %s)", hotel_id, status, attempt + 1)
+                    break
+                delay = self.rate_controller.backoff_delay(attempt, retry_after)
+                logger.warning("%s: HTTP %s, повтор через %.1f с (попытка %s)", hotel_id, status, delay, attempt + 1)
+                time.sleep(delay)
+                attempt += 1
+                continue
+            
+            logger.warning("Ошибка: %s", status)
             return None
+        
+        logger.warning("%s: попытки исчерпаны", hotel_id)
+        return None
 
     def _extract_room_data(self, json_data):
-        """Извлекает данные по каждому номеру из JSON ответа API Ostrovok и группирует по rg_hash"""
-        rooms_by_rg_hash = {}
-        
+        """Извлекает данные по каждому номеру из JSON ответа API Ostrovok и группирует по rg_hash.
+        Один проход по rates → rooms: для нового rg_hash создаётся _RoomGroup (JSON и вместимость считаются
+        один раз на группу), для уже встреченного обновляются только счётчик и цены.
+        Строки CSV (dict) собираются из групп в конце."""
         hotel_id = json_data.get("ota_hotel_id", "")
         master_id = str(json_data.get("master_id", ""))
         rates = json_data.get("rates", [])
-        base_hotel_url = "https://ostrovok.ru/hotel/russia/western_siberia_irkutsk_oblast_multi/"
-        hotel_url = f"{base_hotel_url}mid{master_id}/{hotel_id}"
+        hotel_url = f"{self.region.search_url}mid{master_id}/{hotel_id}"
         
         if not rates:
             # Если по отелю не пришли rates, всё равно пишем строку по отелю (для контроля пропусков)
@@ -133,14 +397,20 @@ class OstrovokRoomsDailyParser:
                 "bedding_data": "",
                 "multi_bed_data": "",
                 "capacity": "",
+                "capacity_source": "",
                 "price_rub_min": "",
                 "price_rub_max": "",
                 "url": hotel_url,
             }]
-        
+
+        groups = {}
         for rate in rates:
-            payment_options = rate.get("payment_options", {})
-            payment_types_list = payment_options.get("payment_types", [])
+            # Тариф без rooms не содержит rg_hash — такие записи в выгрузку не попадают
+            rooms = rate.get("rooms", [])
+            if not rooms:
+                continue
+
+            payment_types_list = rate.get("payment_options", {}).get("payment_types", [])
             price_rub = ""
             if payment_types_list:
                 first_payment = payment_types_list[0]
@@ -152,158 +422,22 @@ class OstrovokRoomsDailyParser:
             except (ValueError, TypeError):
                 price_value = float('inf')
             
-            rooms = rate.get("rooms", [])
-            
-            if not rooms:
-                # Если нет rooms, используем данные из rate
-                rg_hash = ""
-                room_name = rate.get("room_name", "")
-                room_data_trans = rate.get("room_data_trans", {}).get("ru", {})
-                bedding_type = room_data_trans.get("bedding_type", "")
-                beds_list = room_data_trans.get("beds") or []
-                beds_str = json.dumps(beds_list, ensure_ascii=False) if beds_list else ""
-                allotment = rate.get("allotment", 0)
-                bedding_data = rate.get("bedding_data", [])
-                multi_bed_data = rate.get("multi_bed_data", [])
-
-                # Вместимость одного номера
-                capacity_per_room = compute_max_capacity(room_name, beds_list)
-                
-                # Пропускаем записи без rg_hash
-                if not rg_hash:
-                    continue
-                
-                # Преобразуем allotment в число
+            for room in rooms:
                 try:
-                    allotment_value = int(allotment) if allotment else 0
-                except (ValueError, TypeError):
-                    allotment_value = 0
-                
-                # Преобразуем bedding_data и multi_bed_data в строки
-                bedding_data_str = json.dumps(bedding_data, ensure_ascii=False) if bedding_data else ""
-                multi_bed_data_str = json.dumps(multi_bed_data, ensure_ascii=False) if multi_bed_data else ""
-                
-                # Группируем по rg_hash
-                if rg_hash in rooms_by_rg_hash:
-                    existing = rooms_by_rg_hash[rg_hash]
-                    existing["count_rg_hash"] += 1
-                    if price_value < existing.get("_price_min", float('inf')):
-                        existing["price_rub_min"] = price_rub
-                        existing["_price_min"] = price_value
-                    if price_value > existing.get("_price_max", float('-inf')):
-                        existing["price_rub_max"] = price_rub
-                        existing["_price_max"] = price_value
-                else:
-                    rooms_by_rg_hash[rg_hash] = {
-                        "ota_hotel_id": hotel_id,
-                        "master_id": master_id,
-                        "room_name": room_name,
-                        "rg_hash": rg_hash,
-                        "count_rg_hash": 1,
-                        "allotment": str(allotment_value),
-                        "bedding_type": bedding_type,
-                        "beds": beds_str,
-                        "bedding_data": bedding_data_str,
-                        "multi_bed_data": multi_bed_data_str,
-                        "capacity": str(capacity_per_room),
-                        "price_rub_min": price_rub,
-                        "price_rub_max": price_rub,
-                        "url": hotel_url,
-                        "_price_min": price_value,
-                        "_price_max": price_value
-                    }
-            else:
-                for room in rooms:
-                    try:  
-                        rg_hash = room.get("rg_hash", "")
-                        room_name = room.get("room_name", "")
-                        room_data_trans = room.get("room_data_trans", {}).get("ru", {})
-                        bedding_type = room_data_trans.get("bedding_type", "")
-                        beds_list = room_data_trans.get("beds") or []
-                        beds_str = json.dumps(beds_list, ensure_ascii=False) if beds_list else ""
-                        allotment = room.get("allotment", 0)
-                        bedding_data = room.get("bedding_data", [])
-                        multi_bed_data = room.get("multi_bed_data", [])
-
-                        # Вместимость одного номера
-                        capacity_per_room = compute_max_capacity(room_name, beds_list)
-                        
-                        # Пропускаем записи без rg_hash
-                        if not rg_hash:
-                            continue
-                        
-                        # Преобразуем allotment в число
-                        try:
-                            allotment_value = int(allotment) if allotment else 0
-                        except (ValueError, TypeError):
-                            allotment_value = 0
-                        
-                        # Преобразуем bedding_data и multi_bed_data в строки
-                        bedding_data_str = json.dumps(bedding_data, ensure_ascii=False) if bedding_data else ""
-                        multi_bed_data_str = json.dumps(multi_bed_data, ensure_ascii=False) if multi_bed_data else ""
-                        
-                        # Группируем по rg_hash
-                        if rg_hash in rooms_by_rg_hash:
-                            # Объединяем: обновляем min/max цены и счетчик
-                            existing = rooms_by_rg_hash[rg_hash]
-                            existing["count_rg_hash"] += 1
-                            if price_value < existing.get("_price_min", float('inf')):
-                                existing["price_rub_min"] = price_rub
-                                existing["_price_min"] = price_value
-                            if price_value > existing.get("_price_max", float('-inf')):
-                                existing["price_rub_max"] = price_rub
-                                existing["_price_max"] = price_value
-                        else:
-                            # Первая запись для этого rg_hash
-                            rooms_by_rg_hash[rg_hash] = {
-                                "ota_hotel_id": hotel_id,
-                                "master_id": master_id,
-                                "room_name": room_name,
-                                "rg_hash": rg_hash,
-                                "count_rg_hash": 1,
-                                "allotment": str(allotment_value),
-                                "bedding_type": bedding_type,
-                                "beds": beds_str,
-                                "bedding_data": bedding_data_str,
-                                "multi_bed_data": multi_bed_data_str,
-                                "capacity": str(capacity_per_room),
-                                "price_rub_min": price_rub,
-                                "price_rub_max": price_rub,
-                                "url": hotel_url,
-                                "_price_min": price_value,
-                                "_price_max": price_value
-                            }
-                    except Exception as e:  
-                        logger.warning("Ошибка при извлечении данных номера (hotel_id=%s): %s", hotel_id, e)  
-                        err_key = f"_err_{hotel_id}_{id(room)}" 
-                        rooms_by_rg_hash[err_key] = {  
-                            "ota_hotel_id": hotel_id,  
-                            "master_id": master_id,  
-                            "room_name": None,  
-                            "rg_hash": None,  
-                            "count_rg_hash": 1,  
-                            "allotment": None,  
-                            "bedding_type": None,  
-                            "beds": None,  
-                            "bedding_data": None,  
-                            "multi_bed_data": None,  
-                            "capacity": None,  
-                            "price_rub_min": None,  
-                            "price_rub_max": None,  
-                            "url": hotel_url,  
-                            "_price_min": float('inf'),  
-                            "_price_max": float('-inf')  
-                        }  
-        
-        # Удаляем служебные поля и преобразуем count_rg_hash в строку
-        rooms_data = []
-        for room in rooms_by_rg_hash.values():
-            room.pop("_price_min", None)
-            room.pop("_price_max", None)
-            room["count_rg_hash"] = str(room["count_rg_hash"])
-            rooms_data.append(room)
+                    rg_hash = room.get("rg_hash", "")
+                    # Пропускаем записи без rg_hash
+                    if not rg_hash:
+                        continue
+                    group = groups.get(rg_hash)
+                    if group is None:
+                        groups[rg_hash] = _RoomGroup.from_room(rg_hash, room, price_rub, price_value)
+                    else:
+                        group.add_rate(price_rub, price_value)
+                except Exception as e:  
+                    logger.warning("Ошибка при извлечении данных номера (hotel_id=%s): %s", hotel_id, e)  
+                    groups[f"_err_{hotel_id}_{id(room)}"] = _RoomGroup.failed()
         
-        return rooms_data
+        return [group.as_row(hotel_id, master_id, hotel_url) for group in groups.values()]
 
     def _read_hotels_from_csv(self, csv_path):
         """Читает список отелей из CSV файла"""
@@ -334,88 +468,224 @@ class OstrovokRoomsDailyParser:
 
         if not result:
             logger.warning("Нет данных для %s", hotel_name)
+            metrics.count("rooms", "failed_hotels")
             return []
 
         rooms_data = self._extract_room_data(result)
         return rooms_data
 
-    def get_all_rooms(self, csv_path=None):
-        """Основная функция для парсинга номеров отелей из списка"""
+    def _hotel_key(self, hotel_row):
+        """Ключ отеля в журнале контрольных точек."""
+        hotel_url = hotel_row.get("show_rooms_url") or hotel_row.get("url") or hotel_row.get("detail_url") or ""
+        return hotel_row.get("ota_hotel_id") or self._extract_hotel_id(hotel_url) or ""
+
+    def _iter_processed_hotels(self, hotels, arrival_date, departure_date, done=None):
+        """Обрабатывает отели (в пуле потоков при workers > 1).
+        Результаты отдаются строго в порядке списка hotels, поэтому порядок строк в CSV не зависит от гонок.
+        В работе не больше 2 * workers отелей, так что готовые, но ещё не отданные результаты не копятся.
+        done — строки уже обработанных отелей (из журнала): для них запрос не выполняется."""
+        done = done or {}
+
+        def process(hotel_row):
+            key = self._hotel_key(hotel_row)
+            if key in done:
+                return done[key]
+            return self._process_hotel(hotel_row, arrival_date, departure_date)
+
+        if self.workers <= 1:
+            for hotel_row in hotels:
+                yield hotel_row, process(hotel_row)
+            return
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="rooms") as executor:
+            in_flight = deque()
+            for hotel_row in hotels:
+                in_flight.append((hotel_row, executor.submit(process, hotel_row)))
+                if len(in_flight) >= 2 * self.workers:
+                    done_row, future = in_flight.popleft()
+                    yield done_row, future.result()
+            while in_flight:
+                done_row, future = in_flight.popleft()
+                yield done_row, future.result()
+
+    @metrics.timed("rooms")
+    def get_all_rooms(self, csv_path=None, hotels=None, save_csv=True, stream=False, stats=None, carried_rows=None):
+        """Основная функция для парсинга номеров отелей из списка.
+        hotels — список отелей в памяти (из конвейера), тогда CSV со списком не читается.
+        save_csv=False — не писать daily/rooms (конвейер пишет CSV сам).
+        stream=True — строки каждого отеля сразу дописываются в daily/rooms и не накапливаются в памяти
+        (при сбое на середине CSV содержит все завершённые отели); возвращается пустой список.
+        stats — RoomsStatsAccumulator, который обновляется строками по мере готовности отелей.
+        carried_rows — строки отелей, которые в этот прогон не запрашиваются (план RefreshScheduler):
+        пишутся после запрошенных, с датой наблюдения в колонке carried_from.
+        Число сохранённых строк — в self.rooms_count."""
         today = self._run_date()
         arrival_date = today + timedelta(days=1)
         departure_date = today + timedelta(days=2)
+        self.rooms_count = 0
         
         logger.info("Даты бронирования: %s - %s", arrival_date.strftime('%d.%m.%Y'), departure_date.strftime('%d.%m.%Y'))
         
-        if csv_path is None:
-            csv_path = self.current_dir / 'daily' / 'hotels' / f'{today.isoformat()}.csv'
-        else:
-            csv_path = Path(csv_path)
-        
-        # Получаем куки
-        self._get_cookies_from_browser()
-
-        # Читаем список отелей
-        hotels = self._read_hotels_from_csv(csv_path)
+        if hotels is None:
+            if csv_path is None:
+                csv_path = self.daily_dir / 'hotels' / f'{today.isoformat()}.csv'
+            else:
+                csv_path = Path(csv_path)
+            
+            # Читаем список отелей
+            hotels = self._read_hotels_from_csv(csv_path)
         
-        if not hotels:
+        if not hotels and not carried_rows:
             logger.warning("Не удалось загрузить список отелей.")
             return []
+
+        # Получаем куки: сохранённая сессия проверяется запросом по первому отелю
+        hotel_ids = (
+            self._extract_hotel_id(h.get("show_rooms_url") or h.get("url") or h.get("detail_url") or "")
+            for h in hotels
+        )
+        probe_hotel_id = next((hotel_id for hotel_id in hotel_ids if hotel_id), None)
+        if hotels:
+            self._load_cookies(probe_hotel_id=probe_hotel_id)
         
+        logger.info(
+            "Отелей: %s. Потоков: %s, не более %s запросов к хосту одновременно",
+            len(hotels), self.workers, self.host_limiter.limit,
+        )
+
+        # Журнал контрольных точек: при повторном запуске за ту же дату готовые отели не запрашиваются
+        journal = CheckpointJournal(self.journal_name, today)
+        done = {key: entry.get("rows") or [] for key, entry in journal.load().items()}
+        if done:
+            logger.info("Возобновление по журналу %s: уже обработано отелей %s из %s", journal.path, len(done), len(hotels))
+
         # Обрабатываем каждый отель
         all_rooms_data = []
-        for hotel_row in hotels:
-            rooms_data = self._process_hotel(hotel_row, arrival_date, departure_date)
-            if rooms_data:
-                all_rooms_data.extend(rooms_data)
-                # Для вывода считаем только реальные номера (строки-заглушки имеют пустой rg_hash)
-                rooms_count = sum(1 for r in rooms_data if r.get("rg_hash"))
-                logger.info("Сохранено %s номеров для %s", rooms_count, hotel_row.get('hotel_name') or hotel_row.get('name', 'unknown'))
+        stream_writer = (
+            _RoomsCsvWriter(self._output_csv_path(), today, history=self.write_history) if stream and save_csv else None
+        )
+        try:
+            for hotel_row, rooms_data in self._iter_processed_hotels(hotels, arrival_date, departure_date, done):
+                if rooms_data:
+                    hotel_key = self._hotel_key(hotel_row)
+                    if hotel_key not in done:
+                        journal.append(hotel_key, rows=rooms_data)
+                    self.rooms_count += len(rooms_data)
+                    if stats is not None:
+                        stats.add_rows(rooms_data)
+                    if stream_writer is not None:
+                        stream_writer.write_rows(rooms_data)
+                    elif not stream:
+                        all_rooms_data.extend(rooms_data)
+                    # Для вывода считаем только реальные номера (строки-заглушки имеют пустой rg_hash)
+                    rooms_count = sum(1 for r in rooms_data if r.get("rg_hash"))
+                    logger.info("Сохранено %s номеров для %s", rooms_count, hotel_row.get('hotel_name') or hotel_row.get('name', 'unknown'))
+            if carried_rows:
+                self.rooms_count += len(carried_rows)
+                if stats is not None:
+                    stats.add_rows(carried_rows)
+                if stream_writer is not None:
+                    stream_writer.write_rows(carried_rows)
+                elif not stream:
+                    all_rooms_data.extend(carried_rows)
+                logger.info("Перенесено без запроса %s строк номеров", len(carried_rows))
+        finally:
+            if stream_writer is not None:
+                stream_writer.close()
+        # Все отели пройдены — журнал больше не нужен
+        journal.remove()
         
-        if all_rooms_data:
-            self._save_to_csv(all_rooms_data)
-            logger.info("Парсинг завершён. Всего обработано %s номеров.", len(all_rooms_data))
+        self.transport.stats.log_summary()
+        self.rate_controller.log_summary()
+        metrics.add_transport("rooms", self.transport.stats)
+        metrics.count("rooms", "retries", self.rate_controller.retries)
+        metrics.count("rooms", "throttled", self.rate_controller.throttled)
+        metrics.count("rooms", "errors", self.rate_controller.errors)
+        metrics.count("rooms", "rows", self.rooms_count)
+
+        if self.rooms_count:
+            if save_csv and not stream:
+                self._save_to_csv(all_rooms_data)
+            logger.info("Парсинг завершён. Всего обработано %s номеров.", self.rooms_count)
         else:
             logger.warning("Не удалось извлечь данные о номерах.")
         
         return all_rooms_data
+
+    def _output_csv_path(self, run_date=None):
+        """daily/rooms/YYYY-MM-DD.csv за дату запуска"""
+        output_dir = self.daily_dir / 'rooms'
+        output_dir.mkdir(parents=True, exist_ok=True)
+        return output_dir / f'{(run_date or self._run_date()).isoformat()}.csv'
     
-    def _save_to_csv(self, rooms_data):
-        """Сохраняет данные номеров в CSV файл (daily/rooms/YYYY-MM-DD.csv)"""
+    def _save_to_csv(self, rooms_data, run_date=None):
+        """Сохраняет данные номеров в CSV файл (daily/rooms/YYYY-MM-DD.csv, по умолчанию за дату запуска)"""
         if not rooms_data:
             return
         
-        run_date = self._run_date()
-        output_dir = self.current_dir / 'daily' / 'rooms'
-        output_dir.mkdir(parents=True, exist_ok=True)
-        csv_filename = output_dir / f'{run_date.isoformat()}.csv'
-        
-        fieldnames = [
-            "ota_hotel_id",
-            "master_id",
-            "room_name",
-            "rg_hash",
-            "count_rg_hash",
-            "allotment",
-            "bedding_type",
-            "beds",
-            "bedding_data",
-            "multi_bed_data",
-            "capacity",
-            "price_rub_min",
-            "price_rub_max",
-            "url"
-        ]
+        csv_filename = self._output_csv_path(run_date)
         
         try:
             with open(csv_filename, 'w', encoding='utf-8-sig', newline='') as csv_file:
-                writer = csv.DictWriter(csv_file, fieldnames=fieldnames, delimiter=',', quoting=csv.QUOTE_MINIMAL)
+                writer = csv.DictWriter(csv_file, fieldnames=ROOMS_FIELDNAMES, delimiter=',', quoting=csv.QUOTE_MINIMAL)
                 writer.writeheader()
                 for room in rooms_data:
                     writer.writerow(room)
             logger.info("Сохранено %s номеров в %s", len(rooms_data), csv_filename)
         except Exception as e:
             logger.error("Ошибка при сохранении CSV: %s", e)
+        # Те же строки — в колоночную историю (history/rooms)
+        if self.write_history:
+            history_store.write_day("rooms", run_date or self._run_date(), rooms_data)
+
+
+class _RoomsCsvWriter:
+    """Пишет строки номеров в CSV по мере готовности отелей; после каждого отеля данные сбрасываются на диск.
+    Файл открывается при первой записи, поэтому без данных пустой CSV не создаётся.
+    Параллельно строки уходят в колоночную историю (history/rooms), если она включена."""
+
+    def __init__(self, path, run_date, history=True):
+        self.path = path
+        self.count = 0
+        self._file = None
+        self._writer = None
+        self._history = history_store.open_day_writer("rooms", run_date) if history else None
+
+    def write_rows(self, rows):
+        try:
+            if self._file is None:
+                self._file = open(self.path, 'w', encoding='utf-8-sig', newline='')
+                self._writer = csv.DictWriter(self._file, fieldnames=ROOMS_FIELDNAMES, delimiter=',', quoting=csv.QUOTE_MINIMAL)
+                self._writer.writeheader()
+            self._writer.writerows(rows)
+            self._file.flush()
+            self.count += len(rows)
+        except Exception as e:
+            logger.error("Ошибка при записи CSV %s: %s", self.path, e)
+        self._write_history(rows)
+
+    def _write_history(self, rows):
+        if self._history is None:
+            return
+        try:
+            self._history.write_rows(rows)
+        except Exception as e:
+            logger.error("Ошибка записи истории номеров: %s", e)
+            self._history.abort()
+            self._history = None
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            logger.info("Сохранено %s номеров в %s", self.count, self.path)
+        if self._history is not None:
+            try:
+                self._history.close()
+            except Exception as e:
+                logger.error("Ошибка записи истории номеров: %s", e)
+                self._history.abort()
+            self._history = None
 
 
 def _run_date_for_log():
@@ -431,5 +701,8 @@ if __name__ == "__main__":
     setup_logging(log_file=get_log_file_path(run_date))
 
     parser = OstrovokRoomsDailyParser()
-    result = parser.get_all_rooms()
-    send_telegram_summary(f"Ostrovok: парсинг номеров завершён. Номеров: {len(result)}. Дата: {run_date}.")
\ No newline at end of file
+    parser.get_all_rooms(stream=True)
+    metrics.save(run_date, run="rooms")
+    send_telegram_summary(
+        f"Ostrovok: парсинг номеров завершён. Номеров: {parser.rooms_count}. Дата: {run_date}.\n{metrics.summary()}"
+    )
\ No newline at end of file
@@ -0,0 +1,247 @@
+import argparse
+import csv
+import logging
+import os
+import re
+import sys
+import zlib
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
+from pathlib import Path
+from zoneinfo import ZoneInfo
+
+from log_config import setup_logging, get_log_file_path, send_telegram_summary
+from ostrovok_hotels import OstrovokHotelsDailyParser, OstrovokHotelsCatalog, HOTELS_FIELDNAMES
+from ostrovok_rooms import OstrovokRoomsDailyParser, ROOMS_FIELDNAMES
+from ostrovok_statistic import generate_statistics, record_statistics_manifest
+from regions import load_regions
+from run_metrics import metrics
+
+# Настройка stdout для корректного вывода Юникода и сброс буфера в CI
+if sys.stdout.encoding != 'utf-8':
+    sys.stdout.reconfigure(encoding='utf-8')
+sys.stdout.reconfigure(line_buffering=True)
+
+logger = logging.getLogger(__name__)
+
+# Промежуточные результаты шардов: shards/{date}/hotels/{region}.csv и shards/{date}/rooms/{region}/{i}-of-{n}.csv.
+# Между заданиями CI переносятся артефактами; в git не попадают
+SHARDS_DIR = Path(__file__).resolve().parent / "shards"
+_ROOMS_SHARD_RE = re.compile(r"^(\d+)-of-(\d+)\.csv$")
+
+
+def _run_date():
+    """Дата запуска по RUN_TZ (по умолчанию Asia/Irkutsk)."""
+    tz_name = os.environ.get("RUN_TZ", "Asia/Irkutsk")
+    try:
+        return datetime.now(ZoneInfo(tz_name)).date()
+    except Exception:
+        return date.today()
+
+
+def shard_of(key, shard_count):
+    """Номер шарда для ключа: crc32 не зависит от PYTHONHASHSEED, поэтому одинаков во всех процессах и заданиях CI."""
+    return zlib.crc32(key.encode("utf-8")) % shard_count
+
+
+def hotel_shard_key(region_key, hotel_row):
+    return f"{region_key}|{hotel_row.get('ota_hotel_id', '')}"
+
+
+def select_regions(region_keys=None):
+    """Регионы из regions.json (все или перечисленные по ключу), в порядке файла."""
+    regions = load_regions()
+    if not region_keys:
+        return regions
+    unknown = [key for key in region_keys if key not in regions]
+    if unknown:
+        raise ValueError(f"Неизвестные регионы: {', '.join(unknown)}; известные: {', '.join(regions)}")
+    return {key: region for key, region in regions.items() if key in region_keys}
+
+
+def _day_dir(run_date, directory=None):
+    return Path(directory or SHARDS_DIR) / run_date.isoformat()
+
+
+def _write_csv(path, fieldnames, rows):
+    """Запись через временный файл: прерванное задание не оставляет полупустой CSV шарда."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, 'w', encoding='utf-8-sig', newline='') as csv_file:
+        writer = csv.DictWriter(csv_file, fieldnames=fieldnames, delimiter=',', quoting=csv.QUOTE_MINIMAL)
+        writer.writeheader()
+        writer.writerows(rows)
+    os.replace(tmp_path, path)
+
+
+def _read_csv(path):
+    with open(path, 'r', encoding='utf-8-sig', newline='') as csv_file:
+        return list(csv.DictReader(csv_file))
+
+
+def run_hotels_shard(run_date, shard, shard_count, region_keys=None, directory=None):
+    """Фаза hotels: выдача SERP по регионам, доставшимся шарду. Возвращает dict регион -> число отелей."""
+    results = {}
+    for key, region in select_regions(region_keys).items():
+        if shard_of(key, shard_count) != shard:
+            continue
+        logger.info("Шард %s/%s: выдача региона %s (%s)", shard, shard_count, key, region.name)
+        hotels = OstrovokHotelsDailyParser(region=region).get_all_hotels_list(save_csv=False)
+        if hotels:
+            _write_csv(_day_dir(run_date, directory) / "hotels" / f"{key}.csv", HOTELS_FIELDNAMES, hotels)
+        results[key] = len(hotels)
+    return results
+
+
+def run_rooms_shard(run_date, shard, shard_count, region_keys=None, directory=None, workers=None):
+    """Фаза rooms: номера отелей, доставшихся шарду (по crc32 региона и ota_hotel_id), во всех регионах.
+    Возвращает dict регион -> число строк номеров."""
+    results = {}
+    day_dir = _day_dir(run_date, directory)
+    for key, region in select_regions(region_keys).items():
+        hotels_csv = day_dir / "hotels" / f"{key}.csv"
+        if not hotels_csv.exists():
+            logger.warning("Шард %s/%s: нет списка отелей %s — регион пропущен", shard, shard_count, hotels_csv)
+            continue
+        hotels = [row for row in _read_csv(hotels_csv) if shard_of(hotel_shard_key(key, row), shard_count) == shard]
+        logger.info("Шард %s/%s: регион %s, отелей %s", shard, shard_count, key, len(hotels))
+        rows = []
+        if hotels:
+            parser = OstrovokRoomsDailyParser(workers=workers, region=region)
+            # У каждого шарда свой журнал: шарды одной машины не продолжают работу друг друга
+            parser.journal_name = f"rooms-{key}-{shard}-of-{shard_count}"
+            rows = parser.get_all_rooms(hotels=hotels, save_csv=False)
+        # Пустой файл тоже пишется: по нему merge видит, что шард отработал
+        _write_csv(day_dir / "rooms" / key / f"{shard:03d}-of-{shard_count:03d}.csv", ROOMS_FIELDNAMES, rows)
+        results[key] = len(rows)
+    return results
+
+
+def merge(run_date, region_keys=None, directory=None):
+    """Сводит шарды в выходные файлы регионов (daily/ или daily/regions/{key}) и единый каталог.
+    Строки номеров упорядочиваются по списку отелей выдачи — как при обходе без шардов.
+    Возвращает dict регион -> (отелей, номеров, отелей в статистике)."""
+    day_dir = _day_dir(run_date, directory)
+    results = {}
+    catalog_hotels = []
+    for key, region in select_regions(region_keys).items():
+        hotels_csv = day_dir / "hotels" / f"{key}.csv"
+        if not hotels_csv.exists():
+            logger.warning("Нет списка отелей региона %s (%s)", key, hotels_csv)
+            continue
+        hotels = _read_csv(hotels_csv)
+        catalog_hotels.extend(hotels)
+
+        rows_by_hotel = defaultdict(list)
+        shard_counts = set()
+        shard_files = sorted((day_dir / "rooms" / key).glob("*.csv"))
+        for path in shard_files:
+            match = _ROOMS_SHARD_RE.match(path.name)
+            if match:
+                shard_counts.add(int(match.group(2)))
+            for row in _read_csv(path):
+                rows_by_hotel[row.get("ota_hotel_id", "")].append(row)
+        if len(shard_counts) > 1:
+            logger.warning("Регион %s: шарды разных разбиений %s — данные могут повторяться", key, sorted(shard_counts))
+        elif shard_counts and len(shard_files) < min(shard_counts):
+            logger.warning("Регион %s: готово шардов номеров %s из %s", key, len(shard_files), min(shard_counts))
+        rooms = [row for hotel in hotels for row in rows_by_hotel.get(hotel.get("ota_hotel_id", ""), [])]
+
+        hotels_parser = OstrovokHotelsDailyParser(region=region)
+        hotels_parser.all_hotels = hotels
+        hotels_parser._save_to_csv(run_date)
+        rooms_parser = OstrovokRoomsDailyParser(region=region)
+        rooms_parser._save_to_csv(rooms, run_date)
+        statistics_count = None
+        if rooms:
+            statistics_count = generate_statistics(
+                run_date, hotels=hotels, rooms=rooms,
+                daily_dir=None if hotels_parser.write_history else hotels_parser.daily_dir,
+            )
+            if statistics_count is not None and hotels_parser.write_history:
+                record_statistics_manifest([run_date])
+        metrics.count("merge", "rows", len(rooms))
+        results[key] = (len(hotels), len(rooms), statistics_count or 0)
+        logger.info("Регион %s: отелей %s, номеров %s, в статистике %s", key, *results[key])
+
+    if catalog_hotels:
+        OstrovokHotelsCatalog().update(catalog_hotels)
+    return results
+
+
+def _run_phase(phase, run_date, shard, shard_count, region_keys, directory, workers):
+    if phase == "hotels":
+        return run_hotels_shard(run_date, shard, shard_count, region_keys, directory)
+    return run_rooms_shard(run_date, shard, shard_count, region_keys, directory, workers)
+
+
+def run_local(run_date, shard_count, region_keys=None, directory=None, workers=None):
+    """Все фазы на одной машине: hotels и rooms — в shard_count процессах, затем merge."""
+    for phase in ("hotels", "rooms"):
+        with metrics.stage(phase), ProcessPoolExecutor(max_workers=shard_count) as pool:
+            futures = [
+                pool.submit(_run_phase, phase, run_date, shard, shard_count, region_keys, directory, workers)
+                for shard in range(shard_count)
+            ]
+            for shard, future in enumerate(futures):
+                try:
+                    logger.info("Фаза %s, шард %s/%s: %s", phase, shard, shard_count, future.result())
+                except Exception as e:
+                    logger.error("Фаза %s, шард %s/%s завершилась ошибкой: %s", phase, shard, shard_count, e)
+    with metrics.stage("merge"):
+        return merge(run_date, region_keys, directory)
+
+
+def plan(shard_count, region_keys=None, run_date=None, directory=None):
+    """Распределение по шардам: регионы фазы hotels и, если списки отелей уже есть, отели фазы rooms."""
+    lines = []
+    for key in select_regions(region_keys):
+        line = f"{key}: hotels → шард {shard_of(key, shard_count)}"
+        hotels_csv = _day_dir(run_date or _run_date(), directory) / "hotels" / f"{key}.csv"
+        if hotels_csv.exists():
+            per_shard = [0] * shard_count
+            for row in _read_csv(hotels_csv):
+                per_shard[shard_of(hotel_shard_key(key, row), shard_count)] += 1
+            line += f"; rooms по шардам: {per_shard}"
+        lines.append(line)
+    return lines
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Обход нескольких регионов шардами (процессы или задания CI)")
+    arg_parser.add_argument("phase", choices=["hotels", "rooms", "merge", "run", "plan"],
+                            help="hotels/rooms — один шард фазы, merge — сведение, run — всё локально, plan — распределение")
+    arg_parser.add_argument("--shard", type=int, default=0, help="номер шарда (с 0)")
+    arg_parser.add_argument("--shards", type=int, default=1, help="число шардов")
+    arg_parser.add_argument("--regions", help="ключи регионов через запятую (по умолчанию все из regions.json)")
+    arg_parser.add_argument("--date", type=date.fromisoformat, help="дата запуска (по умолчанию сегодня по RUN_TZ)")
+    arg_parser.add_argument("--workers", type=int, help="потоков фазы rooms в шарде (по умолчанию ROOMS_WORKERS)")
+    arg_parser.add_argument("--dir", help="каталог промежуточных результатов (по умолчанию shards/)")
+    args = arg_parser.parse_args()
+    if not 0 <= args.shard < args.shards:
+        arg_parser.error("--shard должен быть в диапазоне 0..--shards-1")
+
+    run_date = args.date or _run_date()
+    region_keys = [key.strip() for key in args.regions.split(",") if key.strip()] if args.regions else None
+    setup_logging(log_file=get_log_file_path(run_date))
+
+    if args.phase == "plan":
+        print("\n".join(plan(args.shards, region_keys, run_date, args.dir)))
+    elif args.phase in ("hotels", "rooms"):
+        result = _run_phase(args.phase, run_date, args.shard, args.shards, region_keys, args.dir, args.workers)
+        logger.info("Фаза %s, шард %s/%s: %s", args.phase, args.shard, args.shards, result)
+    else:
+        if args.phase == "run":
+            results = run_local(run_date, args.shards, region_keys, args.dir, args.workers)
+        else:
+            with metrics.stage("merge"):
+                results = merge(run_date, region_keys, args.dir)
+        metrics.save(run_date, run="shards")
+        summary = "; ".join(
+            f"{key}: отелей {hotels}, номеров {rooms}, в статистике {stats}"
+            for key, (hotels, rooms, stats) in results.items()
+        )
+        send_telegram_summary(
+            f"Ostrovok: регионы сведены. Дата: {run_date}.\n{summary or 'нет данных'}\n{metrics.summary()}"
+        )
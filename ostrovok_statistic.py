@@ -1,12 +1,21 @@
+import argparse
 import csv
+import io
+import json
 import sys
 import os
 import logging
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
 from datetime import date, datetime
 from zoneinfo import ZoneInfo
 from collections import defaultdict
+from capacity_utils import compute_room_capacity_batch, CAPACITY_LOGIC_VERSION
+from fingerprint_manifest import FingerprintManifest, file_fingerprint
 from log_config import setup_logging, get_log_file_path, send_telegram_summary
+import history_store
+from rooms_cdc import RoomsCDC
+from run_metrics import metrics
 
 # Настройка stdout для корректного вывода Юникода
 if sys.stdout.encoding != 'utf-8':
@@ -14,6 +23,21 @@ if sys.stdout.encoding != 'utf-8':
 
 logger = logging.getLogger(__name__)
 
+DAILY_DIR = Path(__file__).parent / 'daily'
+# Версия логики агрегации: увеличивать при изменении расчёта статистики, чтобы
+# инкрементальный пересчёт (манифест daily/manifests/statistics.json) пересобрал всю историю
+STATISTICS_LOGIC_VERSION = 1
+STATISTICS_FIELDNAMES = [
+    'ota_hotel_id',
+    'name',
+    'date',
+    'rooms_num',
+    'free_rooms_amount',
+    'max_capacity',
+    'available_rooms_percent',
+    'min_price'
+]
+
 
 def _run_date():
     """Дата запуска по RUN_TZ (по умолчанию Asia/Irkutsk)."""
@@ -24,83 +48,130 @@ def _run_date():
         return date.today()
 
 
-def generate_statistics(run_date=None):
-    """Генерирует статистику по отелям на основе данных из CSV файлов.
-    run_date — дата сбора (по умолчанию сегодня по RUN_TZ). Файлы: daily/hotels/{date}.csv, daily/rooms/{date}.csv → daily/statistics/{date}.csv"""
-    
-    current_dir = Path(__file__).parent
-    if run_date is None:
-        run_date = _run_date()
-    date_str = run_date.isoformat()
-    hotels_csv = current_dir / 'daily' / 'hotels' / f'{date_str}.csv'
-    rooms_csv = current_dir / 'daily' / 'rooms' / f'{date_str}.csv'
-    output_csv = current_dir / 'daily' / 'statistics' / f'{date_str}.csv'
-    output_csv.parent.mkdir(parents=True, exist_ok=True)
-    
-    # Читаем данные об отелях
-    hotels_data = {}
-    try:
-        with open(hotels_csv, 'r', encoding='utf-8-sig', newline='') as csvfile:
-            reader = csv.DictReader(csvfile)
-            for row in reader:
-                ota_hotel_id = row.get('ota_hotel_id', '')
-                if ota_hotel_id:
-                    hotels_data[ota_hotel_id] = {
-                        'name': row.get('name', ''),
-                        'rooms_number': row.get('rooms_number', '')
-                    }
-    except Exception as e:
-        logger.error("Ошибка при чтении %s: %s", hotels_csv, e)
-        return
-    
-    # Собираем статистику по номерам
-    rooms_stats = defaultdict(lambda: {
-        'free_rooms_amount': 0,
-        'min_price': None,
-        'max_capacity': 0,  # суммарная вместимость всех свободных номеров
-    })
-    
-    try:
-        with open(rooms_csv, 'r', encoding='utf-8-sig', newline='') as csvfile:
-            reader = csv.DictReader(csvfile)
-            for row in reader:
-                ota_hotel_id = row.get('ota_hotel_id', '')
-                if not ota_hotel_id:
-                    continue
-                
-                # Суммируем allotment
-                allotment = row.get('allotment', '')
-                allotment_value = 0
-                try:
-                    allotment_value = int(allotment) if allotment else 0
-                    rooms_stats[ota_hotel_id]['free_rooms_amount'] += allotment_value
-                except (ValueError, TypeError):
-                    pass
-
-                # Суммарная вместимость свободных номеров (allotment * capacity одного номера)
-                max_cap_str = row.get('capacity', '')
-                try:
-                    capacity_per_room = int(max_cap_str) if max_cap_str else 0
-                    if capacity_per_room > 0 and allotment_value > 0:
-                        rooms_stats[ota_hotel_id]['max_capacity'] += allotment_value * capacity_per_room
-                except (ValueError, TypeError):
-                    pass
-                
-                # Находим минимальную цену
-                price_min = row.get('price_rub_min', '')
-                if price_min:
-                    try:
-                        price_value = float(price_min)
-                        current_min = rooms_stats[ota_hotel_id]['min_price']
-                        if current_min is None or price_value < current_min:
-                            rooms_stats[ota_hotel_id]['min_price'] = price_value
-                    except (ValueError, TypeError):
-                        pass
-    except Exception as e:
-        logger.error("Ошибка при чтении %s: %s", rooms_csv, e)
-        return
-    
-    # Формируем итоговые данные (дата в колонке date = дата сбора, как в путях к файлам)
+def _read_csv_rows(csv_path):
+    """Строки CSV файла (utf-8-sig) как список словарей."""
+    with open(csv_path, 'r', encoding='utf-8-sig', newline='') as csvfile:
+        return list(csv.DictReader(csvfile))
+
+
+def _csv_str(value):
+    """Значение так, как оно окажется в CSV (строки из памяти и из файла обрабатываются одинаково)."""
+    return "" if value is None else str(value)
+
+
+def _json_list(value, cache):
+    """JSON-список из ячейки CSV (с кэшем по строке: одинаковые значения повторяются во всём файле)."""
+    if value not in cache:
+        try:
+            parsed = json.loads(value) if value else []
+        except ValueError:
+            parsed = []
+        cache[value] = parsed if isinstance(parsed, list) else []
+    return cache[value]
+
+
+def _recomputed_capacities(room_names, beds_column, bedding_column, multi_bed_column):
+    """Вместимость для колонки номеров заново по room_name, beds и структурным полям — одним вызовом классификатора."""
+    cache = {}
+    rooms = [
+        (room_name, _json_list(beds, cache), _json_list(bedding, cache), _json_list(multi_beds, cache))
+        for room_name, beds, bedding, multi_beds in zip(room_names, beds_column, bedding_column, multi_bed_column)
+    ]
+    return [capacity for capacity, _ in compute_room_capacity_batch(rooms)]
+
+
+class RoomsStatsAccumulator:
+    """Построчный накопитель статистики по номерам (free_rooms_amount, max_capacity, min_price по отелю).
+    Может обновляться по мере парсинга номеров, тогда строки не нужно хранить целиком."""
+
+    def __init__(self):
+        self.stats = defaultdict(lambda: {
+            'free_rooms_amount': 0,
+            'min_price': None,
+            'max_capacity': 0,  # суммарная вместимость всех свободных номеров
+        })
+
+    def add_rows(self, rows):
+        for row in rows:
+            self.add_row(row)
+
+    def add_csv(self, csv_path, recompute_capacity=False):
+        """Читает daily/rooms/{date}.csv по индексам колонок, без словаря на каждую строку.
+        recompute_capacity — вместимость берётся не из колонки capacity, а заново из room_name, beds,
+        bedding_data и multi_bed_data текущей compute_room_capacity (пересчёт истории после изменения логики)."""
+        with open(csv_path, 'r', encoding='utf-8-sig', newline='') as csvfile:
+            reader = csv.reader(csvfile)
+            self.add_table(next(reader, None), reader, recompute_capacity=recompute_capacity)
+
+    def add_table(self, header, rows, recompute_capacity=False):
+        """Строки снимка daily/rooms списками значений в порядке колонок header (из CSV или из rooms_cdc)."""
+        if not header:
+            return
+        columns = {name: index for index, name in enumerate(header)}
+        fields = ['ota_hotel_id', 'allotment', 'capacity', 'price_rub_min',
+                  'room_name', 'beds', 'bedding_data', 'multi_bed_data']
+        hotel_i, allotment_i, capacity_i, price_i, name_i, beds_i, bedding_i, multi_bed_i = (
+            columns.get(name) for name in fields
+        )
+        width = len(header)
+        rows = [values + [''] * (width - len(values)) if len(values) < width else values for values in rows]
+
+        def column(index):
+            return [values[index] if index is not None else '' for values in rows]
+
+        if recompute_capacity:
+            capacities = _recomputed_capacities(
+                column(name_i), column(beds_i), column(bedding_i), column(multi_bed_i),
+            )
+        else:
+            capacities = column(capacity_i)
+        for hotel_id, allotment, capacity, price_min in zip(
+            column(hotel_i), column(allotment_i), capacities, column(price_i),
+        ):
+            self._add(hotel_id, allotment, capacity, price_min)
+
+    def add_row(self, row):
+        self._add(
+            row.get('ota_hotel_id', ''),
+            _csv_str(row.get('allotment', '')),
+            _csv_str(row.get('capacity', '')),
+            _csv_str(row.get('price_rub_min', '')),
+        )
+
+    def _add(self, ota_hotel_id, allotment, max_cap_str, price_min):
+        if not ota_hotel_id:
+            return
+        
+        # Суммируем allotment
+        allotment_value = 0
+        try:
+            allotment_value = int(allotment) if allotment else 0
+            self.stats[ota_hotel_id]['free_rooms_amount'] += allotment_value
+        except (ValueError, TypeError):
+            pass
+
+        # Суммарная вместимость свободных номеров (allotment * capacity одного номера)
+        try:
+            capacity_per_room = int(max_cap_str) if max_cap_str else 0
+            if capacity_per_room > 0 and allotment_value > 0:
+                self.stats[ota_hotel_id]['max_capacity'] += allotment_value * capacity_per_room
+        except (ValueError, TypeError):
+            pass
+        
+        # Находим минимальную цену
+        if price_min:
+            try:
+                price_value = float(price_min)
+                current_min = self.stats[ota_hotel_id]['min_price']
+                if current_min is None or price_value < current_min:
+                    self.stats[ota_hotel_id]['min_price'] = price_value
+            except (ValueError, TypeError):
+                pass
+
+
+def _build_statistics(run_date, hotels_data, rooms_stats):
+    """Строки статистики по отелям из hotels_data (id -> name, rooms_number) и накопленной статистики номеров."""
+    # Дата в колонке date = дата сбора, как в путях к файлам
     collection_date = run_date.strftime('%Y-%m-%d')
     
     statistics = []
@@ -143,35 +214,247 @@ def generate_statistics(run_date=None):
             'available_rooms_percent': str(available_rooms_percent),
             'min_price': min_price_str
         })
-    
-    # Сохраняем в CSV
-    fieldnames = [
-        'ota_hotel_id',
-        'name',
-        'date',
-        'rooms_num',
-        'free_rooms_amount',
-        'max_capacity',
-        'available_rooms_percent',
-        'min_price'
-    ]
-    
+    return statistics
+
+
+def _statistics_bytes(statistics, lineterminator="\r\n"):
+    """Содержимое CSV статистики (utf-8-sig) с заданным окончанием строк."""
+    buffer = io.StringIO(newline='')
+    writer = csv.DictWriter(
+        buffer, fieldnames=STATISTICS_FIELDNAMES, delimiter=',', quoting=csv.QUOTE_MINIMAL, lineterminator=lineterminator,
+    )
+    writer.writeheader()
+    writer.writerows(statistics)
+    return buffer.getvalue().encode('utf-8-sig')
+
+
+def _save_statistics(output_csv, run_date, statistics, history=True):
+    """Сохраняет статистику в CSV и историю (history=False — только CSV). Возвращает число отелей или None при ошибке.
+    Окончания строк берутся из существующего файла (ранние файлы записаны с \n), а файл с тем же содержимым
+    не перезаписывается — пересчёт истории не даёт пустых диффов в git."""
+    output_csv.parent.mkdir(parents=True, exist_ok=True)
     try:
-        with open(output_csv, 'w', encoding='utf-8-sig', newline='') as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames, delimiter=',', quoting=csv.QUOTE_MINIMAL)
-            writer.writeheader()
-            writer.writerows(statistics)
-        logger.info("Статистика сохранена в %s", output_csv)
+        try:
+            existing = output_csv.read_bytes()
+        except FileNotFoundError:
+            existing = None
+        lineterminator = "\n" if existing and not existing.split(b"\n", 1)[0].endswith(b"\r") else "\r\n"
+        data = _statistics_bytes(statistics, lineterminator)
+        if data == existing:
+            logger.info("Статистика в %s не изменилась", output_csv)
+        else:
+            output_csv.write_bytes(data)
+            logger.info("Статистика сохранена в %s", output_csv)
         logger.info("Обработано %s отелей", len(statistics))
+        if history:
+            history_store.write_day("statistics", run_date, statistics)
+        metrics.count("statistics", "rows", len(statistics))
         return len(statistics)
     except Exception as e:
         logger.error("Ошибка при сохранении статистики: %s", e)
         return None
 
 
+@metrics.timed("statistics")
+def generate_statistics(run_date=None, hotels=None, rooms=None, recompute_capacity=False, daily_dir=None):
+    """Генерирует статистику по отелям на основе данных из CSV файлов.
+    run_date — дата сбора (по умолчанию сегодня по RUN_TZ). Файлы: daily/hotels/{date}.csv, daily/rooms/{date}.csv → daily/statistics/{date}.csv
+    hotels/rooms — строки отелей и номеров в памяти (из конвейера); если заданы, соответствующий CSV не читается.
+    rooms может быть и готовым RoomsStatsAccumulator (потоковый режим парсера номеров).
+    recompute_capacity — при чтении номеров из CSV пересчитать вместимость текущей compute_room_capacity.
+    daily_dir — каталог daily/ региона не по умолчанию (daily/regions/{key}); его статистика в историю не пишется."""
+    
+    if run_date is None:
+        run_date = _run_date()
+    date_str = run_date.isoformat()
+    history = daily_dir is None
+    daily_dir = DAILY_DIR if daily_dir is None else Path(daily_dir)
+    hotels_csv = daily_dir / 'hotels' / f'{date_str}.csv'
+    rooms_csv = daily_dir / 'rooms' / f'{date_str}.csv'
+    output_csv = daily_dir / 'statistics' / f'{date_str}.csv'
+    
+    # Читаем данные об отелях
+    hotels_data = {}
+    try:
+        if hotels is None:
+            hotels = _read_csv_rows(hotels_csv)
+        for row in hotels:
+            ota_hotel_id = row.get('ota_hotel_id', '')
+            if ota_hotel_id:
+                hotels_data[ota_hotel_id] = {
+                    'name': row.get('name', ''),
+                    'rooms_number': _csv_str(row.get('rooms_number', ''))
+                }
+    except Exception as e:
+        logger.error("Ошибка при чтении %s: %s", hotels_csv, e)
+        return
+    
+    # Собираем статистику по номерам
+    if isinstance(rooms, RoomsStatsAccumulator):
+        accumulator = rooms
+    else:
+        accumulator = RoomsStatsAccumulator()
+        try:
+            if rooms is None and rooms_csv.exists():
+                accumulator.add_csv(rooms_csv, recompute_capacity=recompute_capacity)
+            elif rooms is None:
+                # Полного снимка нет (день между базами rooms_cdc) — восстанавливается по изменениям
+                fieldnames, rows = RoomsCDC(daily_dir).load(run_date)
+                accumulator.add_table(
+                    fieldnames, [[row.get(name, '') for name in fieldnames] for row in rows],
+                    recompute_capacity=recompute_capacity,
+                )
+            else:
+                accumulator.add_rows(rooms)
+        except Exception as e:
+            logger.error("Ошибка при чтении %s: %s", rooms_csv, e)
+            return
+
+    statistics = _build_statistics(run_date, hotels_data, accumulator.stats)
+    return _save_statistics(output_csv, run_date, statistics, history=history)
+
+
+def _available_dates(start=None, end=None):
+    """Даты, за которые есть и daily/hotels, и снимок daily/rooms (файл или восстановимый по rooms_cdc),
+    в диапазоне [start, end]."""
+    dates = []
+    for day in RoomsCDC(DAILY_DIR).dates():
+        if (start and day < start) or (end and day > end):
+            continue
+        if (DAILY_DIR / 'hotels' / f'{day.isoformat()}.csv').exists():
+            dates.append(day)
+    return dates
+
+
+def _generate_statistics_worker(day, recompute_capacity):
+    """Задача процесса-воркера: статистика за один день."""
+    logging.getLogger().setLevel(logging.ERROR)
+    return day, generate_statistics(day, recompute_capacity=recompute_capacity)
+
+
+def _statistics_inputs(day, rooms_cdc=None):
+    date_str = day.isoformat()
+    # Отпечаток снимка номеров не меняется, когда rooms_cdc заменяет файл изменениями
+    return {
+        'hotels': file_fingerprint(DAILY_DIR / 'hotels' / f'{date_str}.csv'),
+        'rooms': (rooms_cdc or RoomsCDC(DAILY_DIR)).sha256(day),
+    }
+
+
+def _is_current(entry, inputs, day, recompute_capacity):
+    """Статистика за день актуальна: те же входы и версии логики, файл результата не менялся."""
+    if not entry or entry.get('inputs') != inputs:
+        return False
+    if entry.get('statistics_version') != STATISTICS_LOGIC_VERSION:
+        return False
+    # Без --recompute-capacity вместимость берётся из daily/rooms, её версия роли не играет
+    if recompute_capacity and entry.get('capacity_version') != CAPACITY_LOGIC_VERSION:
+        return False
+    # Файл, собранный в другом режиме вместимости, не подходит (старые записи — по capacity_version)
+    built_with_recompute = entry.get('recompute_capacity', entry.get('capacity_version') is not None)
+    if built_with_recompute != recompute_capacity:
+        return False
+    output_csv = DAILY_DIR / 'statistics' / f'{day.isoformat()}.csv'
+    return entry.get('statistics') == file_fingerprint(output_csv)
+
+
+def record_statistics_manifest(dates, recompute_capacity=False, manifest=None):
+    """Записывает в манифест входы и результат за даты, статистика по которым только что построена."""
+    manifest = manifest or FingerprintManifest('statistics')
+    rooms_cdc = RoomsCDC(DAILY_DIR)
+    for day in dates:
+        manifest.record(day, {
+            'inputs': _statistics_inputs(day, rooms_cdc),
+            'statistics': file_fingerprint(DAILY_DIR / 'statistics' / f'{day.isoformat()}.csv'),
+            'statistics_version': STATISTICS_LOGIC_VERSION,
+            'capacity_version': CAPACITY_LOGIC_VERSION if recompute_capacity else None,
+            'recompute_capacity': recompute_capacity,
+        })
+    try:
+        manifest.save()
+    except Exception as e:
+        logger.error("Ошибка при сохранении манифеста %s: %s", manifest.path, e)
+
+
+@metrics.timed("statistics_range")
+def generate_statistics_range(start=None, end=None, workers=None, recompute_capacity=False, force=False):
+    """Пересчитывает daily/statistics за дни диапазона [start, end] (по умолчанию — вся история).
+    Пересчитываются только даты, у которых по манифесту изменились входные CSV, версия логики
+    или сам файл статистики (force — все даты). Дни независимы и раздаются пулу процессов
+    (workers, по умолчанию STATISTICS_WORKERS или число ядер).
+    Возвращает dict дата -> число отелей (None — день не посчитан) только по пересчитанным датам."""
+    dates = _available_dates(start, end)
+    if not dates:
+        logger.warning("Нет данных за период %s — %s", start, end)
+        return {}
+    manifest = FingerprintManifest('statistics')
+    rooms_cdc = RoomsCDC(DAILY_DIR)
+    stale = [
+        day for day in dates
+        if force or not _is_current(manifest.get(day), _statistics_inputs(day, rooms_cdc), day, recompute_capacity)
+    ]
+    if not stale:
+        logger.info("Статистика актуальна за все %s дней (%s — %s)", len(dates), dates[0], dates[-1])
+        return {}
+    if workers is None:
+        try:
+            workers = int(os.environ.get("STATISTICS_WORKERS", 0)) or (os.cpu_count() or 1)
+        except ValueError:
+            workers = os.cpu_count() or 1
+    workers = max(1, min(workers, len(stale)))
+
+    results = {}
+    if workers == 1:
+        for day in stale:
+            results[day] = generate_statistics(day, recompute_capacity=recompute_capacity)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for day, count in pool.map(
+                _generate_statistics_worker, stale, [recompute_capacity] * len(stale),
+                chunksize=max(1, len(stale) // (workers * 4)),
+            ):
+                results[day] = count
+    record_statistics_manifest(
+        [day for day, count in results.items() if count is not None], recompute_capacity, manifest,
+    )
+    metrics.count("statistics_range", "days", len(results))
+    failed = [day.isoformat() for day, count in results.items() if count is None]
+    logger.info(
+        "Статистика пересчитана за %s из %s дней (%s — %s), процессов: %s, с ошибками: %s",
+        len(results), len(dates), dates[0], dates[-1], workers, ", ".join(failed) or "нет",
+    )
+    return results
+
+
 if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Статистика по отелям из daily/hotels и daily/rooms")
+    arg_parser.add_argument("--from", dest="start", type=date.fromisoformat, help="пересчитать историю с даты")
+    arg_parser.add_argument("--to", dest="end", type=date.fromisoformat, help="пересчитать историю по дату")
+    arg_parser.add_argument("--all", action="store_true", help="пересчитать устаревшие даты за всю историю")
+    arg_parser.add_argument("--force", action="store_true", help="пересчитать даты, даже если они актуальны по манифесту")
+    arg_parser.add_argument("--workers", type=int, help="число процессов для пересчёта истории")
+    arg_parser.add_argument("--recompute-capacity", action="store_true",
+                            help="пересчитать вместимость номеров текущей compute_room_capacity")
+    args = arg_parser.parse_args()
+
     run_date = _run_date()
     setup_logging(log_file=get_log_file_path(run_date))
 
-    count = generate_statistics()
-    send_telegram_summary(f"Ostrovok: статистика сформирована. Отелей в отчёте: {count or 0}. Дата: {run_date}.")
+    if args.all or args.start or args.end:
+        results = generate_statistics_range(
+            args.start, args.end, args.workers, args.recompute_capacity, force=args.force,
+        )
+        if results:
+            metrics.save(run_date, run="statistics_range")
+            done = sum(1 for count in results.values() if count is not None)
+            send_telegram_summary(
+                f"Ostrovok: статистика пересчитана за {done} из {len(results)} устаревших дней.\n{metrics.summary()}"
+            )
+    else:
+        count = generate_statistics(recompute_capacity=args.recompute_capacity)
+        if count is not None:
+            record_statistics_manifest([run_date], args.recompute_capacity)
+        metrics.save(run_date, run="statistics")
+        send_telegram_summary(
+            f"Ostrovok: статистика сформирована. Отелей в отчёте: {count or 0}. Дата: {run_date}.\n{metrics.summary()}"
+        )
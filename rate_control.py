@@ -0,0 +1,125 @@
+import logging
+import os
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RATE = 4.0          # запросов в секунду на старте
+DEFAULT_MAX_RATE = 10.0
+DEFAULT_MIN_RATE = 0.5
+DEFAULT_MAX_RETRIES = 4
+# Ответы, после которых запрос имеет смысл повторить
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+def _env_float(name, default):
+    try:
+        return float(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def parse_retry_after(value):
+    """Retry-After в секундах: число секунд или HTTP-дата. None, если заголовка нет или он не разобран."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+class RateController:
+    """Адаптивный ограничитель запросов: token bucket, скорость которого подстраивается под ответы сервера.
+    - успех с нормальной задержкой — скорость растёт на increase_step (до max_rate);
+    - медленный ответ (дольше latency_target) — скорость плавно снижается;
+    - 429 — скорость падает вдвое, а при Retry-After все потоки ждут указанное время;
+    - 5xx и сетевые ошибки — скорость снижается на 30%.
+    Между повторами — экспоненциальная задержка с джиттером."""
+
+    def __init__(self, rate=None, max_rate=None, min_rate=DEFAULT_MIN_RATE, max_retries=None,
+                 base_delay=1.0, max_delay=30.0, latency_target=3.0, increase_step=0.1):
+        self.rate = rate if rate is not None else _env_float("ROOMS_RATE", DEFAULT_RATE)
+        self.max_rate = max_rate if max_rate is not None else _env_float("ROOMS_MAX_RATE", DEFAULT_MAX_RATE)
+        self.min_rate = min_rate
+        self.rate = min(max(self.rate, self.min_rate), self.max_rate)
+        self.max_retries = max_retries if max_retries is not None else int(_env_float("ROOMS_MAX_RETRIES", DEFAULT_MAX_RETRIES))
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.latency_target = latency_target
+        self.increase_step = increase_step
+
+        self._lock = threading.Lock()
+        self._burst = max(1.0, self.rate)
+        self._tokens = 1.0
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+
+        self.retries = 0
+        self.throttled = 0
+        self.errors = 0
+
+    def acquire(self):
+        """Блокирует поток до появления токена (и до конца паузы после Retry-After)."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                else:
+                    self._tokens = min(self._burst, self._tokens + (now - self._updated) * self.rate)
+                    self._updated = now
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def on_success(self, latency):
+        with self._lock:
+            if latency > self.latency_target:
+                self.rate = max(self.min_rate, self.rate * 0.9)
+            else:
+                self.rate = min(self.max_rate, self.rate + self.increase_step)
+            self._burst = max(1.0, self.rate)
+
+    def on_throttle(self, retry_after=None):
+        with self._lock:
+            self.throttled += 1
+            self.rate = max(self.min_rate, self.rate * 0.5)
+            self._burst = max(1.0, self.rate)
+            if retry_after:
+                self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+
+    def on_error(self):
+        with self._lock:
+            self.errors += 1
+            self.rate = max(self.min_rate, self.rate * 0.7)
+            self._burst = max(1.0, self.rate)
+
+    def backoff_delay(self, attempt, retry_after=None):
+        """Задержка перед повтором attempt (с 0): Retry-After, если задан, иначе base * 2^attempt с джиттером."""
+        with self._lock:
+            self.retries += 1
+        if retry_after is not None:
+            return min(retry_after, self.max_delay * 4)
+        delay = min(self.max_delay, self.base_delay * (2 ** attempt))
+        return delay * random.uniform(0.5, 1.0)
+
+    def log_summary(self):
+        logger.info(
+            "Ограничитель запросов: итоговая скорость %.1f запр/с, повторов %s, ответов 429: %s, ошибок: %s",
+            self.rate, self.retries, self.throttled, self.errors,
+        )
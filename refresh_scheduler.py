@@ -0,0 +1,330 @@
+import argparse
+import csv
+import json
+import logging
+import os
+import sys
+import zlib
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from zoneinfo import ZoneInfo
+
+from rooms_cdc import RoomsCDC
+
+# Настройка stdout для корректного вывода Юникода
+if sys.stdout.encoding != 'utf-8':
+    sys.stdout.reconfigure(encoding='utf-8')
+
+logger = logging.getLogger(__name__)
+
+CURRENT_DIR = Path(__file__).resolve().parent
+DAILY_DIR = CURRENT_DIR / "daily"
+# Окно истории daily/rooms для оценки изменчивости отеля, дней
+DEFAULT_SCHEDULE_HISTORY_DAYS = 14
+# Стабильный отель запрашивается раз в SCHEDULE_STABLE_EVERY дней, в остальные дни его строки переносятся
+DEFAULT_SCHEDULE_STABLE_EVERY = 3
+# Оценка не ниже порога — отель изменчивый и запрашивается каждый прогон
+DEFAULT_SCHEDULE_VOLATILE_SCORE = 0.6
+# Относительное изменение цены, которое ещё не считается изменением состояния отеля
+DEFAULT_SCHEDULE_PRICE_TOLERANCE = 0.05
+# Веса оценки: частота изменений, наличие номеров в последний день, доля дней с номерами (не заглушкой)
+SCORE_WEIGHTS = (0.6, 0.25, 0.15)
+
+HotelVolatility = namedtuple("HotelVolatility", "ota_hotel_id days change_rate available stub_share score last_date")
+RefreshPlan = namedtuple("RefreshPlan", "refresh carried scores")
+
+
+def _env_int(name, default):
+    try:
+        return int(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _env_float(name, default):
+    try:
+        return float(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _run_date():
+    """Дата запуска по RUN_TZ (по умолчанию Asia/Irkutsk)."""
+    tz_name = os.environ.get("RUN_TZ", "Asia/Irkutsk")
+    try:
+        return datetime.now(ZoneInfo(tz_name)).date()
+    except Exception:
+        return date.today()
+
+
+def _hotel_id(hotel_row):
+    return hotel_row.get("ota_hotel_id") or ""
+
+
+def _price(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def hotel_signature(rows):
+    """Состояние отеля за день: rg_hash -> (остаток, мин. цена, макс. цена). Пустой dict — нет номеров."""
+    return {
+        row["rg_hash"]: (row.get("allotment", ""), _price(row.get("price_rub_min")), _price(row.get("price_rub_max")))
+        for row in rows if row.get("rg_hash")
+    }
+
+
+def signature_changed(previous, current, price_tolerance=DEFAULT_SCHEDULE_PRICE_TOLERANCE):
+    """Состояние изменилось: другой набор номеров, другой остаток или цена сдвинулась больше чем на price_tolerance."""
+    if previous.keys() != current.keys():
+        return True
+    for rg_hash, (allotment, *prices) in current.items():
+        previous_allotment, *previous_prices = previous[rg_hash]
+        if allotment != previous_allotment:
+            return True
+        for price, previous_price in zip(prices, previous_prices):
+            if abs(price - previous_price) > price_tolerance * max(previous_price, 1.0):
+                return True
+    return False
+
+
+def is_carried(row):
+    """Строка перенесена из прошлого снимка без запроса (колонка carried_from)."""
+    return bool(row.get("carried_from"))
+
+
+def _group_by_hotel(rows):
+    hotels = {}
+    for row in rows:
+        hotels.setdefault(_hotel_id(row), []).append(row)
+    hotels.pop("", None)
+    return hotels
+
+
+def score_hotel(hotel_id, observations, price_tolerance=DEFAULT_SCHEDULE_PRICE_TOLERANCE):
+    """Оценка изменчивости по наблюдениям [(дата, сигнатура)] в порядке дат.
+    change_rate — доля соседних наблюдений с изменившимся состоянием (signature_changed),
+    available — номера в последнем наблюдении, stub_share — доля наблюдений без номеров (только строка-заглушка с пустым rg_hash)."""
+    days = len(observations)
+    changes = sum(
+        1 for (_, previous), (_, current) in zip(observations, observations[1:])
+        if signature_changed(previous, current, price_tolerance)
+    )
+    change_rate = changes / (days - 1) if days > 1 else 1.0
+    available = bool(observations[-1][1])
+    stub_share = sum(1 for _, signature in observations if not signature) / days
+    change_weight, available_weight, rooms_weight = SCORE_WEIGHTS
+    score = change_weight * change_rate + available_weight * available + rooms_weight * (1 - stub_share)
+    return HotelVolatility(hotel_id, days, change_rate, available, stub_share, round(score, 4), observations[-1][0])
+
+
+class RefreshScheduler:
+    """Порядок и объём запросов номеров по изменчивости отелей в истории daily/rooms.
+    Изменчивые отели (оценка не ниже volatile_score) и отели без истории запрашиваются каждый прогон и первыми;
+    стабильные — раз в stable_every дней по очереди (crc32 ota_hotel_id), в остальные дни их строки
+    переносятся из последнего снимка. budget ограничивает число запросов за прогон (0 — без ограничения);
+    не попавшие в бюджет отели тоже переносятся. Строки перенесённых отелей помечаются в daily/rooms датой
+    наблюдения (carried_from), отели записываются в daily/schedule/{date}.json и не считаются наблюдениями
+    при следующих оценках."""
+
+    def __init__(self, daily_dir=None, history_days=None, stable_every=None, budget=None, volatile_score=None,
+                 price_tolerance=None):
+        self.daily_dir = Path(daily_dir or DAILY_DIR)
+        self.history_days = max(1, history_days if history_days is not None else _env_int(
+            "SCHEDULE_HISTORY_DAYS", DEFAULT_SCHEDULE_HISTORY_DAYS,
+        ))
+        self.stable_every = max(1, stable_every if stable_every is not None else _env_int(
+            "SCHEDULE_STABLE_EVERY", DEFAULT_SCHEDULE_STABLE_EVERY,
+        ))
+        self.budget = max(0, budget if budget is not None else _env_int("SCHEDULE_BUDGET", 0))
+        self.volatile_score = volatile_score if volatile_score is not None else _env_float(
+            "SCHEDULE_VOLATILE_SCORE", DEFAULT_SCHEDULE_VOLATILE_SCORE,
+        )
+        self.price_tolerance = price_tolerance if price_tolerance is not None else _env_float(
+            "SCHEDULE_PRICE_TOLERANCE", DEFAULT_SCHEDULE_PRICE_TOLERANCE,
+        )
+        # Снимки daily/rooms между базами rooms_cdc восстанавливаются по изменениям
+        self.rooms_cdc = RoomsCDC(self.daily_dir)
+
+    def _schedule_path(self, day):
+        return self.daily_dir / "schedule" / f"{day.isoformat()}.json"
+
+    def _load_schedule(self, day):
+        try:
+            return json.loads(self._schedule_path(day).read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _history_days(self, run_date):
+        """Последние history_days снимков daily/rooms строго до run_date, по возрастанию даты."""
+        return [day for day in self.rooms_cdc.dates() if day < run_date][-self.history_days:]
+
+    def _rooms_by_hotel(self, day):
+        """Строки снимка daily/rooms за день по отелям; невосстановимый снимок пропускается."""
+        try:
+            return _group_by_hotel(self.rooms_cdc.load(day)[1])
+        except (FileNotFoundError, ValueError) as e:
+            logger.warning("Снимок номеров за %s недоступен: %s", day, e)
+            return {}
+
+    def scores(self, run_date):
+        """Оценки изменчивости по истории до run_date: dict ota_hotel_id -> HotelVolatility."""
+        observations = {}
+        for day in self._history_days(run_date):
+            carried = self._load_schedule(day).get("carried") or {}
+            for hotel_id, rows in self._rooms_by_hotel(day).items():
+                if hotel_id not in carried and not any(is_carried(row) for row in rows):
+                    observations.setdefault(hotel_id, []).append((day, hotel_signature(rows)))
+        return {
+            hotel_id: score_hotel(hotel_id, items, self.price_tolerance) for hotel_id, items in observations.items()
+        }
+
+    def _is_due(self, hotel_id, run_date):
+        """Очередь стабильного отеля: каждый stable_every-й день, со сдвигом по crc32 ota_hotel_id."""
+        return zlib.crc32(hotel_id.encode("utf-8")) % self.stable_every == run_date.toordinal() % self.stable_every
+
+    def plan(self, hotels, run_date, intraday=False):
+        """План прогона по списку отелей: refresh — строки отелей к запросу в порядке приоритета,
+        carried — строки отелей, которые не запрашиваются. intraday=True — только изменчивые отели
+        (в пределах бюджета), без переноса: промежуточный замер между ежедневными прогонами."""
+        scores = self.scores(run_date)
+        volatile, due, rest = [], [], []
+        for hotel_row in hotels:
+            score = scores.get(_hotel_id(hotel_row))
+            if score is None or score.score >= self.volatile_score:
+                volatile.append(hotel_row)
+            elif not intraday and self._is_due(_hotel_id(hotel_row), run_date):
+                due.append(hotel_row)
+            else:
+                rest.append(hotel_row)
+
+        def priority(hotel_row):
+            score = scores.get(_hotel_id(hotel_row))
+            return -(score.score if score else 1.0)
+
+        refresh = sorted(volatile, key=priority) + sorted(due, key=priority)
+        if self.budget and len(refresh) > self.budget:
+            rest = refresh[self.budget:] + rest
+            refresh = refresh[:self.budget]
+        carried = [] if intraday else rest
+        logger.info(
+            "План: изменчивых %s, стабильных по очереди %s, к запросу %s (бюджет %s), перенос %s",
+            len(volatile), len(due), len(refresh), self.budget or "без ограничения", len(carried),
+        )
+        return RefreshPlan(refresh, carried, scores)
+
+    def carried_rows(self, plan, run_date):
+        """Строки перенесённых отелей из последнего снимка daily/rooms до run_date, в котором отель есть,
+        с датой наблюдения в carried_from. Возвращает (строки, dict ota_hotel_id -> дата наблюдения) — дата
+        наблюдения сохраняется и через несколько переносов подряд."""
+        wanted = {_hotel_id(hotel_row) for hotel_row in plan.carried}
+        rows_by_hotel, observed = {}, {}
+        for day in reversed(self._history_days(run_date)):
+            if not wanted:
+                break
+            carried = self._load_schedule(day).get("carried") or {}
+            for hotel_id, rows in self._rooms_by_hotel(day).items():
+                if hotel_id in wanted:
+                    observed_day = rows[0].get("carried_from") or carried.get(hotel_id) or day.isoformat()
+                    rows_by_hotel[hotel_id] = [{**row, "carried_from": observed_day} for row in rows]
+                    observed[hotel_id] = observed_day
+                    wanted.discard(hotel_id)
+        if wanted:
+            logger.warning("Нет строк в истории для перенесённых отелей: %s", len(wanted))
+        rows = [row for hotel_row in plan.carried for row in rows_by_hotel.get(_hotel_id(hotel_row), [])]
+        return rows, observed
+
+    def save(self, plan, run_date, observed):
+        """daily/schedule/{date}.json: запрошенные отели в порядке приоритета, перенесённые (с датой наблюдения)
+        и оценки."""
+        path = self._schedule_path(run_date)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        data = {
+            "refreshed": [_hotel_id(hotel_row) for hotel_row in plan.refresh],
+            "carried": observed,
+            "scores": {hotel_id: score.score for hotel_id, score in sorted(plan.scores.items())},
+        }
+        path.write_text(json.dumps(data, ensure_ascii=False, indent=1), encoding="utf-8")
+        logger.info("План прогона сохранён в %s", path)
+
+
+def run_intraday(run_date=None, budget=None, workers=None):
+    """Промежуточный замер изменчивых отелей: daily/intraday/{date}/{HHMM}.csv. Возвращает число строк."""
+    from log_config import send_telegram_summary
+    from ostrovok_rooms import OstrovokRoomsDailyParser, ROOMS_FIELDNAMES
+    from run_metrics import metrics
+
+    run_date = run_date or _run_date()
+    parser = OstrovokRoomsDailyParser(workers=workers)
+    scheduler = RefreshScheduler(daily_dir=parser.daily_dir, budget=budget)
+    hotels = parser._read_hotels_from_csv(parser.daily_dir / "hotels" / f"{run_date.isoformat()}.csv")
+    if not hotels:
+        day = (scheduler._history_days(run_date + timedelta(days=1)) or [None])[-1]
+        hotels = parser._read_hotels_from_csv(parser.daily_dir / "hotels" / f"{day}.csv") if day else []
+    plan = scheduler.plan(hotels, run_date, intraday=True)
+    if not plan.refresh:
+        logger.warning("Нет отелей для промежуточного замера.")
+        return 0
+
+    stamp = datetime.now(ZoneInfo(os.environ.get("RUN_TZ", "Asia/Irkutsk"))).strftime("%H%M")
+    # Отдельный журнал на каждый замер: прерванный замер не продолжается следующим по расписанию
+    parser.journal_name = parser.journal_name.replace("rooms", f"intraday-{stamp}", 1)
+    rows = parser.get_all_rooms(hotels=plan.refresh, save_csv=False)
+    output_csv = parser.daily_dir / "intraday" / run_date.isoformat() / f"{stamp}.csv"
+    output_csv.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_csv, 'w', encoding='utf-8-sig', newline='') as csv_file:
+        writer = csv.DictWriter(csv_file, fieldnames=ROOMS_FIELDNAMES, delimiter=',', quoting=csv.QUOTE_MINIMAL)
+        writer.writeheader()
+        writer.writerows(rows)
+    logger.info("Сохранено %s номеров в %s", len(rows), output_csv)
+    metrics.save(run_date, run=f"intraday-{stamp}")
+    send_telegram_summary(
+        f"Ostrovok: промежуточный замер {stamp}. Отелей: {len(plan.refresh)}, номеров: {len(rows)}. "
+        f"Дата: {run_date}.\n{metrics.summary()}"
+    )
+    return len(rows)
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Планирование запросов номеров по изменчивости отелей")
+    sub = arg_parser.add_subparsers(dest="command", required=True)
+    plan_parser = sub.add_parser("plan", help="оценки отелей и план прогона на дату")
+    plan_parser.add_argument("--date", type=date.fromisoformat, help="дата прогона (по умолчанию сегодня по RUN_TZ)")
+    plan_parser.add_argument("--budget", type=int, help="предел запросов (по умолчанию SCHEDULE_BUDGET)")
+    plan_parser.add_argument("--top", type=int, default=20, help="сколько отелей с наибольшей оценкой показать")
+    intraday_parser = sub.add_parser("intraday", help="промежуточный замер изменчивых отелей")
+    intraday_parser.add_argument("--budget", type=int, help="предел запросов (по умолчанию SCHEDULE_BUDGET)")
+    intraday_parser.add_argument("--workers", type=int, help="число потоков (по умолчанию ROOMS_WORKERS)")
+    args = arg_parser.parse_args(argv)
+
+    from log_config import setup_logging, get_log_file_path
+    run_date = getattr(args, "date", None) or _run_date()
+    setup_logging(log_file=get_log_file_path(run_date))
+
+    if args.command == "intraday":
+        run_intraday(run_date, budget=args.budget, workers=args.workers)
+        return 0
+
+    scheduler = RefreshScheduler(budget=args.budget)
+    days = scheduler._history_days(run_date + timedelta(days=1))
+    hotels_csv = DAILY_DIR / "hotels" / f"{days[-1].isoformat()}.csv" if days else None
+    hotels = []
+    if hotels_csv and hotels_csv.exists():
+        with open(hotels_csv, newline="", encoding="utf-8-sig") as csv_file:
+            hotels = list(csv.DictReader(csv_file))
+    plan = scheduler.plan(hotels, run_date)
+    print(f"К запросу: {len(plan.refresh)}, перенос: {len(plan.carried)}, отелей: {len(hotels)}")
+    top = sorted(plan.scores.values(), key=lambda score: -score.score)[:args.top]
+    for score in top:
+        print(
+            f"{score.ota_hotel_id}: оценка {score.score:.2f}, изменений {score.change_rate:.0%}, "
+            f"без номеров {score.stub_share:.0%}, номера в последний день: {'да' if score.available else 'нет'}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
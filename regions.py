@@ -0,0 +1,60 @@
+import json
+import os
+from collections import OrderedDict, namedtuple
+from pathlib import Path
+
+# Регионы обхода: ключ, название, region_id Ostrovok, URL выдачи SERP (он же префикс URL отеля в daily/rooms)
+# и префикс URL отеля в daily/hotels. Новый регион — запись в regions.json, код не меняется
+REGIONS_PATH = Path(__file__).resolve().parent / "regions.json"
+
+Region = namedtuple("Region", "key name region_id search_url hotel_url")
+
+
+def _load(path=None):
+    with open(path or REGIONS_PATH, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    regions = OrderedDict()
+    for item in data["regions"]:
+        regions[item["key"]] = Region(
+            key=item["key"],
+            name=item.get("name", item["key"]),
+            region_id=int(item["region_id"]),
+            search_url=item["search_url"],
+            hotel_url=item["hotel_url"],
+        )
+    default = data.get("default") or next(iter(regions))
+    return regions, default
+
+
+def load_regions(path=None):
+    """Регионы из regions.json в порядке файла: OrderedDict ключ -> Region."""
+    return _load(path)[0]
+
+
+def default_region_key(path=None):
+    """Регион по умолчанию: его выходные файлы лежат прямо в daily/ и пишутся в history/."""
+    return _load(path)[1]
+
+
+def get_region(region=None, path=None):
+    """Region по ключу (или сам Region). Без ключа — OSTROVOK_REGION, иначе регион по умолчанию."""
+    if isinstance(region, Region):
+        return region
+    regions, default = _load(path)
+    key = region or os.environ.get("OSTROVOK_REGION") or default
+    try:
+        return regions[key]
+    except KeyError:
+        raise ValueError(f"Неизвестный регион {key!r}; известные: {', '.join(regions)}") from None
+
+
+def is_default_region(region, path=None):
+    return get_region(region, path).key == default_region_key(path)
+
+
+def region_daily_dir(region, daily_dir):
+    """Каталог daily/ региона: для региона по умолчанию — сам daily_dir, для остальных — daily_dir/regions/{key}."""
+    region = get_region(region)
+    if is_default_region(region):
+        return Path(daily_dir)
+    return Path(daily_dir) / "regions" / region.key
@@ -0,0 +1,120 @@
+import json
+import logging
+import math
+import os
+import random
+import threading
+import time
+from collections import namedtuple
+from datetime import timedelta
+
+from fixture_store import FixtureStore, kind_for_url
+from http_transport import TransportStats
+
+logger = logging.getLogger(__name__)
+
+# Профиль сети для воспроизведения: медиана задержки (с), разброс логнормального распределения,
+# доля ответов 503 и доля ответов 429
+LatencyProfile = namedtuple("LatencyProfile", "median sigma error_rate throttle_rate")
+
+LATENCY_PROFILES = {
+    "none": LatencyProfile(0.0, 0.0, 0.0, 0.0),
+    "fast": LatencyProfile(0.05, 0.3, 0.0, 0.0),
+    "typical": LatencyProfile(0.3, 0.5, 0.01, 0.01),
+    "slow": LatencyProfile(1.0, 0.6, 0.02, 0.02),
+    "flaky": LatencyProfile(0.3, 0.5, 0.10, 0.05),
+}
+# "recorded" — задержки, записанные вместе с ответами (response.elapsed), без ошибок
+RECORDED_PROFILE = "recorded"
+
+
+class ReplayResponse:
+    """Ответ в объёме, который читают парсеры: status_code, content, headers, elapsed, json()."""
+
+    def __init__(self, status_code, content=b"", headers=None, elapsed=0.0):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+        self.elapsed = timedelta(seconds=elapsed)
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class ReplayTransport:
+    """Транспорт с интерфейсом PooledTransport, отвечающий записанными ответами из FixtureStore без сети.
+    Задержки и ошибки 503/429 задаются профилем (LATENCY_PROFILES или "recorded"), seed делает прогон повторяемым.
+    Запрос, для которого нет записи, получает 404."""
+
+    offline = True
+
+    def __init__(self, store, profile="none", seed=None):
+        self.store = store if isinstance(store, FixtureStore) else FixtureStore(store)
+        self.profile_name = profile
+        self.profile = None if profile == RECORDED_PROFILE else LATENCY_PROFILES[profile]
+        self.stats = TransportStats()
+        self.session = None
+        self.missing = 0
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+
+    def set_cookies(self, cookies):
+        """Куки офлайн не нужны."""
+
+    def _delay(self, entry):
+        if self.profile is None:
+            return (entry or {}).get("elapsed") or 0.0
+        if not self.profile.median:
+            return 0.0
+        with self._random_lock:
+            return self._random.lognormvariate(math.log(self.profile.median), self.profile.sigma)
+
+    def _fault(self):
+        if self.profile is None:
+            return None
+        with self._random_lock:
+            roll = self._random.random()
+        if roll < self.profile.throttle_rate:
+            return ReplayResponse(429, b"", {"Retry-After": "0"})
+        if roll < self.profile.throttle_rate + self.profile.error_rate:
+            return ReplayResponse(503)
+        return None
+
+    def post(self, url, json=None, **kwargs):
+        self.stats.begin_request()
+        start = time.perf_counter()
+        kind = kind_for_url(url)
+        entry = self.store.lookup(kind, json) if kind else None
+        delay = self._delay(entry)
+        if delay:
+            time.sleep(delay)
+
+        response = self._fault()
+        if response is None:
+            if entry is None:
+                self.missing += 1
+                response = ReplayResponse(404)
+            else:
+                response = ReplayResponse(
+                    entry.get("status") or 200,
+                    (entry.get("body") or "").encode("utf-8"),
+                    entry.get("headers"),
+                )
+        response.elapsed = timedelta(seconds=delay)
+        self.stats.end_request(delay, time.perf_counter() - start, len(response.content))
+        return response
+
+
+def replay_transport_from_env():
+    """ReplayTransport, если задан OSTROVOK_REPLAY (каталог с записями), иначе None.
+    Профиль — OSTROVOK_REPLAY_PROFILE (по умолчанию none), seed — OSTROVOK_REPLAY_SEED."""
+    directory = os.environ.get("OSTROVOK_REPLAY")
+    if not directory:
+        return None
+    profile = os.environ.get("OSTROVOK_REPLAY_PROFILE", "none")
+    if profile != RECORDED_PROFILE and profile not in LATENCY_PROFILES:
+        logger.warning("Неизвестный профиль воспроизведения %s — используется none", profile)
+        profile = "none"
+    seed = os.environ.get("OSTROVOK_REPLAY_SEED")
+    logger.info("Офлайн-режим: ответы API из %s, профиль %s", directory, profile)
+    return ReplayTransport(directory, profile=profile, seed=int(seed) if seed else None)
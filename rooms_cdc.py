@@ -0,0 +1,494 @@
+import argparse
+import bisect
+import csv
+import io
+import logging
+import os
+import sys
+from datetime import date
+from pathlib import Path
+
+from fingerprint_manifest import FingerprintManifest, file_fingerprint
+from ostrovok_rooms import ROOMS_FIELDNAMES
+
+# Настройка stdout для корректного вывода Юникода
+if sys.stdout.encoding != 'utf-8':
+    sys.stdout.reconfigure(encoding='utf-8')
+
+logger = logging.getLogger(__name__)
+
+CURRENT_DIR = Path(__file__).resolve().parent
+DAILY_DIR = CURRENT_DIR / "daily"
+# Изменения номеров за день относительно предыдущего снимка: daily/rooms_cdc/{date}.csv
+CDC_DIR = DAILY_DIR / "rooms_cdc"
+# Цепочка снимков (предыдущая дата, число строк, sha256 снимка) — daily/manifests/rooms_cdc.json
+CDC_MANIFEST = "rooms_cdc"
+
+KEY_FIELDS = ("ota_hotel_id", "rg_hash")
+PRICE_FIELDS = ("price_rub_min", "price_rub_max")
+VALUE_FIELDS = [field for field in ROOMS_FIELDNAMES if field not in KEY_FIELDS]
+CDC_FIELDNAMES = ["op", "ota_hotel_id", "rg_hash", "occurrence", "position", "fields"] + VALUE_FIELDS
+
+# Строка снимка определяется ключом (ota_hotel_id, rg_hash) и occurrence — номером повтора ключа в снимке
+# (пусто — первый): у отеля бывает несколько строк с пустым rg_hash (заглушки _RoomGroup.failed()).
+# Виды записей. snapshot — заголовок снимка (fields — колонки через ';', position — число строк);
+# appeared — новая строка целиком; disappeared — строка исчезла; price_changed / allotment_changed / updated —
+# изменились колонки из fields (цена важнее остатка, остаток — прочих колонок); moved — строка сменила место.
+# position у любой записи, кроме disappeared, — место строки в новом снимке, если его нельзя вывести из прежнего
+OP_SNAPSHOT = "snapshot"
+OP_APPEARED = "appeared"
+OP_DISAPPEARED = "disappeared"
+OP_PRICE_CHANGED = "price_changed"
+OP_ALLOTMENT_CHANGED = "allotment_changed"
+OP_UPDATED = "updated"
+OP_MOVED = "moved"
+CHANGE_OPS = (OP_APPEARED, OP_DISAPPEARED, OP_PRICE_CHANGED, OP_ALLOTMENT_CHANGED, OP_UPDATED)
+
+# Полный снимок хранится у каждого base_every-го дня цепочки (база); остальные дни — только изменения
+DEFAULT_CDC_BASE_EVERY = 7
+# compact (вручную): последние дни, полные снимки которых не удаляются
+DEFAULT_CDC_KEEP_RECENT = 14
+
+
+def _row_keys(rows):
+    """Ключи строк снимка (ota_hotel_id, rg_hash, occurrence); повторы одной пары нумеруются по порядку."""
+    seen = {}
+    keys = []
+    for row in rows:
+        pair = row.get("ota_hotel_id", ""), row.get("rg_hash", "")
+        occurrence = seen.get(pair, 0)
+        seen[pair] = occurrence + 1
+        keys.append(pair + (occurrence,))
+    return keys
+
+
+def _record_key(record):
+    return record.get("ota_hotel_id", ""), record.get("rg_hash", ""), int(record.get("occurrence") or 0)
+
+
+def _key_fields(key):
+    ota_hotel_id, rg_hash, occurrence = key
+    return {"ota_hotel_id": ota_hotel_id, "rg_hash": rg_hash, "occurrence": occurrence or ""}
+
+
+def _read_snapshot(path):
+    """(колонки, строки) CSV снимка."""
+    with open(path, "r", encoding="utf-8-sig", newline="") as csv_file:
+        reader = csv.DictReader(csv_file)
+        rows = list(reader)
+        return list(reader.fieldnames or []), rows
+
+
+def _line_terminator(path):
+    """Окончание строк снимка: ранние файлы записаны с \n, остальные — с \r\n, как пишет csv по умолчанию."""
+    with open(path, "rb") as f:
+        return "\r\n" if f.readline().endswith(b"\r\n") else "\n"
+
+
+def _snapshot_bytes(fieldnames, rows, lineterminator="\r\n"):
+    """Снимок в том же виде, в каком его пишет парсер номеров (utf-8-sig, QUOTE_MINIMAL)."""
+    buffer = io.StringIO(newline="")
+    writer = csv.DictWriter(buffer, fieldnames=fieldnames, delimiter=',', quoting=csv.QUOTE_MINIMAL,
+                            extrasaction="ignore", lineterminator=lineterminator)
+    writer.writeheader()
+    writer.writerows(rows)
+    return buffer.getvalue().encode("utf-8-sig")
+
+
+def _stable_indices(old_positions):
+    """Индексы элементов наибольшей возрастающей подпоследовательности (строки, сохранившие взаимный порядок)."""
+    tails, tail_indices, parents = [], [], [None] * len(old_positions)
+    for index, value in enumerate(old_positions):
+        slot = bisect.bisect_left(tails, value)
+        if slot == len(tails):
+            tails.append(value)
+            tail_indices.append(index)
+        else:
+            tails[slot] = value
+            tail_indices[slot] = index
+        parents[index] = tail_indices[slot - 1] if slot else None
+    stable = set()
+    index = tail_indices[-1] if tail_indices else None
+    while index is not None:
+        stable.add(index)
+        index = parents[index]
+    return stable
+
+
+def diff_snapshots(previous_rows, fieldnames, rows):
+    """Записи изменений (dict по CDC_FIELDNAMES) от previous_rows к rows по ключу (ota_hotel_id, rg_hash, occurrence).
+    Порядок строк восстанавливается точно: места явно хранятся только у новых строк и у строк вне
+    наибольшей подпоследовательности, сохранившей прежний порядок."""
+    unknown = [field for field in fieldnames if field not in ROOMS_FIELDNAMES]
+    if unknown:
+        raise ValueError(f"Колонки снимка не поддерживаются CDC: {', '.join(unknown)}")
+    value_fields = [field for field in fieldnames if field not in KEY_FIELDS]
+    previous_keys = _row_keys(previous_rows)
+    previous = {key: (index, row) for index, (key, row) in enumerate(zip(previous_keys, previous_rows))}
+    keys = _row_keys(rows)
+    current_keys = set(keys)
+
+    records = [{"op": OP_SNAPSHOT, "position": len(rows), "fields": ";".join(fieldnames)}]
+    survivors = [index for index, key in enumerate(keys) if key in previous]
+    stable = {survivors[i] for i in _stable_indices([previous[keys[index]][0] for index in survivors])}
+    for position, (key, row) in enumerate(zip(keys, rows)):
+        record = _key_fields(key)
+        if key not in previous:
+            record.update({field: row.get(field, "") for field in value_fields})
+            record.update(op=OP_APPEARED, position=position)
+            records.append(record)
+            continue
+        previous_row = previous[key][1]
+        changed = [field for field in value_fields if row.get(field, "") != previous_row.get(field, "")]
+        if changed:
+            if any(field in PRICE_FIELDS for field in changed):
+                op = OP_PRICE_CHANGED
+            elif "allotment" in changed:
+                op = OP_ALLOTMENT_CHANGED
+            else:
+                op = OP_UPDATED
+            record.update({field: row.get(field, "") for field in changed})
+            record.update(op=op, fields=";".join(changed))
+        elif position not in stable:
+            record["op"] = OP_MOVED
+        else:
+            continue
+        if position not in stable:
+            record["position"] = position
+        records.append(record)
+    for key in previous_keys:
+        if key not in current_keys:
+            records.append({"op": OP_DISAPPEARED, **_key_fields(key)})
+    return records
+
+
+def apply_delta(previous_rows, records):
+    """Снимок по предыдущему и записям изменений. Возвращает (колонки, строки).
+    ValueError — изменения не согласованы с предыдущим снимком."""
+    header = records[0] if records and records[0].get("op") == OP_SNAPSHOT else None
+    if header is None:
+        raise ValueError("Нет записи snapshot в начале изменений")
+    fieldnames = header["fields"].split(";")
+    size = int(header["position"])
+    previous_keys = _row_keys(previous_rows)
+    rows_by_key = {key: dict(row) for key, row in zip(previous_keys, previous_rows)}
+    placed = {}
+    for record in records[1:]:
+        key = _record_key(record)
+        op = record["op"]
+        if op == OP_DISAPPEARED:
+            rows_by_key.pop(key, None)
+            continue
+        if op == OP_APPEARED:
+            row = {field: record.get(field, "") for field in fieldnames}
+            row.update(ota_hotel_id=key[0], rg_hash=key[1])
+            rows_by_key[key] = row
+        elif key not in rows_by_key:
+            raise ValueError(f"Изменения не согласованы с предыдущим снимком: нет строки {key}")
+        elif op != OP_MOVED:
+            for field in record["fields"].split(";"):
+                rows_by_key[key][field] = record.get(field, "")
+        if record.get("position") not in (None, ""):
+            placed[int(record["position"])] = key
+
+    placed_keys = set(placed.values())
+    stable = iter(key for key in previous_keys if key in rows_by_key and key not in placed_keys)
+    rows = []
+    for position in range(size):
+        key = placed[position] if position in placed else next(stable, None)
+        if key is None:
+            raise ValueError("Изменения не согласованы с предыдущим снимком: не хватает строк")
+        rows.append(rows_by_key[key])
+    if next(stable, None) is not None:
+        raise ValueError("Изменения не согласованы с предыдущим снимком: остались неразмещённые строки")
+    return fieldnames, rows
+
+
+def _write_records(path, records):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8-sig", newline="") as csv_file:
+        writer = csv.DictWriter(csv_file, fieldnames=CDC_FIELDNAMES, delimiter=',', quoting=csv.QUOTE_MINIMAL)
+        writer.writeheader()
+        writer.writerows(records)
+    os.replace(tmp_path, path)
+
+
+def _read_records(path):
+    with open(path, "r", encoding="utf-8-sig", newline="") as csv_file:
+        return list(csv.DictReader(csv_file))
+
+
+class RoomsCDC:
+    """Изменения снимков daily/rooms день к дню: daily/rooms_cdc/{date}.csv и цепочка в манифесте.
+    Любой снимок восстанавливается по ближайшему предшествующему полному снимку (базе) и изменениям.
+    diff с base_every оставляет полный снимок только у баз (каждый base_every-й день цепочки), у остальных
+    дней после проверки изменений полный файл удаляется — в git попадают только изменения.
+    Читатели daily/rooms (статистика, планировщик, перебор по взрослым, history_store) берут даты из dates(),
+    снимки — из load(), отпечаток — из sha256(), поэтому удалённые файлы им не нужны."""
+
+    def __init__(self, daily_dir=None, cdc_dir=None, manifest_dir=None):
+        self.daily_dir = Path(daily_dir or DAILY_DIR)
+        self.cdc_dir = Path(cdc_dir or (CDC_DIR if daily_dir is None else self.daily_dir / "rooms_cdc"))
+        if manifest_dir is None and daily_dir is not None:
+            manifest_dir = self.daily_dir / "manifests"
+        self.manifest = FingerprintManifest(CDC_MANIFEST, directory=manifest_dir)
+
+    def _snapshot_path(self, day):
+        return self.daily_dir / "rooms" / f"{day.isoformat()}.csv"
+
+    def _delta_path(self, day):
+        return self.cdc_dir / f"{day.isoformat()}.csv"
+
+    def dates(self):
+        """Даты снимков: полные файлы daily/rooms и даты из цепочки изменений, по возрастанию."""
+        days = {date.fromisoformat(day) for day in self.manifest.entries}
+        for path in (self.daily_dir / "rooms").glob("*.csv"):
+            try:
+                days.add(date.fromisoformat(path.stem))
+            except ValueError:
+                continue
+        return sorted(days)
+
+    def sha256(self, day):
+        """sha256 снимка за день: по файлу, а после compact — из манифеста (восстановленный снимок совпадает с ним).
+        None — снимка нет."""
+        return file_fingerprint(self._snapshot_path(day)) or (self.manifest.get(day) or {}).get("sha256")
+
+    def load(self, day):
+        """(колонки, строки) снимка за день: полный файл или восстановление по базе и изменениям."""
+        path = self._snapshot_path(day)
+        if path.exists():
+            return _read_snapshot(path)
+        chain = []
+        current = day
+        while not self._snapshot_path(current).exists():
+            entry = self.manifest.get(current)
+            if not entry or not entry.get("previous"):
+                raise FileNotFoundError(f"Снимок {current} нельзя восстановить: нет файла и изменений")
+            chain.append(current)
+            current = date.fromisoformat(entry["previous"])
+        fieldnames, rows = _read_snapshot(self._snapshot_path(current))
+        for step in reversed(chain):
+            fieldnames, rows = apply_delta(rows, _read_records(self._delta_path(step)))
+        return fieldnames, rows
+
+    def _chain_length(self, day):
+        """Число изменений, которые load применяет к базе, чтобы получить снимок за день (0 — полный файл есть)."""
+        length = 0
+        current = day
+        while not self._snapshot_path(current).exists():
+            entry = self.manifest.get(current)
+            if not entry or not entry.get("previous"):
+                break
+            length += 1
+            current = date.fromisoformat(entry["previous"])
+        return length
+
+    def _is_base(self, day, base_every):
+        """Полный снимок дня хранится: день без изменений или цепочка до него достигла base_every."""
+        entry = self.manifest.get(day) or {}
+        if not entry.get("previous"):
+            return True
+        return self._chain_length(date.fromisoformat(entry["previous"])) + 1 >= max(1, base_every)
+
+    def _restores_exactly(self, day, entry):
+        """Снимок за день байт в байт восстанавливается по предыдущему и изменениям (полный файл ещё есть)."""
+        path = self._snapshot_path(day)
+        if file_fingerprint(path) != entry.get("sha256") or not self._delta_path(day).exists():
+            return False
+        previous_fieldnames, previous_rows = self.load(date.fromisoformat(entry["previous"]))
+        data = _snapshot_bytes(
+            *apply_delta(previous_rows, _read_records(self._delta_path(day))), entry.get("lineterminator", "\r\n"),
+        )
+        return data == path.read_bytes()
+
+    def rebuild(self, day, output_path=None):
+        """Восстанавливает снимок за день в output_path (по умолчанию daily/rooms/{date}.csv) и сверяет sha256
+        с манифестом. Возвращает путь."""
+        fieldnames, rows = self.load(day)
+        entry = self.manifest.get(day) or {}
+        data = _snapshot_bytes(fieldnames, rows, entry.get("lineterminator", "\r\n"))
+        output_path = Path(output_path) if output_path else self._snapshot_path(day)
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        output_path.write_bytes(data)
+        if entry and file_fingerprint(output_path) != entry.get("sha256"):
+            logger.warning("Восстановленный снимок %s не совпадает с исходным по sha256", day)
+        logger.info("Снимок %s восстановлен в %s (%s строк)", day, output_path, len(rows))
+        return output_path
+
+    def _is_current(self, day, entry, previous_day):
+        if not entry:
+            return False
+        sha256 = file_fingerprint(self._snapshot_path(day))
+        if sha256 is not None and sha256 != entry.get("sha256"):
+            return False
+        previous_entry = self.manifest.get(previous_day) if previous_day else None
+        expected_previous = previous_day.isoformat() if previous_day else None
+        if entry.get("base"):
+            # Изменения за день не восстанавливали снимок точно — хранится полный снимок
+            return sha256 is not None
+        if entry.get("previous") != expected_previous:
+            return False
+        if previous_day is None:
+            return True
+        return bool(previous_entry) and entry.get("previous_sha256") == previous_entry.get("sha256") \
+            and self._delta_path(day).exists()
+
+    def diff(self, day, force=False, base_every=None):
+        """Изменения снимка за день относительно предыдущего по дате. Первый снимок цепочки — база без изменений.
+        base_every — после записи изменений полный снимок удаляется, если день не база (см. _is_base).
+        Возвращает число записей изменений (без snapshot) или None, если снимка нет."""
+        path = self._snapshot_path(day)
+        if not path.exists():
+            logger.warning("Нет снимка %s", path)
+            return None
+        earlier = [other for other in self.dates() if other < day]
+        previous_day = earlier[-1] if earlier else None
+        entry = self.manifest.get(day)
+        if not force and self._is_current(day, entry, previous_day):
+            self._drop_snapshot(day, base_every)
+            return entry.get("changes", 0)
+
+        fieldnames, rows = _read_snapshot(path)
+        lineterminator = _line_terminator(path)
+        new_entry = {
+            "previous": None, "rows": len(rows), "sha256": file_fingerprint(path), "lineterminator": lineterminator,
+        }
+        changes = 0
+        records = None
+        if previous_day is not None:
+            try:
+                previous_fieldnames, previous_rows = self.load(previous_day)
+                records = diff_snapshots(previous_rows, fieldnames, rows)
+                # Проверка до записи: изменения должны давать тот же снимок байт в байт
+                if _snapshot_bytes(*apply_delta(previous_rows, records), lineterminator) != path.read_bytes():
+                    raise ValueError("восстановленный снимок отличается от исходного")
+            except (FileNotFoundError, ValueError) as e:
+                logger.warning("Изменения %s → %s не посчитаны (%s) — за %s хранится полный снимок", previous_day, day, e, day)
+                records = None
+                new_entry["base"] = True
+                self._delta_path(day).unlink(missing_ok=True)
+        if records is not None:
+            _write_records(self._delta_path(day), records)
+            changes = sum(1 for record in records if record["op"] in CHANGE_OPS)
+            previous_entry = self.manifest.get(previous_day) or {}
+            new_entry.update(
+                previous=previous_day.isoformat(),
+                previous_sha256=previous_entry.get("sha256") or file_fingerprint(self._snapshot_path(previous_day)),
+                changes=changes,
+                delta_bytes=self._delta_path(day).stat().st_size,
+            )
+            logger.info(
+                "Изменения %s → %s: %s записей (%s байт против %s у снимка)",
+                previous_day, day, changes, new_entry["delta_bytes"], path.stat().st_size,
+            )
+        self.manifest.record(day, new_entry)
+        self.manifest.save()
+        self._drop_snapshot(day, base_every)
+        return changes
+
+    def _drop_snapshot(self, day, base_every):
+        """Удаляет полный снимок дня, который не база и точно восстанавливается по изменениям."""
+        if not base_every or self._is_base(day, base_every):
+            return False
+        entry = self.manifest.get(day)
+        if not self._restores_exactly(day, entry):
+            logger.warning("Снимок %s не восстанавливается точно по изменениям — оставлен", day)
+            return False
+        self._snapshot_path(day).unlink()
+        logger.info("Снимок %s хранится только изменениями (цепочка %s)", day, self._chain_length(day))
+        return True
+
+    def diff_all(self, force=False, base_every=None):
+        """Изменения по всем снимкам по порядку дат (актуальные по манифесту пропускаются). Возвращает число дат."""
+        count = 0
+        for day in self.dates():
+            if self._snapshot_path(day).exists() and self.diff(day, force=force, base_every=base_every) is not None:
+                count += 1
+        return count
+
+    def compact(self, keep_recent=DEFAULT_CDC_KEEP_RECENT, base_every=DEFAULT_CDC_BASE_EVERY, dry_run=False):
+        """Удаляет полные снимки прошлых дней, как diff с base_every, кроме последних keep_recent дней.
+        Запускается вручную (в CI снимки удаляет diff --base-every): удалённые файлы остаются в истории git,
+        поэтому compact не уменьшает уже накопленный репозиторий, а только рабочее дерево.
+        Возвращает список удалённых (dry_run — подлежащих удалению) дат."""
+        days = self.dates()
+        removable = days[:-keep_recent] if keep_recent else days
+        removed = []
+        for day in removable:
+            entry = self.manifest.get(day)
+            if not entry or not self._snapshot_path(day).exists() or self._is_base(day, base_every):
+                continue
+            if dry_run:
+                if self._restores_exactly(day, entry):
+                    removed.append(day)
+            elif self._drop_snapshot(day, base_every):
+                removed.append(day)
+        logger.info("%s полных снимков: %s", "К удалению" if dry_run else "Удалено", len(removed))
+        return removed
+
+
+def iter_changes(start=None, end=None, ota_hotel_id=None, ops=CHANGE_OPS, cdc_dir=None):
+    """Лента изменений из daily/rooms_cdc: записи (с колонкой date) в порядке дат, без snapshot и moved."""
+    for path in sorted(Path(cdc_dir or CDC_DIR).glob("*.csv")):
+        try:
+            day = date.fromisoformat(path.stem)
+        except ValueError:
+            continue
+        if (start and day < start) or (end and day > end):
+            continue
+        for record in _read_records(path):
+            if record["op"] in ops and (ota_hotel_id is None or record["ota_hotel_id"] == ota_hotel_id):
+                yield {"date": day.isoformat(), **record}
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Изменения снимков daily/rooms день к дню")
+    sub = arg_parser.add_subparsers(dest="command", required=True)
+    diff_parser = sub.add_parser("diff", help="изменения снимка за дату (по умолчанию — за последнюю)")
+    diff_parser.add_argument("--date", type=date.fromisoformat)
+    diff_parser.add_argument("--all", action="store_true", help="по всем снимкам (актуальные пропускаются)")
+    diff_parser.add_argument("--force", action="store_true", help="пересчитать, даже если изменения актуальны")
+    diff_parser.add_argument("--base-every", type=int,
+                             help="полный снимок только у каждого N-го дня цепочки, у остальных — только изменения")
+    rebuild_parser = sub.add_parser("rebuild", help="восстановить снимок по базе и изменениям")
+    rebuild_parser.add_argument("--date", type=date.fromisoformat, required=True)
+    rebuild_parser.add_argument("--out", help="куда записать (по умолчанию daily/rooms/{date}.csv)")
+    compact_parser = sub.add_parser("compact", help="вручную удалить полные снимки прошлых дней, восстанавливаемые по изменениям")
+    compact_parser.add_argument("--keep-recent", type=int, default=DEFAULT_CDC_KEEP_RECENT)
+    compact_parser.add_argument("--base-every", type=int, default=DEFAULT_CDC_BASE_EVERY)
+    compact_parser.add_argument("--dry-run", action="store_true")
+    feed_parser = sub.add_parser("feed", help="лента изменений в CSV на stdout")
+    feed_parser.add_argument("--start", type=date.fromisoformat)
+    feed_parser.add_argument("--end", type=date.fromisoformat)
+    feed_parser.add_argument("--hotel", help="ota_hotel_id")
+    feed_parser.add_argument("--op", action="append", choices=CHANGE_OPS, help="виды изменений (можно несколько)")
+    args = arg_parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(name)s: %(message)s")
+
+    cdc = RoomsCDC()
+    if args.command == "diff":
+        if args.all:
+            logger.info("Дат обработано: %s", cdc.diff_all(force=args.force, base_every=args.base_every))
+        else:
+            days = [day for day in cdc.dates() if cdc._snapshot_path(day).exists()]
+            day = args.date or (days[-1] if days else None)
+            if day is None:
+                logger.warning("Нет снимков daily/rooms")
+                return 1
+            cdc.diff(day, force=args.force, base_every=args.base_every)
+    elif args.command == "rebuild":
+        cdc.rebuild(args.date, args.out)
+    elif args.command == "compact":
+        cdc.compact(args.keep_recent, args.base_every, args.dry_run)
+    else:
+        writer = csv.DictWriter(sys.stdout, fieldnames=["date"] + CDC_FIELDNAMES, delimiter=',',
+                                quoting=csv.QUOTE_MINIMAL)
+        writer.writeheader()
+        writer.writerows(iter_changes(args.start, args.end, args.hotel, tuple(args.op or CHANGE_OPS)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,183 @@
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# Отчёты о прогонах: runs/{date}.json — время этапов, запросы, задержки, повторы, записанные строки
+RUNS_DIR = Path(__file__).resolve().parent / "runs"
+# Верхние границы корзин гистограммы задержек, секунды (последняя корзина — всё, что дольше)
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _percentile(sorted_values, percent):
+    """Процентиль по ближайшему рангу (значения отсортированы)."""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * percent // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def latency_summary(samples):
+    """count, p50/p95/p99, max и гистограмма по LATENCY_BUCKETS для списка задержек в секундах."""
+    values = sorted(samples)
+    histogram = {}
+    index = 0
+    for bound in LATENCY_BUCKETS:
+        start = index
+        while index < len(values) and values[index] <= bound:
+            index += 1
+        histogram[f"<={bound:g}"] = index - start
+    histogram[f">{LATENCY_BUCKETS[-1]:g}"] = len(values) - index
+    summary = {"count": len(values)}
+    for key, value in (("p50", _percentile(values, 50)), ("p95", _percentile(values, 95)),
+                       ("p99", _percentile(values, 99)), ("max", values[-1] if values else None)):
+        summary[key] = round(value, 4) if value is not None else None
+    summary["histogram"] = histogram
+    return summary
+
+
+class RunMetrics:
+    """Потокобезопасный сбор метрик прогона по этапам (hotels, rooms, statistics, ...):
+    время этапа, счётчики (запросы, байты, повторы, строки) и выборки задержек.
+    Этапы заполняются хуками в парсерах; отчёт сохраняется в runs/{date}.json под именем прогона."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.started_at = datetime.now(timezone.utc)
+            self._stages = {}
+            self._latencies = {}
+
+    def _stage(self, name):
+        stage = self._stages.get(name)
+        if stage is None:
+            stage = self._stages[name] = {"seconds": 0.0}
+        return stage
+
+    def add_time(self, stage, seconds):
+        with self._lock:
+            self._stage(stage)["seconds"] += seconds
+
+    @contextmanager
+    def stage(self, name):
+        """Время блока добавляется к этапу name (повторный вход суммируется)."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def timed(self, name):
+        """Декоратор: время каждого вызова функции добавляется к этапу name."""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.stage(name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def observed(self, stage, key):
+        """Декоратор: длительность каждого вызова функции — в выборку задержек key этапа stage."""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.observe(stage, key, time.perf_counter() - start)
+            return wrapper
+        return decorator
+
+    def count(self, stage, key, value=1):
+        with self._lock:
+            stage_data = self._stage(stage)
+            stage_data[key] = stage_data.get(key, 0) + value
+
+    def observe(self, stage, key, seconds):
+        """Одна задержка (секунды) в выборку key этапа stage."""
+        with self._lock:
+            self._stage(stage)
+            self._latencies.setdefault((stage, key), []).append(seconds)
+
+    def add_transport(self, stage, stats):
+        """Замеры TransportStats (PooledTransport/ReplayTransport): запросы, байты, соединения, задержки."""
+        with stats._lock:
+            requests, received, connections = stats.requests, stats.bytes_received, stats.new_connections
+            total_times, ttfb_times = list(stats.total_times), list(stats.ttfb_times)
+        with self._lock:
+            stage_data = self._stage(stage)
+            for key, value in (("requests", requests), ("bytes_received", received), ("new_connections", connections)):
+                stage_data[key] = stage_data.get(key, 0) + value
+            self._latencies.setdefault((stage, "request"), []).extend(total_times)
+            self._latencies.setdefault((stage, "ttfb"), []).extend(ttfb_times)
+
+    def report(self):
+        with self._lock:
+            stages = {name: dict(data) for name, data in self._stages.items()}
+            latencies = {key: list(values) for key, values in self._latencies.items()}
+        for (stage, key), values in latencies.items():
+            if values:
+                stages[stage].setdefault("latency", {})[key] = latency_summary(values)
+        for data in stages.values():
+            data["seconds"] = round(data["seconds"], 3)
+        return {
+            "started_at": self.started_at.isoformat(timespec="seconds"),
+            "finished_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "stages": stages,
+        }
+
+    def summary(self, report=None):
+        """Одна строка для Telegram: время этапа, запросы, p95 запроса, повторы и строки."""
+        report = report or self.report()
+        parts = []
+        for name, data in report["stages"].items():
+            details = []
+            if data.get("requests"):
+                details.append(f"{data['requests']} запр.")
+            p95 = (data.get("latency", {}).get("request") or {}).get("p95")
+            if p95 is not None:
+                details.append(f"p95 {p95:.2f} с")
+            if data.get("retries"):
+                details.append(f"повторов {data['retries']}")
+            if data.get("rows"):
+                details.append(f"строк {data['rows']}")
+            if not details and not data["seconds"]:
+                continue  # этап только с выборкой задержек внутри другого этапа
+            parts.append(f"{name} {data['seconds']:.1f} с" + (f" ({', '.join(details)})" if details else ""))
+        return "Метрики: " + "; ".join(parts) if parts else ""
+
+    def save(self, run_date, run="pipeline", directory=None):
+        """Дописывает отчёт в runs/{date}.json под ключом run (повторный прогон того же вида заменяет прежний).
+        Возвращает отчёт; ошибка записи только логируется."""
+        report = self.report()
+        path = Path(directory or RUNS_DIR) / f"{run_date}.json"
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            try:
+                reports = json.loads(path.read_text(encoding="utf-8"))
+            except (FileNotFoundError, ValueError):
+                reports = {}
+            reports[run] = report
+            tmp_path = path.with_name(path.name + ".tmp")
+            tmp_path.write_text(json.dumps(reports, ensure_ascii=False, indent=1), encoding="utf-8")
+            os.replace(tmp_path, path)
+            logger.info("Отчёт о прогоне сохранён в %s", path)
+        except OSError as e:
+            logger.error("Не удалось сохранить отчёт о прогоне %s: %s", path, e)
+        return report
+
+
+# Метрики текущего процесса: хуки парсеров пишут сюда, точка входа сохраняет отчёт
+metrics = RunMetrics()
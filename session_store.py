@@ -0,0 +1,83 @@
+import json
+import logging
+import os
+import time
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# Общая сессия браузера (куки + storage state) для этапов hotels и rooms; в git не попадает
+SESSION_PATH = Path(__file__).resolve().parent / ".session" / "ostrovok.json"
+DEFAULT_MAX_AGE = 6 * 3600
+
+
+class SessionStore:
+    """Хранит storage state браузера Playwright на диске со сроком годности.
+    Этап hotels сохраняет сессию после обхода выдачи, этап rooms берёт из неё куки без запуска Chromium."""
+
+    def __init__(self, path=None, max_age=None):
+        self.path = Path(path) if path else SESSION_PATH
+        if max_age is None:
+            try:
+                max_age = int(os.environ.get("SESSION_MAX_AGE", DEFAULT_MAX_AGE))
+            except ValueError:
+                max_age = DEFAULT_MAX_AGE
+        self.max_age = max_age
+
+    def save(self, storage_state, user_agent=None):
+        """Сохраняет storage state ({"cookies": [...], "origins": [...]}) атомарной заменой файла."""
+        if not storage_state or not storage_state.get("cookies"):
+            return False
+        data = {
+            "saved_at": time.time(),
+            "user_agent": user_agent,
+            "storage_state": storage_state,
+        }
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix(".tmp")
+            tmp_path.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+            os.replace(tmp_path, self.path)
+            logger.info("Сессия сохранена: %s куки → %s", len(storage_state["cookies"]), self.path)
+            return True
+        except Exception as e:
+            logger.warning("Не удалось сохранить сессию: %s", e)
+            return False
+
+    def load(self):
+        """Возвращает storage state, если сессия есть, не старше max_age и содержит непросроченные куки."""
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning("Не удалось прочитать сессию %s: %s", self.path, e)
+            return None
+
+        age = time.time() - data.get("saved_at", 0)
+        if age > self.max_age:
+            logger.info("Сохранённая сессия устарела (%.0f мин.)", age / 60)
+            return None
+
+        now = time.time()
+        state = data.get("storage_state") or {}
+        cookies = [
+            c for c in state.get("cookies", [])
+            if c.get("expires", -1) in (-1, None) or c["expires"] > now
+        ]
+        if not cookies:
+            return None
+        return {**state, "cookies": cookies}
+
+    def load_cookies(self):
+        """Куки сохранённой сессии в виде dict name -> value (или None)."""
+        state = self.load()
+        if not state:
+            return None
+        return {cookie["name"]: cookie["value"] for cookie in state["cookies"]}
+
+    def invalidate(self):
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
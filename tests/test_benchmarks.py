@@ -0,0 +1,73 @@
+"""Смоук-тест бенчмарков: каждый скрипт импортируется и делает один прогон на маленьком записанном дне."""
+import csv
+import importlib
+import importlib.util
+from pathlib import Path
+
+import pytest
+
+import checkpoint_journal
+from ostrovok_rooms import ROOMS_FIELDNAMES
+
+BENCHMARKS_DIR = Path(__file__).resolve().parent.parent / "benchmarks"
+DAY = "2026-05-20"
+HOTELS = [
+    {"city": "Иркутск", "ota_hotel_id": f"hotel_{n}", "master_id": str(1000 + n), "name": f"Отель {n}",
+     "name_en": f"Hotel {n}", "address": "ул. Ленина, 1", "latitude": "52.28", "longitude": "104.28",
+     "url": f"https://ostrovok.ru/hotel/russia/irkutsk/mid{1000 + n}/hotel_{n}", "rooms_number": "10"}
+    for n in range(3)
+]
+ROOMS = [
+    {**{name: "" for name in ROOMS_FIELDNAMES}, "ota_hotel_id": hotel["ota_hotel_id"], "master_id": hotel["master_id"],
+     "room_name": "Двухместный номер", "rg_hash": f"{hotel['master_id']}-{n}", "count_rg_hash": "3", "allotment": "2",
+     "bedding_type": "двуспальная кровать", "beds": '["двуспальная кровать"]', "bedding_data": '["double"]',
+     "multi_bed_data": '[{"bed": "double", "count": 1}]', "capacity": "2", "capacity_source": "multi_bed_data",
+     "price_rub_min": "5000", "price_rub_max": "6000", "url": hotel["url"]}
+    for hotel in HOTELS for n in range(2)
+]
+BENCHMARKS = {
+    "bench_capacity": ["--repeat", "1"],
+    "bench_extract_rooms": ["--repeat", "1"],
+    "bench_json_decode": ["--repeat", "1"],
+    "bench_replay": [],
+    "bench_statistics": ["--repeat", "1"],
+}
+
+
+def _write_csv(path, rows):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8-sig", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def _load(name):
+    spec = importlib.util.spec_from_file_location(name, BENCHMARKS_DIR / f"{name}.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def daily_day(tmp_path, monkeypatch):
+    daily_dir = tmp_path / "daily"
+    _write_csv(daily_dir / "hotels" / f"{DAY}.csv", HOTELS)
+    _write_csv(daily_dir / "rooms" / f"{DAY}.csv", ROOMS)
+    # Скрипты импортируют synthetic_fixtures по имени из benchmarks/ — каталог daily подменяется в нём
+    monkeypatch.syspath_prepend(str(BENCHMARKS_DIR))
+    monkeypatch.setattr(importlib.import_module("synthetic_fixtures"), "DAILY_DIR", daily_dir)
+    monkeypatch.setattr(checkpoint_journal, "CHECKPOINTS_DIR", tmp_path / "checkpoints")
+    monkeypatch.setenv("ROOMS_RATE", "1000")
+    monkeypatch.setenv("ROOMS_MAX_RATE", "1000")
+    return tmp_path
+
+
+@pytest.mark.parametrize("name", sorted(BENCHMARKS))
+def test_benchmark_runs_once(name, daily_day, monkeypatch, capsys):
+    module = _load(name)
+    if name == "bench_capacity":
+        # Номера читаются из ROOT/daily/rooms
+        monkeypatch.setattr(module, "ROOT", daily_day)
+    assert module.main(BENCHMARKS[name]) == 0
+    assert capsys.readouterr().out
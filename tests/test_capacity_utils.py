@@ -0,0 +1,71 @@
+import pytest
+
+import capacity_utils
+from capacity_utils import compute_max_capacity, compute_max_capacity_batch
+
+TEXT_CASES = [
+    ("Одноместный номер", [], 1),
+    ("Двухместный номер", [], 2),
+    ("Трёхместный номер", [], 3),
+    ("ТРЕХМЕСТНЫЙ номер", [], 3),
+    ("Четырехместный номер", [], 4),
+    ("Семейный номер", [], 3),
+    # Кровати важнее названия
+    ("Одноместный номер", ["двуспальная кровать"], 2),
+    ("Стандарт", ["двуспальная кровать", "диван"], 3),
+    ("Стандарт", ["2 отдельные кровати"], 2),
+    ("Стандарт", ["Две отдельные кровати", "диван-кровать"], 3),
+    ("Семейный номер", ["семейная двуспальная кровать"], 5),
+    # Правило срабатывает для кровати один раз
+    ("Стандарт", ["диван и ещё диван"], 1),
+    ("Номер", [], 1),
+    ("", None, 1),
+]
+
+
+@pytest.mark.parametrize("room_name, beds, expected", TEXT_CASES)
+def test_text_rules(room_name, beds, expected):
+    assert compute_max_capacity(room_name, beds) == expected
+
+
+def test_batch_and_cache_match_single_calls():
+    rooms = [(room_name, beds) for room_name, beds, _ in TEXT_CASES] * 3
+    capacity_utils._classify.cache_clear()
+    assert compute_max_capacity_batch(rooms) == [expected for _, _, expected in TEXT_CASES] * 3
+    assert [compute_max_capacity(*room) for room in rooms] == [expected for _, _, expected in TEXT_CASES] * 3
+    info = capacity_utils.capacity_cache_info()["text"]
+    # Каждая пара (название, кровати) классифицируется один раз, повторы берутся из кэша
+    assert info.misses == len(TEXT_CASES)
+
+
+STRUCTURED_CASES = [
+    # (room_name, beds, bedding_data, multi_bed_data) -> (capacity, capacity_source)
+    (("Стандарт", ["двуспальная кровать"], ["double"], [{"bed": "double", "count": 1}]), (2, "multi_bed_data")),
+    (("Стандарт", [], ["twin"], [{"bed": "single", "count": 3}]), (3, "multi_bed_data")),
+    # Неизвестный код multi_bed_data — основные места по bedding_data
+    (("Стандарт", [], ["twin"], [{"bed": "bunk", "count": 2}]), (2, "bedding_data")),
+    # Кресло-кровать: текстовые правила дают 2, структурные поля — 3
+    (("Двухместный номер", ["двуспальная кровать", "кресло-кровать"], ["double", "chair-bed"], []), (3, "bedding_data")),
+    (("Двухместный номер", ["двуспальная кровать", "кресло-кровать"], ["double"], []), (3, "bedding_data")),
+    (("Стандарт", [], ["sofa-bed"], []), (1, "bedding_data")),
+    # Без структурных данных — текстовые правила
+    (("Трёхместный номер", [], ["nobedding"], []), (3, "text")),
+    (("Стандарт", ["двуспальная кровать", "диван"], None, None), (3, "text")),
+    (("Стандарт", [], ["double"], "не список"), (2, "bedding_data")),
+]
+
+
+@pytest.mark.parametrize("room, expected", STRUCTURED_CASES)
+def test_structured_capacity_and_source(room, expected):
+    assert capacity_utils.compute_room_capacity(*room) == expected
+
+
+def test_chair_bed_differs_from_text_rules():
+    room_name, beds = "Двухместный номер", ["двуспальная кровать", "кресло-кровать"]
+    assert compute_max_capacity(room_name, beds) == 2
+    assert capacity_utils.compute_room_capacity(room_name, beds, ["double", "chair-bed"]) == (3, "bedding_data")
+
+
+def test_room_batch_matches_single_calls():
+    rooms = [room for room, _ in STRUCTURED_CASES]
+    assert capacity_utils.compute_room_capacity_batch(rooms) == [expected for _, expected in STRUCTURED_CASES]
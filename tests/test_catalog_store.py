@@ -0,0 +1,23 @@
+from catalog_store import HotelCatalogStore
+
+HOTEL = {"ota_hotel_id": "angara_hotel", "master_id": "1", "name": "Ангара", "rooms_number": "10"}
+
+
+def test_database_rebuilt_from_csv_exports(tmp_path):
+    store = HotelCatalogStore(db_path=tmp_path / "hotels.sqlite", csv_path=tmp_path / "hotels.csv")
+    store.upsert([HOTEL], "2026-05-19")
+    store.upsert([{**HOTEL, "rooms_number": "12"}, {"ota_hotel_id": "baikal", "name": "Байкал"}], "2026-05-20")
+    store.export_csv()
+    changes = store.changes()
+    csv_bytes = store.csv_path.read_bytes()
+    changes_bytes = store.changes_csv_path.read_bytes()
+
+    store.db_path.unlink()
+    rebuilt = HotelCatalogStore(db_path=tmp_path / "hotels.sqlite", csv_path=tmp_path / "hotels.csv")
+    assert rebuilt.changes() == changes == [{
+        "ota_hotel_id": "angara_hotel", "field": "rooms_number", "old_value": "10", "new_value": "12",
+        "changed_date": "2026-05-20",
+    }]
+    rebuilt.export_csv()
+    assert rebuilt.csv_path.read_bytes() == csv_bytes
+    assert rebuilt.changes_csv_path.read_bytes() == changes_bytes
@@ -0,0 +1,43 @@
+from datetime import date
+
+from checkpoint_journal import CheckpointJournal
+
+RUN_DATE = date(2026, 5, 20)
+
+
+def test_append_and_load(tmp_path):
+    journal = CheckpointJournal("rooms", RUN_DATE, directory=tmp_path)
+    journal.append("a", rows=[{"x": 1}])
+    journal.append("b", rows=[])
+    entries = CheckpointJournal("rooms", RUN_DATE, directory=tmp_path).load()
+    assert entries["a"]["rows"] == [{"x": 1}]
+    assert entries["b"]["rows"] == []
+
+
+def test_append_after_torn_line(tmp_path):
+    journal = CheckpointJournal("rooms", RUN_DATE, directory=tmp_path)
+    journal.append("a", rows=[1])
+    with open(journal.path, "a", encoding="utf-8") as f:
+        f.write('{"key": "torn", "rows": [')
+
+    resumed = CheckpointJournal("rooms", RUN_DATE, directory=tmp_path)
+    resumed.append("b", rows=[2])
+    entries = CheckpointJournal("rooms", RUN_DATE, directory=tmp_path).load()
+    assert set(entries) == {"a", "b"}
+    assert entries["b"]["rows"] == [2]
+    assert journal.path.read_text(encoding="utf-8").endswith("\n")
+
+
+def test_load_truncates_torn_line(tmp_path):
+    journal = CheckpointJournal("rooms", RUN_DATE, directory=tmp_path)
+    journal.path.write_text('{"key": "a"}\n{"key": "b", "ro', encoding="utf-8")
+    assert set(journal.load()) == {"a"}
+    journal.append("c")
+    assert set(CheckpointJournal("rooms", RUN_DATE, directory=tmp_path).load()) == {"a", "c"}
+
+
+def test_torn_only_line(tmp_path):
+    journal = CheckpointJournal("rooms", RUN_DATE, directory=tmp_path)
+    journal.path.write_text('{"key": "a"', encoding="utf-8")
+    journal.append("b")
+    assert set(CheckpointJournal("rooms", RUN_DATE, directory=tmp_path).load()) == {"b"}
@@ -0,0 +1,101 @@
+import csv
+from datetime import date
+from decimal import Decimal
+
+import pytest
+
+pa = pytest.importorskip("pyarrow")
+
+import history_store  # noqa: E402
+
+ROOMS_ROW = {
+    "ota_hotel_id": "angara_hotel",
+    "master_id": "7965294",
+    "room_name": "Двухместный номер",
+    "rg_hash": "3602302",
+    "count_rg_hash": "2",
+    "allotment": "10",
+    "bedding_type": "двуспальная кровать",
+    "beds": '["двуспальная кровать"]',
+    "bedding_data": '["double"]',
+    "multi_bed_data": '[{"bed": "double", "count": 1}]',
+    "capacity": "2",
+    "capacity_source": "structured",
+    "price_rub_min": "8000.5",
+    "price_rub_max": "9100.00",
+    "url": "https://ostrovok.ru/hotel/x",
+}
+STUB_ROW = {**{key: "" for key in ROOMS_ROW}, "ota_hotel_id": "empty_hotel", "master_id": "1"}
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(history_store, "HISTORY_DIR", tmp_path / "history")
+    monkeypatch.setattr(history_store, "DAILY_DIR", tmp_path / "daily")
+    monkeypatch.delenv("HISTORY_STORE", raising=False)
+    return tmp_path
+
+
+def _write_csv(path, rows):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8-sig", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def test_write_day_types_round_trip(store):
+    assert history_store.write_day("rooms", date(2026, 5, 20), [ROOMS_ROW, STUB_ROW]) == 2
+    rows = history_store.query("rooms").to_pylist()
+    full, stub = sorted(rows, key=lambda row: row["ota_hotel_id"])
+    assert full["date"] == date(2026, 5, 20)
+    assert full["allotment"] == 10 and full["capacity"] == 2
+    assert full["price_rub_min"] == Decimal("8000.50")
+    assert full["beds"] == ["двуспальная кровать"]
+    assert full["multi_bed_data"] == [{"bed": "double", "count": 1}]
+    assert stub["rg_hash"] == "" and stub["allotment"] is None and stub["price_rub_min"] is None
+    assert stub["beds"] is None
+
+
+def test_hive_partitions_and_date_filter(store):
+    for day in (date(2026, 5, 18), date(2026, 5, 19), date(2026, 5, 20)):
+        history_store.write_day("rooms", day, [ROOMS_ROW])
+    assert history_store.partition_path("rooms", date(2026, 5, 19)).parent.name == "date=2026-05-19"
+    table = history_store.query("rooms", start=date(2026, 5, 19), end=date(2026, 5, 19), columns=["date", "allotment"])
+    assert table.to_pylist() == [{"date": date(2026, 5, 19), "allotment": 10}]
+
+
+def test_backfill_rerun_is_idempotent(store):
+    daily = store / "daily" / "rooms"
+    _write_csv(daily / "2026-05-19.csv", [ROOMS_ROW])
+    _write_csv(daily / "2026-05-20.csv", [ROOMS_ROW, STUB_ROW])
+    assert history_store.backfill(["rooms"]) == 2
+    assert history_store.backfill(["rooms"]) == 0
+
+    # Прерванный импорт: нет одной партиции — дописывается только она
+    history_store.partition_path("rooms", date(2026, 5, 19)).unlink()
+    assert history_store.backfill(["rooms"]) == 1
+    # Изменившийся CSV перезаписывает свою партицию
+    _write_csv(daily / "2026-05-20.csv", [ROOMS_ROW])
+    assert history_store.backfill(["rooms"]) == 1
+    assert history_store.query("rooms", start=date(2026, 5, 20)).num_rows == 1
+    assert history_store.backfill(["rooms"], force=True) == 2
+
+
+def test_backfill_replaces_partition_written_by_parser(store):
+    _write_csv(store / "daily" / "rooms" / "2026-05-20.csv", [ROOMS_ROW])
+    history_store.write_day("rooms", date(2026, 5, 20), [ROOMS_ROW])
+    assert history_store.backfill(["rooms"]) == 1
+    assert history_store.backfill(["rooms"]) == 0
+
+
+def test_backfill_counts_only_written_days(store, monkeypatch):
+    daily = store / "daily" / "rooms"
+    _write_csv(daily / "2026-05-19.csv", [ROOMS_ROW])
+    _write_csv(daily / "2026-05-20.csv", [ROOMS_ROW])
+    write_day = history_store.write_day
+    monkeypatch.setattr(
+        history_store, "write_day",
+        lambda kind, day, rows, metadata=None: 0 if day == date(2026, 5, 20) else write_day(kind, day, rows, metadata),
+    )
+    assert history_store.backfill(["rooms"]) == 1
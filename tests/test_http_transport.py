@@ -0,0 +1,44 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from http_transport import PooledTransport
+
+
+class _EchoHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        data = json.dumps({"body": json.loads(body), "cookie": self.headers.get("Cookie")}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _EchoHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/search"
+    server.shutdown()
+    server.server_close()
+
+
+def test_requests_reuse_one_keep_alive_connection(server_url):
+    transport = PooledTransport(pool_size=2)
+    transport.set_cookies({"session": "abc"})
+    responses = [transport.post(server_url, json={"hotel": index}) for index in range(5)]
+
+    assert [response.json()["body"]["hotel"] for response in responses] == list(range(5))
+    assert {response.json()["cookie"] for response in responses} == {"session=abc"}
+    assert transport.stats.requests == 5
+    assert transport.stats.new_connections == 1
@@ -0,0 +1,83 @@
+import json
+
+import pytest
+
+import json_decode
+from json_decode import HotelPageResponse, JsonDecoder
+
+PAGE = {
+    "ota_hotel_id": "angara_hotel",
+    "master_id": 7965294,
+    "rates": [{
+        "payment_options": {"payment_types": [{"amount": "8000", "show_amount": "8000", "currency": "RUB"}]},
+        "rooms": [{
+            "rg_hash": "3602302",
+            "room_name": "Двухместный номер",
+            "allotment": 3,
+            "bedding_data": ["double"],
+            "multi_bed_data": [{"bed": "double", "count": 1}],
+            "room_data_trans": {"ru": {"bedding_type": "двуспальная кровать", "beds": ["двуспальная кровать"]}},
+            "amenities": ["wifi"],
+        }],
+        "cancellation_info": {"free_before": None},
+    }],
+    "hotel_info": {"stars": 4},
+}
+# Поля, которые читает разбор номеров (схема HotelPageResponse)
+EXPECTED = {
+    "ota_hotel_id": "angara_hotel",
+    "master_id": 7965294,
+    "rates": [{
+        "payment_options": {"payment_types": [{"amount": "8000", "show_amount": "8000"}]},
+        "rooms": [{key: value for key, value in PAGE["rates"][0]["rooms"][0].items() if key != "amenities"}],
+    }],
+}
+BACKENDS = [
+    name for name, module in (("json", json), ("orjson", json_decode.orjson), ("msgspec", json_decode.msgspec))
+    if module is not None
+]
+
+
+def _decoded_fields(value):
+    """Ответ без полей вне схемы: результат бэкендов без схемы сравнивается с типизированным."""
+    return {
+        "ota_hotel_id": value["ota_hotel_id"],
+        "master_id": value["master_id"],
+        "rates": [{
+            "payment_options": {"payment_types": [
+                {key: payment[key] for key in ("amount", "show_amount")}
+                for payment in rate["payment_options"]["payment_types"]
+            ]},
+            "rooms": [{key: room[key] for key in EXPECTED["rates"][0]["rooms"][0]} for room in rate["rooms"]],
+        } for rate in value["rates"]],
+    }
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_hotel_page_decodes_fields_read_by_parser(backend):
+    decoder = JsonDecoder(HotelPageResponse, backend=backend)
+    assert decoder.backend == backend
+    decoded = decoder.decode(json.dumps(PAGE, ensure_ascii=False).encode("utf-8"))
+    assert _decoded_fields(decoded) == EXPECTED
+    if backend == "msgspec":
+        assert decoded == EXPECTED
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_schema_mismatch_falls_back_to_full_decode(backend):
+    page = {"ota_hotel_id": "x", "rates": "не список"}
+    assert JsonDecoder(HotelPageResponse, backend=backend).decode(json.dumps(page)) == page
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_invalid_json_raises_value_error(backend):
+    with pytest.raises(ValueError):
+        JsonDecoder(HotelPageResponse, backend=backend).decode(b"<html>captcha</html>")
+
+
+def test_unavailable_backend_is_picked_automatically(monkeypatch):
+    monkeypatch.setattr(json_decode, "orjson", None)
+    monkeypatch.setattr(json_decode, "msgspec", None)
+    assert JsonDecoder(backend="orjson").backend == "json"
+    monkeypatch.setenv("JSON_DECODER", "msgspec")
+    assert JsonDecoder(HotelPageResponse).backend == "json"
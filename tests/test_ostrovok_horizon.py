@@ -0,0 +1,52 @@
+import csv
+from datetime import date
+
+from ostrovok_horizon import HORIZON_STATISTICS_FIELDNAMES, HorizonCrawler, arrival_dates, build_request_matrix
+from test_ostrovok_rooms import _hotel_page, _hotels, _parser
+
+RUN_DATE = date(2026, 5, 20)
+
+
+def _read_csv(path):
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        reader = csv.DictReader(f)
+        return reader.fieldnames, list(reader)
+
+
+def test_request_matrix_finishes_dates_in_order():
+    arrivals = arrival_dates(RUN_DATE, 2)
+    assert arrivals == [date(2026, 5, 21), date(2026, 5, 22)]
+    matrix = build_request_matrix(["a", "b"], arrivals)
+    assert [(arrival.day, index) for arrival, index, _ in matrix] == [(21, 0), (21, 1), (22, 0), (22, 1)]
+
+
+def test_horizon_writes_rooms_and_statistics_per_arrival(tmp_path, monkeypatch):
+    requests = []
+
+    def page(hotel_id, price):
+        def respond(payload):
+            requests.append((payload["hotel"], payload["arrival_date"], payload["departure_date"]))
+            # Цена зависит от даты заезда: строки разных дат не перепутаны
+            return _hotel_page(hotel_id, ("a", price + int(payload["arrival_date"][-2:])))
+        return respond
+
+    parser = _parser(tmp_path, monkeypatch, {"h1": page("h1", 5000), "h2": page("h2", 3000)})
+    crawler = HorizonCrawler(days=2, nights=2, target_rpm=6000, parser=parser)
+    hotels = [{**hotel, "name": hotel["ota_hotel_id"], "rooms_number": "4"} for hotel in _hotels("h1", "h2")]
+    assert crawler.run(RUN_DATE, hotels=hotels) == 2
+
+    assert sorted(requests) == [
+        ("h1", "2026-05-21", "2026-05-23"), ("h1", "2026-05-22", "2026-05-24"),
+        ("h2", "2026-05-21", "2026-05-23"), ("h2", "2026-05-22", "2026-05-24"),
+    ]
+    assert crawler.rows_written == 4
+    output = parser.daily_dir / "horizon" / RUN_DATE.isoformat()
+    _, rooms = _read_csv(output / "rooms" / "2026-05-22.csv")
+    assert [(row["ota_hotel_id"], row["price_rub_min"]) for row in rooms] == [("h1", "5022"), ("h2", "3022")]
+    fieldnames, statistics = _read_csv(output / "statistics" / "2026-05-21.csv")
+    assert fieldnames == HORIZON_STATISTICS_FIELDNAMES
+    assert [(row["ota_hotel_id"], row["date"], row["arrival_date"], row["free_rooms_amount"], row["min_price"])
+            for row in statistics] == [
+        ("h1", "2026-05-20", "2026-05-21", "2", "5021.00"),
+        ("h2", "2026-05-20", "2026-05-21", "2", "3021.00"),
+    ]
@@ -0,0 +1,69 @@
+import json
+import threading
+import time
+
+from http_transport import TransportStats
+from ostrovok_hotels import OstrovokHotelsDailyParser
+from replay_transport import ReplayResponse
+
+SERP_URL = "https://ostrovok.ru/hotel/search/v2/site/serp?session=offline"
+
+
+def _serp_page(page_number, size):
+    return {"hotels": [
+        {"ota_hotel_id": f"hotel_{page_number}_{index}", "master_id": str(index), "static_vm": {"name": "Отель"}}
+        for index in range(size)
+    ]}
+
+
+class SerpTransport:
+    """Страницы выдачи по номеру; страница 1 отвечает последней, чтобы короткая страница успела раньше."""
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.stats = TransportStats()
+        self.page_one_done = threading.Event()
+        self.requested_before_page_one = []
+
+    def set_cookies(self, cookies):
+        pass
+
+    def post(self, url, json=None, **kwargs):
+        page_number = json["page"]
+        if page_number == 1:
+            time.sleep(0.05)
+        elif not self.page_one_done.is_set():
+            self.requested_before_page_one.append(page_number)
+        page = self.pages.get(page_number)
+        if page_number == 1:
+            self.page_one_done.set()
+        if page is None:
+            return ReplayResponse(404)
+        return ReplayResponse(200, _json_bytes(page))
+
+
+def _json_bytes(value):
+    return json.dumps(value, ensure_ascii=False).encode("utf-8")
+
+
+def _parser(pages, serp_workers=4):
+    transport = SerpTransport(pages)
+    parser = OstrovokHotelsDailyParser(transport=transport, serp_workers=serp_workers)
+    parser._serp_template = {"url": SERP_URL, "headers": {}, "payload": {"page": 1}}
+    return parser, transport
+
+
+def test_page_size_comes_from_page_one_before_other_pages():
+    parser, transport = _parser({1: _serp_page(1, 20), 2: _serp_page(2, 20), 3: _serp_page(3, 7)})
+    assert parser._replay_serp_pages([], start_page=1) is None
+    assert transport.requested_before_page_one == []
+    assert parser._serp_page_size == 20
+    assert len(parser.all_hotels) == 47
+
+
+def test_nested_total_does_not_stop_pagination():
+    pages = {number: {**_serp_page(number, 20), "filters": {"total": 1}, "total": 3} for number in (1, 2, 3, 4)}
+    pages[5] = {"hotels": []}
+    parser, _ = _parser(pages, serp_workers=2)
+    assert parser._replay_serp_pages([], start_page=1) is None
+    assert len(parser.all_hotels) == 80
@@ -0,0 +1,67 @@
+import csv
+from datetime import date
+
+import checkpoint_journal
+from ostrovok_occupancy import OccupancySweep
+from ostrovok_rooms import ROOMS_FIELDNAMES
+
+RUN_DATE = date(2026, 5, 20)
+
+
+class FakeParser:
+    """Ответы API по (отель, взрослые): None — ошибка запроса, список строк — номера."""
+
+    journal_name = "rooms"
+    workers = 1
+
+    def __init__(self, daily_dir, responses):
+        self.daily_dir = daily_dir
+        self.responses = responses
+        self.calls = []
+
+    def _load_cookies(self, probe_hotel_id=None):
+        pass
+
+    def _search_hotel(self, hotel_id, arrival_date, departure_date, adults=1):
+        self.calls.append((hotel_id, adults))
+        rows = self.responses.get((hotel_id, adults), [])
+        return None if rows is None else {"rows": rows}
+
+    def _extract_room_data(self, result):
+        return result["rows"]
+
+
+def _room(hotel_id, price, carried_from=""):
+    return {"ota_hotel_id": hotel_id, "rg_hash": f"{hotel_id}-std", "price_rub_min": price, "carried_from": carried_from}
+
+
+def _write_rooms(daily_dir, rows):
+    path = daily_dir / "rooms" / f"{RUN_DATE.isoformat()}.csv"
+    path.parent.mkdir(parents=True)
+    with open(path, "w", encoding="utf-8-sig", newline="") as csv_file:
+        writer = csv.DictWriter(csv_file, fieldnames=ROOMS_FIELDNAMES)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def test_failed_hotel_is_retried_and_carried_hotel_skipped(tmp_path, monkeypatch):
+    monkeypatch.setattr(checkpoint_journal, "CHECKPOINTS_DIR", tmp_path / "checkpoints")
+    _write_rooms(tmp_path, [_room("angara", "4000"), _room("baikal", "5000"), _room("irkut", "3000", "2026-05-18")])
+    responses = {("angara", 2): [_room("angara", "4500")], ("baikal", 2): None}
+
+    parser = FakeParser(tmp_path, responses)
+    sweep = OccupancySweep(max_adults=2, parser=parser)
+    assert sweep.run(RUN_DATE) == 1
+    assert (sweep.errors, sweep.carried_hotels) == (1, 1)
+    assert all(hotel_id != "irkut" for hotel_id, _ in parser.calls)
+
+    # Повторный запуск: отель с ошибкой запрашивается снова, готовый берётся из журнала
+    responses[("baikal", 2)] = []
+    parser = FakeParser(tmp_path, responses)
+    sweep = OccupancySweep(max_adults=2, parser=parser)
+    assert sweep.run(RUN_DATE) == 2
+    assert parser.calls == [("baikal", 2)]
+    with open(tmp_path / "occupancy" / f"{RUN_DATE.isoformat()}.csv", encoding="utf-8-sig", newline="") as csv_file:
+        max_adults = {row["ota_hotel_id"]: row["max_adults"] for row in csv.DictReader(csv_file)}
+    assert max_adults == {"angara": "2", "baikal": "1"}
+    assert not (tmp_path / "checkpoints" / f"occupancy-{RUN_DATE.isoformat()}.jsonl").exists()
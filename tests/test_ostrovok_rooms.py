@@ -0,0 +1,213 @@
+import csv
+import json
+import threading
+import time
+from datetime import date
+from types import SimpleNamespace
+from concurrent.futures import ThreadPoolExecutor
+
+import checkpoint_journal
+from http_transport import TransportStats
+from ostrovok_rooms import (
+    DEFAULT_PER_HOST_LIMIT,
+    DEFAULT_ROOMS_WORKERS,
+    ROOMS_FIELDNAMES,
+    OstrovokRoomsDailyParser,
+    _HostLimiter,
+)
+from rate_control import RateController
+from replay_transport import ReplayResponse
+
+API_URL = "https://ostrovok.ru/hotel/search/v1/site/hp/search"
+
+
+def _room(rg_hash, name="Стандарт"):
+    return {
+        "rg_hash": rg_hash,
+        "room_name": name,
+        "allotment": 2,
+        "bedding_data": [],
+        "multi_bed_data": [],
+        "room_data_trans": {"ru": {"bedding_type": "double", "beds": []}},
+    }
+
+
+def _hotel_page(hotel_id, *rates):
+    """Ответ hp/search: rates — пары (rg_hash, цена)."""
+    return {
+        "ota_hotel_id": hotel_id,
+        "master_id": f"m-{hotel_id}",
+        "rates": [
+            {"payment_options": {"payment_types": [{"amount": price, "show_amount": price}]}, "rooms": [_room(rg_hash)]}
+            for rg_hash, price in rates
+        ],
+    }
+
+
+class HotelPagesTransport:
+    """Офлайн-транспорт: ответ по hotel из тела запроса. responses[hotel] — страница, функция от тела запроса
+    или список ответов по попыткам (страница, код статуса или исключение)."""
+
+    offline = True
+
+    def __init__(self, responses):
+        self.responses = responses
+        self.stats = TransportStats()
+        self.session = None
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def set_cookies(self, cookies):
+        pass
+
+    def post(self, url, json=None, **kwargs):
+        hotel = json["hotel"]
+        with self._lock:
+            attempt = sum(1 for called in self.calls if called == hotel)
+            self.calls.append(hotel)
+        response = self.responses[hotel]
+        if isinstance(response, list):
+            response = response[min(attempt, len(response) - 1)]
+        if callable(response):
+            response = response(json)
+        if isinstance(response, Exception):
+            raise response
+        if isinstance(response, int):
+            return ReplayResponse(response)
+        return ReplayResponse(200, _dumps(response))
+
+
+def _dumps(value):
+    return json.dumps(value, ensure_ascii=False).encode("utf-8")
+
+
+def _parser(tmp_path, monkeypatch, responses, workers=2):
+    monkeypatch.setattr(checkpoint_journal, "CHECKPOINTS_DIR", tmp_path / "checkpoints")
+    parser = OstrovokRoomsDailyParser(workers=workers, transport=HotelPagesTransport(responses))
+    parser.daily_dir = tmp_path / "daily"
+    parser.write_history = False
+    parser.rate_controller = RateController(rate=1000, max_rate=1000)
+    return parser
+
+
+def _hotels(*hotel_ids):
+    return [{"ota_hotel_id": hotel_id, "url": f"https://ostrovok.ru/hotel/russia/irkutsk/{hotel_id}/"} for hotel_id in hotel_ids]
+
+
+def _read_csv(path):
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        reader = csv.DictReader(f)
+        return reader.fieldnames, list(reader)
+
+
+def test_host_limiter_caps_requests_below_workers():
+    assert DEFAULT_PER_HOST_LIMIT < DEFAULT_ROOMS_WORKERS
+    limiter = _HostLimiter(DEFAULT_PER_HOST_LIMIT)
+    lock = threading.Lock()
+    state = {"active": 0, "peak": 0}
+
+    def request(_):
+        with limiter.slot(API_URL):
+            with lock:
+                state["active"] += 1
+                state["peak"] = max(state["peak"], state["active"])
+            time.sleep(0.01)
+            with lock:
+                state["active"] -= 1
+
+    with ThreadPoolExecutor(max_workers=DEFAULT_ROOMS_WORKERS) as executor:
+        list(executor.map(request, range(4 * DEFAULT_ROOMS_WORKERS)))
+    assert state["peak"] == DEFAULT_PER_HOST_LIMIT
+
+
+def test_stream_writes_same_csv_as_batch(tmp_path, monkeypatch):
+    responses = {
+        "h1": _hotel_page("h1", ("a", 5000), ("a", 6000), ("b", 7000)),
+        "h2": _hotel_page("h2", ("c", 3000)),
+        "h3": _hotel_page("h3", ("d", 4000), ("e", 4500)),
+    }
+    hotels = _hotels("h1", "h2", "h3")
+
+    batch = _parser(tmp_path / "batch", monkeypatch, responses)
+    batch_rows = batch.get_all_rooms(hotels=hotels)
+    streamed = _parser(tmp_path / "stream", monkeypatch, responses)
+    assert streamed.get_all_rooms(hotels=hotels, stream=True) == []
+
+    assert streamed.rooms_count == batch.rooms_count == len(batch_rows) == 5
+    fieldnames, rows = _read_csv(streamed._output_csv_path())
+    assert fieldnames == ROOMS_FIELDNAMES
+    assert [(row["ota_hotel_id"], row["rg_hash"]) for row in rows] == [
+        ("h1", "a"), ("h1", "b"), ("h2", "c"), ("h3", "d"), ("h3", "e"),
+    ]
+    assert _read_csv(streamed._output_csv_path()) == _read_csv(batch._output_csv_path())
+
+
+def _search(tmp_path, monkeypatch, responses, max_retries=2):
+    parser = _parser(tmp_path, monkeypatch, responses, workers=1)
+    parser.rate_controller = RateController(rate=1000, max_rate=1000, max_retries=max_retries)
+    parser.cookies = {}
+    sleeps = []
+    # Подменяется только time модуля парсера: ограничитель скорости ждёт по настоящим часам
+    monkeypatch.setattr("ostrovok_rooms.time", SimpleNamespace(perf_counter=time.perf_counter, sleep=sleeps.append))
+    refreshes = []
+    monkeypatch.setattr(parser, "_refresh_cookies", refreshes.append)
+    return parser, sleeps, refreshes
+
+
+def test_no_backoff_after_last_attempt(tmp_path, monkeypatch):
+    parser, sleeps, _ = _search(tmp_path, monkeypatch, {"h1": [503, ConnectionError("reset"), 503]})
+    assert parser._search_hotel("h1", date(2026, 10, 18), date(2026, 10, 19)) is None
+    assert parser.transport.calls == ["h1"] * 3
+    assert len(sleeps) == 2
+    assert parser.rate_controller.retries == 2
+
+
+def test_cookie_refresh_on_last_attempt_gets_extra_request(tmp_path, monkeypatch):
+    page = _hotel_page("h1", ("a", 5000))
+    parser, sleeps, refreshes = _search(tmp_path, monkeypatch, {"h1": [503, 503, 403, page]})
+    assert parser._search_hotel("h1", date(2026, 10, 18), date(2026, 10, 19)) == page
+    assert parser.transport.calls == ["h1"] * 4
+    assert len(refreshes) == 1
+    assert len(sleeps) == parser.rate_controller.retries == 2
+
+
+def test_extract_groups_rates_by_rg_hash(tmp_path, monkeypatch):
+    parser = _parser(tmp_path, monkeypatch, {})
+    room = {**_room("a", "Двухместный номер"), "bedding_data": ["double", "chair-bed"],
+            "multi_bed_data": [{"bed": "double", "count": 1}]}
+    page = {
+        "ota_hotel_id": "h1",
+        "master_id": 7,
+        "rates": [
+            {"payment_options": {"payment_types": [{"amount": "6000"}]}, "rooms": [room]},
+            {"payment_options": {"payment_types": [{"show_amount": "5000.50"}]}, "rooms": [room, _room("b")]},
+            # Цена не число сравнивается как бесконечность (как до однопроходного разбора) и становится максимумом
+            {"payment_options": {"payment_types": [{"amount": "нет"}]}, "rooms": [room]},
+            {"payment_options": {"payment_types": [{"amount": "7000"}]}, "rooms": [room, {"room_name": "без rg_hash"}]},
+            {"payment_options": {"payment_types": [{"amount": "1"}]}, "rooms": []},
+        ],
+    }
+    url = f"{parser.region.search_url}mid7/h1"
+    assert parser._extract_room_data(page) == [
+        {
+            "ota_hotel_id": "h1", "master_id": "7", "room_name": "Двухместный номер", "rg_hash": "a",
+            "count_rg_hash": "4", "allotment": "2", "bedding_type": "double", "beds": "",
+            "bedding_data": '["double", "chair-bed"]', "multi_bed_data": '[{"bed": "double", "count": 1}]',
+            "capacity": "3", "capacity_source": "multi_bed_data",
+            "price_rub_min": "5000.50", "price_rub_max": "нет", "url": url,
+        },
+        {
+            "ota_hotel_id": "h1", "master_id": "7", "room_name": "Стандарт", "rg_hash": "b",
+            "count_rg_hash": "1", "allotment": "2", "bedding_type": "double", "beds": "",
+            "bedding_data": "", "multi_bed_data": "", "capacity": "1", "capacity_source": "text",
+            "price_rub_min": "5000.50", "price_rub_max": "5000.50", "url": url,
+        },
+    ]
+
+
+def test_extract_without_rates_keeps_hotel_stub(tmp_path, monkeypatch):
+    parser = _parser(tmp_path, monkeypatch, {})
+    rows = parser._extract_room_data({"ota_hotel_id": "h1", "master_id": "7", "rates": []})
+    assert len(rows) == 1
+    assert list(rows[0]) == ROOMS_FIELDNAMES[:len(rows[0])]
+    assert rows[0]["count_rg_hash"] == "0" and rows[0]["rg_hash"] == "" and rows[0]["capacity"] == ""
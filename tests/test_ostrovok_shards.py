@@ -0,0 +1,70 @@
+from datetime import date
+
+import ostrovok_shards
+from ostrovok_rooms import ROOMS_FIELDNAMES
+from ostrovok_shards import HOTELS_FIELDNAMES, hotel_shard_key, shard_of
+
+RUN_DATE = date(2026, 5, 20)
+REGION = "irkutsk"
+HOTELS = [{**{name: "" for name in HOTELS_FIELDNAMES}, "ota_hotel_id": f"hotel_{n}"} for n in range(12)]
+
+
+def test_shard_of_is_stable_and_covers_all_shards():
+    # crc32, а не hash(): одинаково в любом процессе и при любом PYTHONHASHSEED
+    assert shard_of("irkutsk|hotel_0", 4) == shard_of("irkutsk|hotel_0", 4)
+    assert [shard_of(hotel_shard_key(REGION, hotel), 3) for hotel in HOTELS[:4]] == [
+        shard_of(f"irkutsk|hotel_{n}", 3) for n in range(4)
+    ]
+    shards = {shard_of(hotel_shard_key(REGION, hotel), 3) for hotel in HOTELS}
+    assert shards == {0, 1, 2}
+
+
+def test_merge_keeps_serp_hotel_order(tmp_path, monkeypatch):
+    saved = {}
+
+    class HotelsParser:
+        write_history = True
+
+        def __init__(self, region):
+            self.daily_dir = tmp_path / "daily"
+
+        def _save_to_csv(self, run_date):
+            saved["hotels"] = list(self.all_hotels)
+
+    class RoomsParser:
+        def __init__(self, region):
+            pass
+
+        def _save_to_csv(self, rows, run_date):
+            saved["rooms"] = rows
+
+    class Catalog:
+        def update(self, hotels):
+            saved["catalog"] = hotels
+
+    monkeypatch.setattr(ostrovok_shards, "OstrovokHotelsDailyParser", HotelsParser)
+    monkeypatch.setattr(ostrovok_shards, "OstrovokRoomsDailyParser", RoomsParser)
+    monkeypatch.setattr(ostrovok_shards, "OstrovokHotelsCatalog", Catalog)
+    monkeypatch.setattr(ostrovok_shards, "generate_statistics", lambda run_date, hotels, rooms, daily_dir: len(hotels))
+    monkeypatch.setattr(ostrovok_shards, "record_statistics_manifest", lambda dates: None)
+
+    day_dir = tmp_path / "shards" / RUN_DATE.isoformat()
+    ostrovok_shards._write_csv(day_dir / "hotels" / f"{REGION}.csv", HOTELS_FIELDNAMES, HOTELS)
+    shard_count = 3
+    for shard in range(shard_count):
+        rows = [
+            {**{name: "" for name in ROOMS_FIELDNAMES}, "ota_hotel_id": hotel["ota_hotel_id"], "rg_hash": rg_hash}
+            # Внутри шарда отели в обратном порядке: порядок задаёт только список выдачи
+            for hotel in reversed(HOTELS) if shard_of(hotel_shard_key(REGION, hotel), shard_count) == shard
+            for rg_hash in ("a", "b")
+        ]
+        ostrovok_shards._write_csv(
+            day_dir / "rooms" / REGION / f"{shard:03d}-of-{shard_count:03d}.csv", ROOMS_FIELDNAMES, rows,
+        )
+
+    results = ostrovok_shards.merge(RUN_DATE, [REGION], directory=tmp_path / "shards")
+    assert results == {REGION: (12, 24, 12)}
+    assert [(row["ota_hotel_id"], row["rg_hash"]) for row in saved["rooms"]] == [
+        (hotel["ota_hotel_id"], rg_hash) for hotel in HOTELS for rg_hash in ("a", "b")
+    ]
+    assert [hotel["ota_hotel_id"] for hotel in saved["catalog"]] == [hotel["ota_hotel_id"] for hotel in HOTELS]
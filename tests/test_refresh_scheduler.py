@@ -0,0 +1,36 @@
+import csv
+from datetime import date
+
+from ostrovok_rooms import ROOMS_FIELDNAMES
+from refresh_scheduler import RefreshPlan, RefreshScheduler
+
+
+def _room(hotel_id, price, carried_from=""):
+    return {
+        "ota_hotel_id": hotel_id, "rg_hash": f"{hotel_id}-std", "allotment": "2",
+        "price_rub_min": price, "price_rub_max": price, "carried_from": carried_from,
+    }
+
+
+def _write_rooms(daily_dir, day, rows):
+    path = daily_dir / "rooms" / f"{day.isoformat()}.csv"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8-sig", newline="") as csv_file:
+        writer = csv.DictWriter(csv_file, fieldnames=ROOMS_FIELDNAMES)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def test_carried_rows_are_marked_and_not_scored(tmp_path):
+    scheduler = RefreshScheduler(daily_dir=tmp_path, history_days=14)
+    _write_rooms(tmp_path, date(2026, 5, 18), [_room("angara", "4000")])
+    # Строка перенесена без запроса, хотя в ней другая цена: наблюдением она не считается
+    _write_rooms(tmp_path, date(2026, 5, 19), [_room("angara", "9000", carried_from="2026-05-18")])
+
+    scores = scheduler.scores(date(2026, 5, 20))
+    assert scores["angara"].days == 1
+
+    plan = RefreshPlan(refresh=[], carried=[{"ota_hotel_id": "angara"}], scores=scores)
+    rows, observed = scheduler.carried_rows(plan, date(2026, 5, 20))
+    assert observed == {"angara": "2026-05-18"}
+    assert [row["carried_from"] for row in rows] == ["2026-05-18"]
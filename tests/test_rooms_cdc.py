@@ -0,0 +1,106 @@
+import csv
+from datetime import date, timedelta
+
+from ostrovok_rooms import ROOMS_FIELDNAMES
+from refresh_scheduler import RefreshScheduler
+from rooms_cdc import RoomsCDC, apply_delta, diff_snapshots
+
+START = date(2026, 5, 15)
+
+
+def _room(hotel_id, rg_hash="", price="", room_name=""):
+    return {"ota_hotel_id": hotel_id, "rg_hash": rg_hash, "room_name": room_name, "price_rub_min": price}
+
+
+def _write_rooms(daily_dir, day, rows, fieldnames=ROOMS_FIELDNAMES):
+    path = daily_dir / "rooms" / f"{day.isoformat()}.csv"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8-sig", newline="") as csv_file:
+        writer = csv.DictWriter(csv_file, fieldnames=fieldnames, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(rows)
+    return path
+
+
+def _snapshots():
+    """Снимки по дням: у отеля angara несколько строк-заглушек с пустым rg_hash, их число и порядок меняются."""
+    return [
+        [_room("angara", room_name="a"), _room("angara", room_name="b"), _room("baikal", "std", "4000")],
+        [_room("baikal", "std", "4200"), _room("angara", room_name="b"), _room("angara", room_name="a"),
+         _room("angara", room_name="c")],
+        [_room("angara", room_name="c"), _room("baikal", "std", "4200"), _room("baikal", "lux", "9000")],
+        [_room("angara", room_name="c"), _room("angara", room_name="c"), _room("baikal", "lux", "9500")],
+    ]
+
+
+def _full(row):
+    return {field: row.get(field, "") for field in ROOMS_FIELDNAMES}
+
+
+def test_duplicate_empty_rg_hash_rows_round_trip():
+    snapshots = [[_full(row) for row in rows] for rows in _snapshots()]
+    for previous_rows, rows in zip(snapshots, snapshots[1:]):
+        records = diff_snapshots(previous_rows, ROOMS_FIELDNAMES, rows)
+        assert apply_delta(previous_rows, records) == (ROOMS_FIELDNAMES, rows)
+
+
+def test_compacted_snapshots_are_rebuilt_for_readers(tmp_path):
+    originals = {}
+    for offset, rows in enumerate(_snapshots()):
+        day = START + timedelta(days=offset)
+        originals[day] = _write_rooms(tmp_path, day, rows).read_bytes()
+    cdc = RoomsCDC(daily_dir=tmp_path)
+    assert cdc.diff_all() == 4
+
+    removed = RoomsCDC(daily_dir=tmp_path).compact(keep_recent=1, base_every=10)
+    assert removed == [START + timedelta(days=1), START + timedelta(days=2)]
+    cdc = RoomsCDC(daily_dir=tmp_path)
+    for day, data in originals.items():
+        assert cdc.rebuild(day, tmp_path / "rebuilt.csv").read_bytes() == data
+    assert RefreshScheduler(daily_dir=tmp_path)._history_days(START + timedelta(days=4)) == sorted(originals)
+
+
+def test_unsupported_snapshot_is_kept_as_full_snapshot(tmp_path):
+    _write_rooms(tmp_path, START, _snapshots()[0])
+    _write_rooms(tmp_path, START + timedelta(days=1), _snapshots()[1], ROOMS_FIELDNAMES + ["extra"])
+    _write_rooms(tmp_path, START + timedelta(days=2), _snapshots()[2])
+    cdc = RoomsCDC(daily_dir=tmp_path)
+    assert cdc.diff_all() == 3
+
+    entry = cdc.manifest.get(START + timedelta(days=1))
+    assert entry["base"] and entry["previous"] is None
+    assert not (tmp_path / "rooms_cdc" / f"{START + timedelta(days=1)}.csv").exists()
+    assert cdc.manifest.get(START + timedelta(days=2))["previous"] == (START + timedelta(days=1)).isoformat()
+    assert RoomsCDC(daily_dir=tmp_path).compact(keep_recent=0, base_every=10) == [START + timedelta(days=2)]
+
+
+def test_daily_diff_keeps_full_snapshots_only_on_base_days(tmp_path):
+    originals = {}
+    for offset in range(7):
+        day = START + timedelta(days=offset)
+        originals[day] = _write_rooms(tmp_path, day, _snapshots()[offset % 4]).read_bytes()
+        # Как в CI: после прогона за день считаются изменения, полный снимок остаётся только у базы
+        RoomsCDC(daily_dir=tmp_path).diff(day, base_every=3)
+
+    kept = sorted(path.stem for path in (tmp_path / "rooms").glob("*.csv"))
+    assert kept == [(START + timedelta(days=offset)).isoformat() for offset in (0, 3, 6)]
+    assert len(list((tmp_path / "rooms_cdc").glob("*.csv"))) == 6
+    cdc = RoomsCDC(daily_dir=tmp_path)
+    assert cdc.dates() == sorted(originals)
+    for day, data in originals.items():
+        assert cdc.rebuild(day, tmp_path / "rebuilt.csv").read_bytes() == data
+        assert cdc.sha256(day) == cdc.manifest.get(day)["sha256"]
+    assert cdc.diff_all(base_every=3) == 3
+    assert sorted(path.stem for path in (tmp_path / "rooms").glob("*.csv")) == kept
+
+
+def test_existing_full_history_is_reduced_to_bases(tmp_path):
+    for offset in range(5):
+        _write_rooms(tmp_path, START + timedelta(days=offset), _snapshots()[offset % 4])
+    assert RoomsCDC(daily_dir=tmp_path).diff_all() == 5
+    assert len(list((tmp_path / "rooms").glob("*.csv"))) == 5
+    # Без base_every ничего не удаляется; с ним актуальные изменения не пересчитываются, лишние снимки удаляются
+    assert RoomsCDC(daily_dir=tmp_path).diff_all(base_every=2) == 5
+    assert sorted(path.stem for path in (tmp_path / "rooms").glob("*.csv")) == [
+        (START + timedelta(days=offset)).isoformat() for offset in (0, 2, 4)
+    ]
@@ -0,0 +1,57 @@
+import json
+from datetime import date
+
+from http_transport import TransportStats
+from run_metrics import RunMetrics, latency_summary
+
+
+def test_latency_summary_percentiles_and_histogram():
+    summary = latency_summary([0.01 * n for n in range(1, 101)] + [12.0])
+    assert summary["count"] == 101
+    assert summary["p50"] == 0.51 and summary["p95"] == 0.96 and summary["max"] == 12.0
+    assert summary["histogram"]["<=0.05"] == 5
+    assert summary["histogram"][">10"] == 1
+    assert sum(summary["histogram"].values()) == 101
+    assert latency_summary([])["p50"] is None
+
+
+def test_stage_counters_and_transport_in_report():
+    metrics = RunMetrics()
+
+    @metrics.timed("rooms")
+    @metrics.observed("rooms", "search_hotel")
+    def search():
+        return "ok"
+
+    assert search() == "ok" and search() == "ok"
+    metrics.count("rooms", "retries", 2)
+    metrics.count("rooms", "retries")
+    stats = TransportStats()
+    stats.begin_request()
+    stats.end_request(0.2, 0.3, 1024)
+    metrics.add_transport("rooms", stats)
+
+    rooms = metrics.report()["stages"]["rooms"]
+    assert rooms["retries"] == 3
+    assert rooms["requests"] == 1 and rooms["bytes_received"] == 1024
+    assert rooms["latency"]["search_hotel"]["count"] == 2
+    assert rooms["latency"]["request"]["max"] == 0.3
+    assert metrics.summary().startswith("Метрики: rooms ")
+    assert "повторов 3" in metrics.summary()
+
+
+def test_save_keeps_other_runs(tmp_path):
+    first = RunMetrics()
+    first.count("hotels", "rows", 176)
+    first.save(date(2026, 5, 20), run="pipeline", directory=tmp_path)
+    second = RunMetrics()
+    second.count("statistics_range", "days", 3)
+    second.save(date(2026, 5, 20), run="statistics", directory=tmp_path)
+    second.count("statistics_range", "days", 1)
+    second.save(date(2026, 5, 20), run="statistics", directory=tmp_path)
+
+    reports = json.loads((tmp_path / "2026-05-20.json").read_text(encoding="utf-8"))
+    assert set(reports) == {"pipeline", "statistics"}
+    assert reports["pipeline"]["stages"]["hotels"]["rows"] == 176
+    assert reports["statistics"]["stages"]["statistics_range"]["days"] == 4
+    assert not list(tmp_path.glob("*.tmp"))
@@ -0,0 +1,97 @@
+import csv
+import os
+from datetime import date, timedelta
+
+import fingerprint_manifest
+import ostrovok_statistic
+from fingerprint_manifest import FingerprintManifest
+
+DAY = date(2026, 5, 20)
+STATISTICS = [{
+    "ota_hotel_id": "angara_hotel", "name": "Ангара", "date": "2026-05-20", "rooms_num": 10,
+    "free_rooms_amount": 3, "max_capacity": 6, "available_rooms_percent": 30.0, "min_price": "4500",
+}]
+
+
+def _daily_dir(tmp_path, monkeypatch):
+    daily_dir = tmp_path / "daily"
+    for kind in ("hotels", "rooms"):
+        (daily_dir / kind).mkdir(parents=True)
+        (daily_dir / kind / f"{DAY.isoformat()}.csv").write_text(f"{kind}\n", encoding="utf-8")
+    monkeypatch.setattr(ostrovok_statistic, "DAILY_DIR", daily_dir)
+    return daily_dir
+
+
+def test_manifest_entry_only_matches_its_capacity_mode(tmp_path, monkeypatch):
+    daily_dir = _daily_dir(tmp_path, monkeypatch)
+    output_csv = daily_dir / "statistics" / f"{DAY.isoformat()}.csv"
+    ostrovok_statistic._save_statistics(output_csv, DAY, STATISTICS, history=False)
+    manifest = FingerprintManifest("statistics", directory=tmp_path / "manifests")
+    ostrovok_statistic.record_statistics_manifest([DAY], recompute_capacity=False, manifest=manifest)
+
+    entry = manifest.get(DAY)
+    inputs = ostrovok_statistic._statistics_inputs(DAY)
+    assert entry["recompute_capacity"] is False
+    assert ostrovok_statistic._is_current(entry, inputs, DAY, recompute_capacity=False)
+    assert not ostrovok_statistic._is_current(entry, inputs, DAY, recompute_capacity=True)
+
+    ostrovok_statistic.record_statistics_manifest([DAY], recompute_capacity=True, manifest=manifest)
+    entry = manifest.get(DAY)
+    assert ostrovok_statistic._is_current(entry, inputs, DAY, recompute_capacity=True)
+    assert not ostrovok_statistic._is_current(entry, inputs, DAY, recompute_capacity=False)
+
+
+def test_save_keeps_line_endings_and_skips_identical_content(tmp_path, monkeypatch):
+    daily_dir = _daily_dir(tmp_path, monkeypatch)
+    output_csv = daily_dir / "statistics" / f"{DAY.isoformat()}.csv"
+    ostrovok_statistic._save_statistics(output_csv, DAY, STATISTICS, history=False)
+    assert b"\r\n" in output_csv.read_bytes()
+
+    lf_bytes = ostrovok_statistic._statistics_bytes(STATISTICS, "\n")
+    output_csv.write_bytes(lf_bytes)
+    mtime_ns = output_csv.stat().st_mtime_ns - 10**9
+    os.utime(output_csv, ns=(mtime_ns, mtime_ns))
+    ostrovok_statistic._save_statistics(output_csv, DAY, STATISTICS, history=False)
+    assert output_csv.read_bytes() == lf_bytes
+    assert output_csv.stat().st_mtime_ns == mtime_ns
+
+    ostrovok_statistic._save_statistics(output_csv, DAY, [{**STATISTICS[0], "free_rooms_amount": 4}], history=False)
+    assert b"\r\n" not in output_csv.read_bytes()
+    assert output_csv.read_bytes() != lf_bytes
+
+
+def _write_csv(path, rows):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8-sig", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def test_range_builds_days_with_both_inputs_once(tmp_path, monkeypatch):
+    daily_dir = tmp_path / "daily"
+    monkeypatch.setattr(ostrovok_statistic, "DAILY_DIR", daily_dir)
+    monkeypatch.setattr(fingerprint_manifest, "MANIFESTS_DIR", tmp_path / "manifests")
+    monkeypatch.setenv("HISTORY_STORE", "0")
+    days = [DAY, DAY + timedelta(days=1), DAY + timedelta(days=2)]
+    for day in days:
+        _write_csv(daily_dir / "hotels" / f"{day.isoformat()}.csv", [
+            {"ota_hotel_id": "angara_hotel", "name": "Ангара", "rooms_number": "10"},
+        ])
+    # За последний день номеров нет — он не считается
+    for day in days[:2]:
+        _write_csv(daily_dir / "rooms" / f"{day.isoformat()}.csv", [
+            {"ota_hotel_id": "angara_hotel", "allotment": "2", "capacity": "2", "price_rub_min": "5000"},
+            {"ota_hotel_id": "angara_hotel", "allotment": "1", "capacity": "3", "price_rub_min": "4500"},
+        ])
+
+    assert ostrovok_statistic.generate_statistics_range(workers=1) == {days[0]: 1, days[1]: 1}
+    with open(daily_dir / "statistics" / f"{DAY.isoformat()}.csv", encoding="utf-8-sig", newline="") as f:
+        assert list(csv.DictReader(f)) == [{
+            "ota_hotel_id": "angara_hotel", "name": "Ангара", "date": DAY.isoformat(), "rooms_num": "10",
+            "free_rooms_amount": "3", "max_capacity": "7", "available_rooms_percent": "30.0", "min_price": "4500.00",
+        }]
+    assert not (daily_dir / "statistics" / f"{days[2].isoformat()}.csv").exists()
+    # Входы не менялись — повторный запуск ничего не пересчитывает
+    assert ostrovok_statistic.generate_statistics_range(workers=1) == {}
+    assert ostrovok_statistic.generate_statistics_range(start=days[1], workers=1, force=True) == {days[1]: 1}